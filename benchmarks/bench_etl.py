@@ -0,0 +1,212 @@
+"""End-to-end ETL benchmark for project-nexline.
+
+Runs the full ETL offline against `stub_api.py`, a local stand-in for the SEPTA API
+started in its own process (so its work is not charged to the ETL's CPU time or
+memory). Train numbers are collected from the stub's TrainView, then `run_etl`
+fetches, transforms and loads every schedule into a scratch database.
+
+Reports throughput, request latency, per-stage time and peak memory from the run's
+metrics (see `src/metrics.py`), so fetcher, transformer and loader changes can be
+compared reproducibly on a dev box.
+
+Usage:
+    python benchmarks/bench_etl.py [--trains N] [--stops N] [--latency-ms MS] [--jitter FRACTION]
+                                   [--error-rate FRACTION] [--seed N] [--replay-dir DIR]
+                                   [--workers N] [--batch-size N] [--columnar] [--rps N]
+                                   [--work-dir DIR] [--output PATH]
+"""
+import argparse
+import json
+import logging
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+# Ensure project root is on sys.path for module imports
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import config
+import scripts.run_etl as run_etl
+import src.db as db_module
+from benchmarks.stub_api import RRSCHEDULES_PATH, TRAINVIEW_PATH
+from scripts.collect_train_numbers import Collector, get_service_date
+from src import http_client
+from src.db import get_connection, init_db
+from src.fetchers import rrschedules
+
+
+def start_stub(args: argparse.Namespace) -> Tuple[subprocess.Popen, str]:
+    """
+    Start the stub API in a child process.
+
+    Args:
+        args (argparse.Namespace): Parsed benchmark arguments.
+
+    Returns:
+        Tuple[subprocess.Popen, str]: The child process and the stub's base URL.
+
+    Raises:
+        RuntimeError: If the stub exits before reporting its URL.
+    """
+    command = [
+        sys.executable, str(Path(__file__).parent / "stub_api.py"),
+        "--trains", str(args.trains),
+        "--stops", str(args.stops),
+        "--latency-ms", str(args.latency_ms),
+        "--jitter", str(args.jitter),
+        "--error-rate", str(args.error_rate),
+        "--seed", str(args.seed),
+    ]
+    if args.replay_dir is not None:
+        command += ["--replay-dir", str(args.replay_dir.resolve())]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    base_url = process.stdout.readline().strip()
+    if not base_url:
+        process.kill()
+        raise RuntimeError("Stub API exited before it started serving.")
+    return process, base_url
+
+
+def run_benchmark(args: argparse.Namespace, work_dir: Path) -> Dict[str, Any]:
+    """
+    Collect train numbers and run the ETL for them against a running stub.
+
+    Expects `config.TRAINVIEW_URL` and `config.RRSCHEDULES_URL` to point at the stub.
+
+    Args:
+        args (argparse.Namespace): Parsed benchmark arguments.
+        work_dir (Path): Directory for the scratch database and metrics file.
+
+    Returns:
+        Dict[str, Any]: Scenario settings, trains collected, rows loaded and the
+            ETL's run metrics.
+    """
+    db_path = work_dir / "benchmark.duckdb"
+    metrics_path = work_dir / "metrics.json"
+    db_module.DB_FILE = db_path
+    rrschedules.RATE_LIMITER.rate = args.rps
+
+    now = datetime.now()
+    service_date = get_service_date(now)
+    conn = get_connection()
+    try:
+        init_db(conn)
+        trains = Collector(conn).poll(now)
+    finally:
+        conn.close()
+        http_client.close_session()
+
+    etl_argv = [
+        "run_etl",
+        "--db-path", str(db_path),
+        "--date", service_date.isoformat(),
+        "--workers", str(args.workers),
+        "--batch-size", str(args.batch_size),
+        "--metrics-json", str(metrics_path),
+    ]
+    if args.columnar:
+        etl_argv.append("--columnar")
+    saved_argv, sys.argv = sys.argv, etl_argv
+    try:
+        run_etl.main()
+    finally:
+        sys.argv = saved_argv
+
+    conn = get_connection(read_only=True)
+    try:
+        rows = conn.execute("SELECT count(*) FROM schedules WHERE date_scraped = ?", [service_date]).fetchone()[0]
+    finally:
+        conn.close()
+
+    scenario = {
+        name: str(value) if isinstance(value, Path) else value
+        for name, value in vars(args).items()
+        if name not in ("work_dir", "output")
+    }
+    return {
+        "scenario": scenario,
+        "trains": trains,
+        "rows_loaded": rows,
+        "metrics": json.loads(metrics_path.read_text())["metrics"],
+    }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    """
+    Render a benchmark report as a short human-readable table.
+
+    Args:
+        report (Dict[str, Any]): Output of `run_benchmark`.
+
+    Returns:
+        str: The formatted report.
+    """
+    metrics = report["metrics"]
+    wall = metrics["run.wall_sec"] or float("nan")
+    lines = [
+        f"trains:            {report['trains']}",
+        f"rows loaded:       {report['rows_loaded']}",
+        f"wall / CPU:        {metrics['run.wall_sec']:.2f}s / {metrics['run.cpu_sec']:.2f}s",
+        f"throughput:        {report['trains'] / wall:,.1f} trains/s, {report['rows_loaded'] / wall:,.0f} rows/s",
+        f"requests:          {metrics['fetch.requests']:.0f} "
+        f"({metrics.get('fetch.retries', 0):.0f} retries, {metrics.get('fetch.failures', 0):.0f} failed trains)",
+        f"latency p50/95/99: {metrics.get('fetch.latency_p50_ms', 0):.0f} / "
+        f"{metrics.get('fetch.latency_p95_ms', 0):.0f} / {metrics.get('fetch.latency_p99_ms', 0):.0f} ms",
+        f"peak RSS:          {metrics.get('run.peak_rss_mb', 0):.1f} MB",
+    ]
+    for stage in ("transform", "load", "progress", "aggregate"):
+        if f"{stage}.wall_sec" in metrics:
+            line = f"{stage + ':':<18} {metrics[f'{stage}.wall_sec']:.3f}s wall, {metrics[f'{stage}.cpu_sec']:.3f}s CPU"
+            if f"{stage}.rows_per_sec" in metrics:
+                line += f" ({metrics[f'{stage}.rows_per_sec']:,.0f} rows/s)"
+            lines.append(line)
+    return "\n".join(lines)
+
+
+def main() -> None:
+    """Start the stub, run the ETL against it, and print (and optionally save) the report."""
+    arg_parser = argparse.ArgumentParser(description="Benchmark the ETL end to end against a local SEPTA API stand-in.")
+    arg_parser.add_argument("--trains", type=int, default=300, help="Synthetic trains in service.")
+    arg_parser.add_argument("--stops", type=int, default=25, help="Stops per synthetic train.")
+    arg_parser.add_argument("--latency-ms", type=float, default=50.0, help="Mean response delay in milliseconds.")
+    arg_parser.add_argument("--jitter", type=float, default=0.5, help="Relative spread of the response delay.")
+    arg_parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with 503.")
+    arg_parser.add_argument("--seed", type=int, default=7, help="Seed for payloads, delays and errors.")
+    arg_parser.add_argument("--replay-dir", type=Path, default=None, help="Serve recorded payloads from here.")
+    arg_parser.add_argument("--workers", type=int, default=10, help="Maximum number of in-flight fetch requests.")
+    arg_parser.add_argument("--batch-size", type=int, default=config.LOAD_BATCH_TRAINS, help="Trains per load.")
+    arg_parser.add_argument("--columnar", action="store_true", help="Use the vectorized columnar transform.")
+    arg_parser.add_argument(
+        "--rps", type=float, default=1000.0, help="Request rate limit; high by default so the stub sets the pace."
+    )
+    arg_parser.add_argument("--work-dir", type=Path, default=None, help="Keep the scratch database here.")
+    arg_parser.add_argument("--output", type=Path, default=None, help="Also write the report as JSON here.")
+    args = arg_parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)s: %(message)s")
+
+    process, base_url = start_stub(args)
+    config.TRAINVIEW_URL = base_url + TRAINVIEW_PATH
+    config.RRSCHEDULES_URL = base_url + RRSCHEDULES_PATH
+    try:
+        if args.work_dir is not None:
+            args.work_dir.mkdir(parents=True, exist_ok=True)
+            report = run_benchmark(args, args.work_dir)
+        else:
+            with tempfile.TemporaryDirectory(prefix="nexline-bench-") as work_dir:
+                report = run_benchmark(args, Path(work_dir))
+    finally:
+        process.terminate()
+        process.wait()
+
+    print(format_report(report))
+    if args.output is not None:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""Micro-benchmark for time parsing in project-nexline's transformer.
+
+Builds a synthetic but realistic service day of RRSchedules records and times the
+current `transform` and the columnar `transform_columns` against the previous
+dateutil-only parsing path.
+
+It also times `transform_chunk` on a spawned process pool, once from a cold start
+and once warm, and estimates how many records a run needs before the pool's
+startup cost is repaid; `config.TRANSFORM_POOL_MIN_RECORDS` is set from that.
+
+Usage:
+    python benchmarks/bench_transform.py [--trains N] [--stops N] [--repeat N]
+                                         [--workers N]
+"""
+import argparse
+import multiprocessing
+import random
+import sys
+import time
+import timeit
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# Ensure project root is on sys.path for module imports
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import duckdb
+from dateutil import parser
+
+import config
+from src.fetchers.rrschedules import ScheduleRecord
+from src.transformer import parse_time, to_columns, transform, transform_chunk, transform_columns
+
+
+def format_clock(minutes: int) -> str:
+    """
+    Format minutes after midnight the way RRSchedules does, e.g. "3:08 pm".
+
+    Args:
+        minutes (int): Minutes after midnight; wraps past 24 hours.
+
+    Returns:
+        str: A 12-hour clock string.
+    """
+    hour, minute = divmod(minutes % (24 * 60), 60)
+    suffix = "am" if hour < 12 else "pm"
+    return f"{hour % 12 or 12}:{minute:02d} {suffix}"
+
+
+def synthetic_day(trains: int, stops: int, seed: int = 7) -> Dict[str, List[ScheduleRecord]]:
+    """
+    Generate one service day of raw schedule records.
+
+    Args:
+        trains (int): Number of trains that ran.
+        stops (int): Stops per train.
+        seed (int, optional): Random seed for reproducibility. Defaults to 7.
+
+    Returns:
+        Dict[str, List[ScheduleRecord]]: Raw records keyed by train number.
+    """
+    rng = random.Random(seed)
+    day: Dict[str, List[ScheduleRecord]] = {}
+    for n in range(trains):
+        start = rng.randrange(4 * 60, 25 * 60)
+        delay = rng.choice([0, 0, 1, 2, 3, 5, 8, 12])
+        records: List[ScheduleRecord] = []
+        for stop in range(stops):
+            sched = start + stop * rng.randrange(2, 6)
+            passed = stop < stops // 2
+            records.append(
+                ScheduleRecord(
+                    station=f"Station {stop}",
+                    sched_tm=format_clock(sched),
+                    est_tm=format_clock(sched + delay),
+                    act_tm=format_clock(sched + delay) if passed else "na",
+                )
+            )
+        day[str(1000 + n)] = records
+    return day
+
+
+def transform_dateutil(raw_records: List[ScheduleRecord]) -> int:
+    """
+    Reference implementation of the previous dateutil-only parsing path.
+
+    Args:
+        raw_records (List[ScheduleRecord]): One train's raw records.
+
+    Returns:
+        int: Number of records that parsed.
+    """
+    parsed = 0
+    for record in raw_records:
+        try:
+            parser.parse(record["sched_tm"].strip()).time()
+            parser.parse(record["est_tm"].strip()).time()
+        except (ValueError, TypeError):
+            continue
+        raw_act = record["act_tm"].strip()
+        if raw_act and raw_act.lower() != "na":
+            try:
+                parser.parse(raw_act).time()
+            except (ValueError, TypeError):
+                pass
+        parsed += 1
+    return parsed
+
+
+def time_pool(day: Dict[str, List[ScheduleRecord]], workers: int) -> Tuple[float, float]:
+    """
+    Transform a day in chunks on a freshly spawned process pool, twice.
+
+    Args:
+        day (Dict[str, List[ScheduleRecord]]): Raw records keyed by train number.
+        workers (int): Worker processes in the pool.
+
+    Returns:
+        Tuple[float, float]: Seconds for the first pass, including starting the
+            workers, and for the second pass on the warm pool.
+    """
+    trains = list(day.items())
+    size = config.TRANSFORM_CHUNK_TRAINS
+    chunks = [trains[n:n + size] for n in range(0, len(trains), size)]
+    passes: List[float] = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        for _ in range(2):
+            list(pool.map(transform_chunk, chunks))
+            passes.append(time.perf_counter() - start)
+            start = time.perf_counter()
+    return passes[0], passes[1]
+
+
+def main() -> None:
+    """Run every parsing path over the synthetic day and report the speedup."""
+    arg_parser = argparse.ArgumentParser(description="Benchmark transformer time parsing.")
+    arg_parser.add_argument("--trains", type=int, default=400, help="Trains in the day.")
+    arg_parser.add_argument("--stops", type=int, default=25, help="Stops per train.")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="Timed repetitions.")
+    arg_parser.add_argument("--workers", type=int, default=4, help="Worker processes of the pool.")
+    args = arg_parser.parse_args()
+
+    day = synthetic_day(args.trains, args.stops)
+    total = sum(len(records) for records in day.values())
+
+    def run_dateutil() -> None:
+        for records in day.values():
+            transform_dateutil(records)
+
+    def run_transform() -> None:
+        parse_time.cache_clear()
+        for records in day.values():
+            transform(records)
+
+    conn = duckdb.connect()
+
+    def run_columnar() -> None:
+        parse_time.cache_clear()
+        transform_columns(conn, to_columns(day)).aggregate("count(*)").fetchone()
+
+    baseline = min(timeit.repeat(run_dateutil, number=1, repeat=args.repeat))
+    current = min(timeit.repeat(run_transform, number=1, repeat=args.repeat))
+    columnar = min(timeit.repeat(run_columnar, number=1, repeat=args.repeat))
+    conn.close()
+    cold, warm = time_pool(day, args.workers)
+    # The pool pays off once the time it saves per record covers starting it
+    saved_per_record = (current - warm) / total
+    startup = cold - warm
+
+    print(f"records:             {total}")
+    print(f"dateutil parsing:    {baseline:.3f}s ({total / baseline:,.0f} records/s)")
+    print(f"transform():         {current:.3f}s ({total / current:,.0f} records/s)")
+    print(f"transform_columns(): {columnar:.3f}s ({total / columnar:,.0f} records/s)")
+    print(f"speedup:             {baseline / current:.1f}x (row), {baseline / columnar:.1f}x (columnar)")
+    print(f"pool, {args.workers} workers:     {cold:.3f}s cold, {warm:.3f}s warm")
+    if saved_per_record > 0:
+        print(f"pool break-even:     {startup / saved_per_record:,.0f} records")
+    else:
+        print("pool break-even:     never (a warm pool is no faster than in-process)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""Local SEPTA API stand-in for project-nexline benchmarks.
+
+Serves the two endpoints the ETL uses, TrainView and RRSchedules, on localhost with
+configurable latency, error rate and train count, so the whole pipeline can be
+measured reproducibly without touching the live API.
+
+By default the schedules are the synthetic service day of `bench_transform.py`, and
+TrainView lists its trains. With `--replay-dir` recorded payloads are served
+instead: `trainview.json` for TrainView and `rrschedules/<train_no>.json` for each
+train's schedule (trains without a recording get an empty schedule).
+
+Prints its base URL on startup, then serves until interrupted.
+
+Usage:
+    python benchmarks/stub_api.py [--port N] [--trains N] [--stops N]
+                                  [--latency-ms MS] [--jitter FRACTION]
+                                  [--error-rate FRACTION] [--seed N]
+                                  [--replay-dir DIR]
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+# Ensure project root is on sys.path for module imports
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from benchmarks.bench_transform import synthetic_day
+
+TRAINVIEW_PATH = "/api/TrainView/index.php"
+RRSCHEDULES_PATH = "/api/RRSchedules/index.php"
+
+
+class StubServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server answering TrainView and RRSchedules requests.
+
+    Each request waits `latency_ms` (spread by ±`jitter`) before it is answered,
+    and fails with 503 with probability `error_rate`.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        port: int = 0,
+        trains: int = 300,
+        stops: int = 25,
+        latency_ms: float = 50.0,
+        jitter: float = 0.5,
+        error_rate: float = 0.0,
+        seed: int = 7,
+        replay_dir: Optional[Path] = None,
+    ) -> None:
+        """
+        Bind the server to localhost and prepare its payloads.
+
+        Args:
+            port (int, optional): Port to listen on; 0 picks a free one. Defaults to 0.
+            trains (int, optional): Synthetic trains in service. Defaults to 300.
+            stops (int, optional): Stops per synthetic train. Defaults to 25.
+            latency_ms (float, optional): Mean response delay. Defaults to 50.
+            jitter (float, optional): Relative spread of the delay. Defaults to 0.5.
+            error_rate (float, optional): Fraction of requests answered with 503.
+                Defaults to 0.
+            seed (int, optional): Seed for payloads, delays and errors. Defaults to 7.
+            replay_dir (Optional[Path], optional): Serve recorded payloads from
+                this directory instead of synthetic ones.
+        """
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.replay_dir = replay_dir
+        self.requests = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._day = {} if replay_dir is not None else synthetic_day(trains, stops, seed)
+
+    @property
+    def base_url(self) -> str:
+        """Root URL of the server, e.g. "http://127.0.0.1:8123"."""
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def draw(self) -> Tuple[float, bool]:
+        """Count a request and draw its delay in seconds and whether it fails."""
+        with self._lock:
+            self.requests += 1
+            delay = self.latency_ms * self._rng.uniform(1 - self.jitter, 1 + self.jitter) / 1000
+            failed = self._rng.random() < self.error_rate
+            self.errors += failed
+        return max(0.0, delay), failed
+
+    def trainview(self) -> Any:
+        """Return the TrainView payload."""
+        if self.replay_dir is not None:
+            return json.loads((self.replay_dir / "trainview.json").read_text())
+        return [{"trainno": train_no, "late": 0} for train_no in self._day]
+
+    def schedule(self, train_no: str) -> Any:
+        """Return the RRSchedules payload of one train."""
+        if self.replay_dir is not None:
+            recorded = self.replay_dir / "rrschedules" / f"{train_no}.json"
+            return json.loads(recorded.read_text()) if recorded.exists() else []
+        return self._day.get(train_no, [])
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Answers one request against the owning `StubServer`."""
+
+    server: StubServer
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; with Nagle on, keep-alive clients
+    # would wait out a delayed ACK (~40 ms) on every response
+    disable_nagle_algorithm = True
+
+    def do_GET(self) -> None:  # noqa: N802 - name required by BaseHTTPRequestHandler
+        """Answer TrainView and RRSchedules requests after the drawn delay."""
+        url = urlsplit(self.path)
+        if url.path not in (TRAINVIEW_PATH, RRSCHEDULES_PATH):
+            self._send(404, {"error": "not found"})
+            return
+
+        delay, failed = self.server.draw()
+        time.sleep(delay)
+        if failed:
+            self._send(503, {"error": "service unavailable"})
+        elif url.path == TRAINVIEW_PATH:
+            self._send(200, self.server.trainview())
+        else:
+            self._send(200, self.server.schedule(parse_qs(url.query).get("req1", [""])[0]))
+
+    def _send(self, status: int, body: Any) -> None:
+        """Write a JSON response on the kept-alive connection."""
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        """Keep request logging out of benchmark output."""
+
+
+def main() -> None:
+    """Run the stub in the foreground until interrupted, printing its URL first."""
+    arg_parser = argparse.ArgumentParser(description="Serve a local stand-in for the SEPTA API.")
+    arg_parser.add_argument("--port", type=int, default=0, help="Port to listen on (default: any free port).")
+    arg_parser.add_argument("--trains", type=int, default=300, help="Synthetic trains in service.")
+    arg_parser.add_argument("--stops", type=int, default=25, help="Stops per synthetic train.")
+    arg_parser.add_argument("--latency-ms", type=float, default=50.0, help="Mean response delay in milliseconds.")
+    arg_parser.add_argument("--jitter", type=float, default=0.5, help="Relative spread of the response delay.")
+    arg_parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with 503.")
+    arg_parser.add_argument("--seed", type=int, default=7, help="Seed for payloads, delays and errors.")
+    arg_parser.add_argument("--replay-dir", type=Path, default=None, help="Serve recorded payloads from here.")
+    args = arg_parser.parse_args()
+
+    server = StubServer(
+        port=args.port,
+        trains=args.trains,
+        stops=args.stops,
+        latency_ms=args.latency_ms,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        seed=args.seed,
+        replay_dir=args.replay_dir,
+    )
+    print(server.base_url, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,3 +6,50 @@ RRSCHEDULES_URL = "https://www3.septa.org/api/RRSchedules/index.php"
 
 # Rate limiting
 RATE_LIMIT_RPS = 4
+
+# HTTP transport
+HTTP_POOL_SIZE = 10
+HTTP_USER_AGENT = "project-nexline"
+HTTP_CONNECT_TIMEOUT_SEC = 5      # give up on a connection attempt after this long
+HTTP_READ_TIMEOUT_SEC = 30        # give up on a response that stays silent this long
+HTTP_MAX_RETRY_AFTER_SEC = 120    # longest server-requested Retry-After wait honored
+
+# Fetch retries
+FETCH_MAX_RETRIES = 3             # retries of a transiently failing train before it counts as failed
+FETCH_RETRY_BACKOFF_SEC = 0.5     # first retry delay; doubles per failed attempt
+
+# Adaptive fetch control
+FETCH_TARGET_LATENCY_SEC = 2.0    # slower responses count as congestion
+FETCH_MIN_RPS = 0.5               # floor for the adaptive request rate
+CIRCUIT_FAILURE_THRESHOLD = 10    # consecutive transient failures that pause all fetching
+CIRCUIT_COOLDOWN_SEC = 30         # pause before a probe request; doubles per failed probe
+CIRCUIT_MAX_COOLDOWN_SEC = 300
+CIRCUIT_GIVE_UP_SEC = 1800        # fail the remaining trains after an outage this long
+
+# Streaming pipeline
+PIPELINE_QUEUE_SIZE = 50   # trains buffered between each pair of stages
+LOAD_BATCH_TRAINS = 100    # trains written per load transaction
+TRANSFORM_CHUNK_TRAINS = 25        # trains per task sent to a transform worker process
+TRANSFORM_POOL_MIN_RECORDS = 1_000_000  # records transformed in-process before a pool starts (bench_transform.py)
+
+# Train-number collector daemon
+COLLECT_INTERVAL_SECONDS = 300
+COLLECT_JITTER = 0.1              # ±10% spread on each interval
+COLLECT_QUIET_START = "01:30"     # no polling between these times
+COLLECT_QUIET_END = "04:00"
+POSITION_FLUSH_POLLS = 10         # TrainView polls buffered per position write
+
+# Parquet archive
+ARCHIVE_KEEP_DAYS = 7             # recent service dates kept in the hot schedules table
+
+# Delay analytics
+ON_TIME_THRESHOLD_SEC = 300       # a stop up to 5 minutes late counts as on time
+
+# Query result cache
+QUERY_CACHE_SIZE = 256            # cached results kept, least recently used evicted first
+QUERY_CACHE_TTL_SEC = 3600        # safety net for writes that bypass the data version
+
+# Database access
+DB_LOCK_TIMEOUT_SEC = 60          # writers wait this long for another process's file lock
+READER_POOL_SIZE = 8              # idle reader cursors kept for reuse
+READER_REFRESH_SEC = 60           # how often readers check for newer data to snapshot
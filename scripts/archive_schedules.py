@@ -0,0 +1,93 @@
+"""
+Archive script for project-nexline.
+
+Moves closed service dates from the hot `schedules` table into the Parquet archive,
+or compacts the archive's small daily files into one file per month.
+
+Usage:
+    python -m scripts.archive_schedules [--db-path DB_PATH] archive [--keep-days N]
+    python -m scripts.archive_schedules [--db-path DB_PATH] compact [--min-files N]
+"""
+import argparse
+import logging
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+# Ensure project root is on sys.path for module imports
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import config
+import src.db as db_module
+from src.archive import archive_before, compact_archive
+from src.db import get_connection, init_db
+
+
+def parse_args() -> argparse.Namespace:
+    """
+    Parse command-line arguments for the archive script.
+
+    Returns:
+        argparse.Namespace: Parsed arguments namespace.
+    """
+    parser = argparse.ArgumentParser(
+        description='Archive closed service dates to Parquet and compact the archive.'
+    )
+    parser.add_argument(
+        '--db-path',
+        type=Path,
+        default=db_module.DB_FILE,
+        help='Path to the DuckDB database file; the archive lives next to it.'
+    )
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    archive = commands.add_parser('archive', help='Move closed service dates to the archive.')
+    archive.add_argument(
+        '--keep-days',
+        type=int,
+        default=config.ARCHIVE_KEEP_DAYS,
+        help='Number of most recent service dates (counting back from today) to keep in the hot table.'
+    )
+
+    compact = commands.add_parser('compact', help='Merge small archive files per month.')
+    compact.add_argument(
+        '--min-files',
+        type=int,
+        default=2,
+        help='Only compact months holding at least this many files.'
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    """
+    Main entry point for archiving and compaction.
+
+    Runs the selected command against the database at `--db-path` and logs what
+    was moved or merged.
+    """
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
+
+    db_module.DB_FILE = args.db_path
+    conn = get_connection()
+    try:
+        init_db(conn)
+        if args.command == 'archive':
+            cutoff = date.today() - timedelta(days=max(0, args.keep_days))
+            archived = archive_before(conn, cutoff)
+            for service_date, rows in archived.items():
+                logging.info(f'{service_date}: archived {rows} rows')
+            logging.info(f'Archived {len(archived)} service dates before {cutoff}')
+        else:
+            compacted = compact_archive(conn, min_files=args.min_files)
+            for partition, files in compacted.items():
+                logging.info(f'{partition}: merged {files} files')
+            logging.info(f'Compacted {len(compacted)} partitions')
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,20 +1,53 @@
 """Collect script for project-nexline.
 
-Runs periodically to upsert unique train numbers into the `train_numbers` table for
+Runs periodically to insert unique train numbers into the `train_numbers` table for
 the correct service date. Service date rolls over at 2 AM (times between 00:00 and
-01:29 map to the previous calendar date).
+01:29 map to the previous calendar date). Only train numbers not already stored for
+the service date are written, each with the time it was first seen.
+
+With `--daemon`, the script stays resident and polls on its own jittered schedule,
+keeping the HTTP session and set of known trains warm between polls. The database is
+only opened for each write, since DuckDB lets a single process hold the file: the
+nightly ETL, archive jobs and readers can use it whenever the daemon is not writing.
+Adding `--capture-positions` also appends every train's live position, lateness and
+next stop from each poll to the `train_positions` time series; pair it with a short
+interval such as `--interval 30`.
+
+Usage:
+    python scripts/collect_train_numbers.py [--daemon]
+                                            [--interval SECONDS]
+                                            [--jitter FRACTION]
+                                            [--capture-positions]
 """
+import argparse
+import logging
+import random
+import signal
 import sys
+import threading
 from datetime import datetime, date, time, timedelta
 from pathlib import Path
-from typing import Set, List, Tuple
+from typing import Iterable, Optional, Set, List, Tuple
+
+import duckdb
 
 # Ensure project root is on sys.path for imports
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
-from src.db import get_connection, init_db
-from src.extractors import get_train_numbers
+import config
+from src import http_client
+from src.db import get_connection, get_stored_train_numbers, init_db
+from src.extractors import extract_positions, extract_train_numbers, fetch_trainview, get_train_numbers
+from src.positions import PositionWriter
+
+INSERT_SQL = (
+    """
+    INSERT INTO train_numbers (date_scraped, train_no, first_seen)
+    VALUES (?, ?, ?)
+    ON CONFLICT (date_scraped, train_no) DO NOTHING
+    """
+)
 
 
 def get_service_date(now: datetime) -> date:
@@ -33,42 +66,212 @@ def get_service_date(now: datetime) -> date:
     return now.date()
 
 
-def main() -> None:
+def in_quiet_hours(now: datetime) -> bool:
     """
-    Main entry point for collecting train numbers.
+    Check whether `now` falls in the nightly window when no trains run.
 
-    Initializes the database schema, fetches the current set of train numbers,
-    and upserts them into the `train_numbers` table for the service date.
+    Args:
+        now (datetime): The current timestamp.
+
+    Returns:
+        bool: True between `config.COLLECT_QUIET_START` and `config.COLLECT_QUIET_END`.
     """
-    # Initialize schema (creates both schedules and train_numbers tables)
-    init_db()
+    start = time.fromisoformat(config.COLLECT_QUIET_START)
+    end = time.fromisoformat(config.COLLECT_QUIET_END)
+    return start <= now.time() < end
 
-    now: datetime = datetime.now()
-    service_date: date = get_service_date(now)
 
-    # Fetch current train numbers
-    train_numbers: Set[str] = get_train_numbers()
+def next_delay(interval: float, jitter: float, rng: random.Random) -> float:
+    """
+    Compute the wait before the next poll, spread by up to ±`jitter` of `interval`.
 
-    # Prepare upsert parameters
-    params: List[Tuple[date, str]] = [
-        (service_date, tn) for tn in train_numbers
-    ]
+    Args:
+        interval (float): Nominal seconds between polls.
+        jitter (float): Maximum relative deviation, e.g. 0.1 for ±10%.
+        rng (random.Random): Source of randomness.
 
-    # Upsert into train_numbers table
-    conn = get_connection()
-    upsert_sql = (
+    Returns:
+        float: Seconds to wait.
+    """
+    return max(0.0, interval * (1 + rng.uniform(-jitter, jitter)))
+
+
+class Collector:
+    """
+    Stateful poller that writes each train number once per service date.
+
+    Keeps the train numbers already stored for the current service date in memory,
+    seeded from the database once per service date, so that a poll only writes the
+    trains that are new instead of re-upserting every visible train.
+    """
+
+    def __init__(self, conn: Optional[duckdb.DuckDBPyConnection] = None) -> None:
         """
-        INSERT INTO train_numbers (date_scraped, train_no)
-        VALUES (?, ?)
-        ON CONFLICT (date_scraped, train_no) DO NOTHING
+        Initialize the collector.
+
+        Args:
+            conn (Optional[duckdb.DuckDBPyConnection], optional): Connection for all
+                writes. Defaults to a short-lived connection per poll.
         """
+        self.conn = conn
+        self.service_date: Optional[date] = None
+        self.seen: Set[str] = set()
+
+    def poll(self, now: datetime, train_numbers: Optional[Iterable[str]] = None) -> int:
+        """
+        Fetch the current train numbers and store the ones not yet seen.
+
+        Args:
+            now (datetime): The poll timestamp, used to pick the service date and
+                recorded as `first_seen` for new trains.
+            train_numbers (Optional[Iterable[str]], optional): Train numbers already
+                extracted from a TrainView payload. Defaults to fetching them.
+
+        Returns:
+            int: The number of newly stored train numbers.
+        """
+        if train_numbers is None:
+            train_numbers = get_train_numbers()
+        service_date = get_service_date(now)
+
+        owns_conn = self.conn is None
+        conn = get_connection() if owns_conn else self.conn
+        try:
+            if service_date != self.service_date:
+                self.seen = set(get_stored_train_numbers(service_date, conn=conn))
+                self.service_date = service_date
+                logging.info(f'Service date {service_date}: {len(self.seen)} trains already stored')
+
+            new_trains = set(train_numbers) - self.seen
+            if new_trains:
+                params: List[Tuple[date, str, datetime]] = [
+                    (service_date, tn, now) for tn in sorted(new_trains)
+                ]
+                conn.executemany(INSERT_SQL, params)
+                self.seen |= new_trains
+        finally:
+            if owns_conn:
+                conn.close()
+        return len(new_trains)
+
+
+def run_daemon(
+    interval: float,
+    jitter: float,
+    stop: Optional[threading.Event] = None,
+    capture_positions: bool = False,
+) -> None:
+    """
+    Poll TrainView on a jittered schedule until asked to stop.
+
+    Pauses during quiet hours, survives failed polls, and shuts down gracefully on
+    SIGINT/SIGTERM after finishing the poll in progress. The database is opened
+    only while a poll or position flush writes to it, and buffered positions are
+    flushed when quiet hours begin, so other processes can take the file lock
+    between polls and throughout the night.
+
+    Args:
+        interval (float): Nominal seconds between polls.
+        jitter (float): Maximum relative deviation of each interval.
+        stop (Optional[threading.Event], optional): Event that ends the loop when
+            set. Defaults to one set by SIGINT/SIGTERM.
+        capture_positions (bool, optional): Also append each poll's train positions
+            to `train_positions`. Defaults to False.
+    """
+    if stop is None:
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+
+    init_db()
+    collector = Collector()
+    writer = PositionWriter() if capture_positions else None
+    rng = random.Random()
+    logging.info(f'Collector started: polling every ~{interval:g}s (±{jitter:.0%})')
+
+    try:
+        while not stop.is_set():
+            now = datetime.now()
+            if in_quiet_hours(now):
+                if writer is not None and writer.pending:
+                    try:
+                        logging.info(f'Flushed {writer.flush()} train positions before quiet hours')
+                    except Exception as exc:
+                        logging.error(f'Position flush failed: {exc}')
+            else:
+                try:
+                    # One TrainView request feeds both train numbers and positions
+                    data = fetch_trainview()
+                    added = collector.poll(now, extract_train_numbers(data))
+                    logging.info(f'Stored {added} new train numbers for {collector.service_date}')
+                    if writer is not None:
+                        written = writer.add(now, get_service_date(now), extract_positions(data))
+                        if written:
+                            logging.info(f'Appended {written} train positions')
+                except Exception as exc:
+                    logging.error(f'Poll failed: {exc}')
+            stop.wait(next_delay(interval, jitter, rng))
+    finally:
+        if writer is not None:
+            try:
+                writer.flush()
+            except Exception as exc:
+                logging.error(f'Final position flush failed: {exc}')
+        http_client.close_session()
+        logging.info('Collector stopped')
+
+
+def main() -> None:
+    """
+    Main entry point for collecting train numbers.
+
+    Initializes the database schema, fetches the current set of train numbers,
+    and inserts the ones not yet stored into the `train_numbers` table for the
+    service date. With `--daemon`, keeps doing so on a schedule instead of exiting.
+    """
+    parser = argparse.ArgumentParser(description='Collect SEPTA train numbers.')
+    parser.add_argument(
+        '--daemon',
+        action='store_true',
+        help='Keep running and poll on a schedule instead of polling once.'
     )
+    parser.add_argument(
+        '--interval',
+        type=float,
+        default=config.COLLECT_INTERVAL_SECONDS,
+        help='Seconds between polls in daemon mode.'
+    )
+    parser.add_argument(
+        '--jitter',
+        type=float,
+        default=config.COLLECT_JITTER,
+        help='Maximum relative deviation of each interval, e.g. 0.1 for ±10%%.'
+    )
+    parser.add_argument(
+        '--capture-positions',
+        action='store_true',
+        help='In daemon mode, also store live train positions from every poll.'
+    )
+    args = parser.parse_args()
+
+    if args.daemon:
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
+        run_daemon(args.interval, args.jitter, capture_positions=args.capture_positions)
+        return
 
-    with conn:
-        conn.executemany(upsert_sql, params)
-    conn.close()
+    now: datetime = datetime.now()
+
+    # Insert only the train numbers not yet stored for the service date; the schema
+    # check is a single version query once the database is current
+    conn = get_connection()
+    try:
+        init_db(conn)
+        collector = Collector(conn)
+        added = collector.poll(now)
+    finally:
+        conn.close()
 
-    print(f"Upserted {len(params)} train numbers for {service_date}")
+    print(f"Stored {added} new train numbers for {collector.service_date}")
 
 
 if __name__ == "__main__":
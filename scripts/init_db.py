@@ -18,8 +18,11 @@ from src.db import init_db  # noqa: E402
 def main() -> None:
     """Run the database initialization and report status."""
     try:
-        init_db()
-        print("✅ Database schema initialized successfully.")
+        applied = init_db()
+        if applied:
+            print(f"✅ Database schema initialized successfully (applied versions: {applied}).")
+        else:
+            print("✅ Database schema already up to date.")
     except Exception as error:
         print(f"❌ Failed to initialize schema: {error}", file=sys.stderr)
         sys.exit(1)
@@ -2,32 +2,63 @@
 Orchestration script for project-nexline.
 
 Coordinates the full ETL pipeline: reads collected train numbers, fetches schedules
-concurrently, transforms records, and loads them into a DuckDB database.
+concurrently, transforms records, and loads them into a DuckDB database. The three
+stages overlap, with trains streaming between them through bounded queues. Daily
+delay aggregates are then refreshed for the dates that changed. Stage timings,
+request latencies and throughput are stored in `run_metrics` and, on request,
+written as a JSON summary.
+
+With `--capture-raw` every fetched payload is also kept in the raw response store
+(see `src/raw_store.py`); `--replay` later transforms and loads dates from that
+store without any network access, e.g. to rebuild history after a transformer fix.
+
+Trains whose payload is unchanged since they were last loaded are not transformed
+or loaded again, which makes re-runs nearly free; `--force` reloads them anyway.
+
+Stored stops are upserted: a later fetch fills in actual times and updates
+estimates that changed. `--refresh` runs intraday for the current service date,
+refetching only trains whose schedule is not final yet (any stop without an
+actual time, or nothing stored yet).
 
 Usage:
     python -m scripts.run_etl [--db-path DB_PATH]
-                              [--date YYYY-MM-DD]
+                              [--date YYYY-MM-DD | --start YYYY-MM-DD --end YYYY-MM-DD]
                               [--dry-run]
+                              [--resume]
                               [--verbose]
                               [--workers N]
+                              [--batch-size N]
+                              [--columnar]
+                              [--transform-workers N]
+                              [--metrics-json PATH]
+                              [--capture-raw | --replay]
+                              [--force]
+                              [--refresh]
 """
 import argparse
+import asyncio
 import logging
 import sys
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import date, datetime, timedelta
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional
+
+import duckdb
 
 # Ensure project root is on sys.path for module imports
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
+import config
 import src.db as db_module
-from src.db import init_db, get_stored_train_numbers
-from src.fetchers.rrschedules import ScheduleRecord, fetch_schedule
-from src.loader import load_records
-from src.transformer import transform
+from src import http_client
+from src.aggregates import get_unaggregated_dates, refresh_daily_aggregates
+from scripts.collect_train_numbers import get_service_date
+from src.db import get_connection, get_incomplete_train_numbers, get_stored_train_numbers, init_db
+from src.metrics import RunMetrics, write_json_summary, write_run_metrics
+from src.pipeline import run_streaming
+from src.progress import get_failed_trains, get_loaded_train_numbers
+from src.raw_store import RawResponseStore
 
 
 def parse_args() -> argparse.Namespace:
@@ -54,21 +85,85 @@ def parse_args() -> argparse.Namespace:
         default=None,
         help='Date for which to run ETL (YYYY-MM-DD). Defaults to yesterday.'
     )
+    parser.add_argument(
+        '--start',
+        type=str,
+        default=None,
+        help='First date of a backfill range (YYYY-MM-DD). Requires --end.'
+    )
+    parser.add_argument(
+        '--end',
+        type=str,
+        default=None,
+        help='Last date of a backfill range, inclusive (YYYY-MM-DD). Requires --start.'
+    )
     parser.add_argument(
         '--dry-run',
         action='store_true',
         help='Run ETL without writing to the database.'
     )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Only process trains not already loaded for the date by an earlier run.'
+    )
     parser.add_argument(
         '--verbose',
         action='store_true',
         help='Enable debug logging.'
     )
+    parser.add_argument(
+        '--columnar',
+        action='store_true',
+        help='Transform each load batch with the vectorized columnar path (faster with --batch-size 250 or more).'
+    )
+    parser.add_argument(
+        '--transform-workers',
+        type=int,
+        default=0,
+        help=(
+            'Transform in this many worker processes once a run has transformed '
+            f'{config.TRANSFORM_POOL_MIN_RECORDS:,} records in-process. Off by default; ignored with --columnar.'
+        )
+    )
     parser.add_argument(
         '--workers',
         type=int,
         default=10,
-        help='Number of concurrent fetch workers.'
+        help='Maximum number of in-flight fetch requests.'
+    )
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=config.LOAD_BATCH_TRAINS,
+        help='Number of trains written per load transaction.'
+    )
+    parser.add_argument(
+        '--metrics-json',
+        type=Path,
+        default=None,
+        help='Also write the run metrics summary to this JSON file.'
+    )
+    raw = parser.add_mutually_exclusive_group()
+    raw.add_argument(
+        '--capture-raw',
+        action='store_true',
+        help='Keep every fetched payload in the raw response store next to the database.'
+    )
+    raw.add_argument(
+        '--replay',
+        action='store_true',
+        help='Transform and load the captured payloads of the date(s) instead of fetching.'
+    )
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help='Transform and load every fetched train, even if its payload is unchanged since it was loaded.'
+    )
+    parser.add_argument(
+        '--refresh',
+        action='store_true',
+        help='Intraday refresh: refetch only trains still missing actual times. Defaults to today.'
     )
     return parser.parse_args()
 
@@ -87,71 +182,224 @@ def configure_logging(verbose: bool) -> None:
     )
 
 
+def parse_date(value: str) -> date:
+    """
+    Parse a YYYY-MM-DD command-line date.
+
+    Args:
+        value (str): The date string.
+
+    Returns:
+        date: The parsed date.
+
+    Raises:
+        ValueError: If the string is not in YYYY-MM-DD format.
+    """
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError('Invalid date format. Use YYYY-MM-DD.') from None
+
+
+def resolve_dates(args: argparse.Namespace) -> List[date]:
+    """
+    Work out which service dates to process from the command-line arguments.
+
+    Args:
+        args (argparse.Namespace): Parsed command-line arguments.
+
+    Returns:
+        List[date]: The dates to process, in ascending order.
+
+    Raises:
+        ValueError: If a date is malformed, the range is incomplete or reversed,
+            --date is combined with a range, or --refresh with --replay or --resume.
+    """
+    if args.refresh and (args.replay or args.resume):
+        raise ValueError('--refresh cannot be combined with --replay or --resume.')
+    if args.start or args.end:
+        if args.date or not (args.start and args.end):
+            raise ValueError('Use --start and --end together, without --date.')
+        start = parse_date(args.start)
+        end = parse_date(args.end)
+        if end < start:
+            raise ValueError('--end must not be before --start.')
+        return [start + timedelta(days=n) for n in range((end - start).days + 1)]
+    if args.date:
+        return [parse_date(args.date)]
+    if args.refresh:
+        return [get_service_date(datetime.now())]
+    return [date.today() - timedelta(days=1)]
+
+
+def run_pipeline(
+    args: argparse.Namespace,
+    etl_dates: List[date],
+    conn: duckdb.DuckDBPyConnection,
+    metrics: Optional[RunMetrics] = None,
+) -> None:
+    """
+    Fetch, transform, and load all trains for the given service dates.
+
+    Args:
+        args (argparse.Namespace): Parsed command-line arguments.
+        etl_dates (List[date]): The service dates to process.
+        conn (duckdb.DuckDBPyConnection): Open connection used for all DB access.
+        metrics (Optional[RunMetrics], optional): Collects timings and counters
+            of the run. Defaults to a private collector.
+    """
+    metrics = metrics if metrics is not None else RunMetrics()
+    raw_store = RawResponseStore() if args.capture_raw or args.replay else None
+    # Read distinct train numbers for each date; a replay takes every captured train
+    jobs: Dict[date, List[str]] = {}
+    for etl_date in etl_dates:
+        if args.replay:
+            train_numbers: List[str] = raw_store.train_numbers(etl_date)
+            logging.info(f'{etl_date}: replaying {len(train_numbers)} captured trains.')
+        elif args.refresh:
+            train_numbers = get_incomplete_train_numbers(etl_date, conn=conn)
+            logging.info(f'{etl_date}: refreshing {len(train_numbers)} trains still in progress.')
+        else:
+            train_numbers = get_stored_train_numbers(etl_date, conn=conn)
+            logging.info(f'{etl_date}: loaded {len(train_numbers)} train numbers from store.')
+
+        if args.resume:
+            done = get_loaded_train_numbers(conn, etl_date)
+            train_numbers = [tn for tn in train_numbers if tn not in done]
+            logging.info(
+                f'{etl_date}: resuming, {len(done)} trains already loaded, '
+                f'{len(train_numbers)} remaining.'
+            )
+        jobs[etl_date] = train_numbers
+
+    # Fetch, transform and load overlap: trains of every date stream through
+    # bounded queues into batched load transactions, sharing one worker pool
+    http_client.configure_session(pool_size=args.workers)
+    try:
+        summaries = asyncio.run(
+            run_streaming(
+                jobs,
+                conn,
+                concurrency=args.workers,
+                batch_size=args.batch_size,
+                columnar=args.columnar,
+                dry_run=args.dry_run,
+                metrics=metrics,
+                capture=raw_store if args.capture_raw else None,
+                replay_from=raw_store if args.replay else None,
+                skip_unchanged=not args.force,
+                upsert=True,
+                # Replayed trains replace their stored stops, each in the
+                # transaction that loads its corrected records
+                replace=args.replay,
+                transform_workers=args.transform_workers,
+            )
+        )
+    finally:
+        http_client.close_session()
+        if args.capture_raw:
+            # Keeps what was fetched even if the run failed part-way
+            raw_store.flush()
+
+    for etl_date, summary in summaries.items():
+        if summary['failed']:
+            logging.warning(f'{etl_date}: {summary["failed"]} trains could not be fetched.')
+            if not args.dry_run:
+                # Final failures, after every deferred retry, as recorded in etl_progress
+                for train_no, error in get_failed_trains(conn, etl_date).items():
+                    logging.warning(f'{etl_date}: train {train_no} failed: {error}')
+                logging.warning(f'{etl_date}: rerun with --resume to retry them.')
+        if args.dry_run:
+            logging.info(
+                f'(dry-run) {etl_date}: ETL complete. Total records processed: {summary["cleaned"]}'
+            )
+            continue
+        logging.info(
+            f'{etl_date}: ETL complete. Total records loaded or updated: {summary["loaded"]} '
+            f'({summary["cleaned"] - summary["loaded"]} already stored)'
+        )
+
+    if not args.dry_run:
+        # Rebuild delay aggregates for the dates that changed, plus any stored
+        # dates never aggregated (e.g. loaded before the aggregates existed)
+        changed = [etl_date for etl_date, summary in summaries.items() if summary['loaded']]
+        with metrics.timed('aggregate'):
+            refreshed = refresh_daily_aggregates(conn, changed + get_unaggregated_dates(conn))
+        logging.info(f'Refreshed delay aggregates for {refreshed} dates.')
+
+
+def report_metrics(
+    args: argparse.Namespace,
+    etl_dates: List[date],
+    conn: duckdb.DuckDBPyConnection,
+    metrics: RunMetrics,
+) -> None:
+    """
+    Log the headline metrics of the run and store or write the full summary.
+
+    Args:
+        args (argparse.Namespace): Parsed command-line arguments.
+        etl_dates (List[date]): The service dates processed.
+        conn (duckdb.DuckDBPyConnection): Connection to store the metrics through;
+            unused on a dry run.
+        metrics (RunMetrics): The run's metrics.
+    """
+    summary = metrics.summary()
+    logging.info(
+        f'Run took {summary["run.wall_sec"]:.1f}s wall, {summary["run.cpu_sec"]:.1f}s CPU; '
+        f'{summary["fetch.requests"]:.0f} requests '
+        f'(p95 {summary.get("fetch.latency_p95_ms", 0):.0f} ms, '
+        f'{summary.get("fetch.retries", 0):.0f} retries, '
+        f'{summary.get("fetch.unchanged", 0):.0f} trains unchanged); '
+        f'load {summary.get("load.rows_per_sec", 0):.0f} rows/s'
+    )
+    if not args.dry_run:
+        write_run_metrics(conn, metrics)
+    if args.metrics_json:
+        write_json_summary(
+            args.metrics_json,
+            metrics,
+            extra={'dates': [etl_date.isoformat() for etl_date in etl_dates], 'dry_run': args.dry_run},
+        )
+        logging.info(f'Wrote run metrics to {args.metrics_json}')
+
+
 def main() -> None:
     """
     Main entry point for the ETL process.
 
     Orchestrates fetching, transformation, and loading of
     train schedule data based on previously collected train numbers.
-    Supports dry-run to skip database writes.
+    Supports dry-run to skip database writes, and backfilling a date range
+    in a single process.
     """
     args = parse_args()
     configure_logging(args.verbose)
 
-    # Determine the ETL date
-    if args.date:
-        try:
-            etl_date = datetime.strptime(args.date, '%Y-%m-%d').date()
-        except ValueError:
-            logging.error('Invalid date format. Use YYYY-MM-DD.')
-            return
+    # Determine the ETL date(s)
+    try:
+        etl_dates = resolve_dates(args)
+    except ValueError as error:
+        logging.error(str(error))
+        return
+    if len(etl_dates) == 1:
+        logging.info(f'Running ETL for date: {etl_dates[0]}')
     else:
-        etl_date = date.today() - timedelta(days=1)
-    logging.info(f'Running ETL for date: {etl_date}')
+        logging.info(f'Running ETL for {len(etl_dates)} dates: {etl_dates[0]} to {etl_dates[-1]}')
 
-    # Prepare the database and schema
+    # One connection serves the schema check and every read and write of this run
     db_module.DB_FILE = args.db_path
-    args.db_path.parent.mkdir(parents=True, exist_ok=True)
-    init_db()
-    logging.info(f'Using database at: {args.db_path}')
-
-    # Read distinct train numbers for this date
-    train_numbers: List[str] = get_stored_train_numbers(etl_date)
-    logging.info(f'Loaded {len(train_numbers)} train numbers from store.')
-
-    # Concurrent fetching of schedules
-    raw_data: Dict[str, List[ScheduleRecord]] = {}
-    with ThreadPoolExecutor(max_workers=args.workers) as executor:
-        future_map = {executor.submit(fetch_schedule, tn): tn for tn in train_numbers}
-        for future in as_completed(future_map):
-            tn = future_map[future]
-            try:
-                raw_data[tn] = future.result()
-                logging.info(f'Fetched {len(raw_data[tn])} records for train {tn}')
-            except Exception as exc:
-                logging.error(f'Failed to fetch schedule for train {tn}: {exc}')
-
-    # Dry run: report counts without loading
-    if args.dry_run:
-        total = 0
-        for tn, records in raw_data.items():
-            cleaned = transform(records)
-            count = len(cleaned)
-            total += count
-            logging.info(f'(dry-run) Would load {count} records for train {tn}')
-        logging.info(f'(dry-run) ETL complete. Total records processed: {total}')
-        return
-
-    # Transformation and loading into schedules table
-    total_loaded = 0
-    for tn, records in raw_data.items():
-        cleaned = transform(records)
-        load_records(etl_date, tn, cleaned)
-        count = len(cleaned)
-        total_loaded += count
-        logging.info(f'Loaded {count} records for train {tn}')
-
-    logging.info(f'ETL complete. Total records loaded: {total_loaded}')
+    metrics = RunMetrics()
+    conn = get_connection()
+    try:
+        applied = init_db(conn)
+        if applied:
+            logging.info(f'Applied schema migrations: {applied}')
+        logging.info(f'Using database at: {args.db_path}')
+        run_pipeline(args, etl_dates, conn, metrics)
+        report_metrics(args, etl_dates, conn, metrics)
+    finally:
+        conn.close()
 
 
 if __name__ == '__main__':
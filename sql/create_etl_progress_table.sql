@@ -0,0 +1,10 @@
+-- Tracks per-train ETL progress so interrupted runs can resume.
+CREATE TABLE IF NOT EXISTS etl_progress (
+    date_scraped DATE,
+    train_no     VARCHAR,
+    status       VARCHAR,    -- fetched | loaded | failed
+    attempts     INTEGER,    -- fetch attempts across runs
+    last_error   VARCHAR,
+    updated_at   TIMESTAMP,
+    PRIMARY KEY (date_scraped, train_no)
+);
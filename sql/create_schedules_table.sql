@@ -1,9 +1,11 @@
 CREATE TABLE IF NOT EXISTS schedules (
-  date_scraped DATE,
-  train_no    VARCHAR,
-  station     VARCHAR,
-  sched_time  TIME,       -- e.g. 15:08
-  est_time    TIME,       -- e.g. 15:11
-  act_time    VARCHAR,    -- allows “na” or a time string like “15:12”
+  date_scraped  DATE,
+  train_no      VARCHAR,
+  station       VARCHAR,
+  sched_time    TIME,       -- e.g. 15:08
+  est_time      TIME,       -- e.g. 15:11
+  act_time      TIME,       -- NULL until the train has actually called (“na”)
+  est_delay_sec INTEGER,    -- est_time − sched_time in seconds, wrapped at midnight
+  act_delay_sec INTEGER,    -- act_time − sched_time in seconds, wrapped at midnight
   PRIMARY KEY (date_scraped, train_no, station)
 );
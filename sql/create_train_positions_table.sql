@@ -0,0 +1,44 @@
+-- Live TrainView positions captured by the collector, one row per train per poll.
+-- Text values are dictionary-encoded into the small lookup tables below so the
+-- append-only time series stays narrow and compresses well.
+CREATE TABLE IF NOT EXISTS position_trains (
+    train_id INTEGER PRIMARY KEY,
+    train_no VARCHAR UNIQUE
+);
+CREATE TABLE IF NOT EXISTS position_stations (
+    station_id SMALLINT PRIMARY KEY,
+    name       VARCHAR UNIQUE      -- used for both next stop and destination
+);
+CREATE TABLE IF NOT EXISTS position_lines (
+    line_id SMALLINT PRIMARY KEY,
+    name    VARCHAR UNIQUE
+);
+-- No primary key: rows are only ever appended, so no index is maintained on insert.
+CREATE TABLE IF NOT EXISTS train_positions (
+    polled_at    TIMESTAMP_S,
+    date_scraped DATE,
+    train_id     INTEGER,
+    line_id      SMALLINT,
+    dest_id      SMALLINT,
+    next_stop_id SMALLINT,
+    late_min     SMALLINT,     -- minutes late as reported by TrainView
+    lat          FLOAT,
+    lon          FLOAT
+);
+-- Decoded view for analysis.
+CREATE OR REPLACE VIEW train_positions_decoded AS
+SELECT
+    p.polled_at,
+    p.date_scraped,
+    t.train_no,
+    l.name AS line,
+    d.name AS dest,
+    n.name AS next_stop,
+    p.late_min,
+    p.lat,
+    p.lon
+FROM train_positions p
+JOIN position_trains t USING (train_id)
+LEFT JOIN position_lines l USING (line_id)
+LEFT JOIN position_stations d ON d.station_id = p.dest_id
+LEFT JOIN position_stations n ON n.station_id = p.next_stop_id;
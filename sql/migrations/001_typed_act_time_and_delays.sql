@@ -0,0 +1,15 @@
+-- act_time becomes a real TIME ("na" and other non-times become NULL), and delays
+-- relative to the schedule are stored as integer seconds, computed once at load.
+
+-- Signed seconds from `planned` to `observed`, wrapped into [-12h, +12h) so a
+-- train due at 23:55 and arriving at 00:05 is 600 seconds late, not 86,100 early.
+CREATE OR REPLACE MACRO delay_seconds(planned, observed) AS
+    CAST(((date_diff('second', planned, observed) + 43200) % 86400 + 86400) % 86400 - 43200 AS INTEGER);
+
+ALTER TABLE schedules ALTER act_time TYPE TIME USING TRY_CAST(act_time AS TIME);
+ALTER TABLE schedules ADD COLUMN IF NOT EXISTS est_delay_sec INTEGER;
+ALTER TABLE schedules ADD COLUMN IF NOT EXISTS act_delay_sec INTEGER;
+
+UPDATE schedules SET
+    est_delay_sec = delay_seconds(sched_time, est_time),
+    act_delay_sec = delay_seconds(sched_time, act_time);
@@ -0,0 +1,36 @@
+-- Daily delay aggregates, rebuilt per service date by src.aggregates after each
+-- ETL load and read by src.queries. Delays are act_delay_sec of stops with an
+-- actual time ("observed"); on_time counts observed stops within the configured
+-- threshold at refresh time.
+CREATE TABLE IF NOT EXISTS daily_train_delays (
+    date_scraped      DATE,
+    train_no          VARCHAR,
+    stops             INTEGER,
+    observed_stops    INTEGER,
+    on_time_stops     INTEGER,
+    sum_delay_sec     BIGINT,
+    max_delay_sec     INTEGER,
+    PRIMARY KEY (date_scraped, train_no)
+);
+CREATE TABLE IF NOT EXISTS daily_station_delays (
+    date_scraped      DATE,
+    station           VARCHAR,
+    stops             INTEGER,
+    observed_stops    INTEGER,
+    on_time_stops     INTEGER,
+    sum_delay_sec     BIGINT,
+    max_delay_sec     INTEGER,
+    PRIMARY KEY (date_scraped, station)
+);
+-- Hour is the hour of the scheduled time at the station.
+CREATE TABLE IF NOT EXISTS daily_hourly_delays (
+    date_scraped      DATE,
+    station           VARCHAR,
+    hour              TINYINT,
+    stops             INTEGER,
+    observed_stops    INTEGER,
+    on_time_stops     INTEGER,
+    sum_delay_sec     BIGINT,
+    max_delay_sec     INTEGER,
+    PRIMARY KEY (date_scraped, station, hour)
+);
@@ -0,0 +1,7 @@
+-- Single-row counter bumped by every write that changes query results, so readers
+-- can tell whether a cached result is still current.
+CREATE TABLE IF NOT EXISTS data_version (
+    id      INTEGER PRIMARY KEY,
+    version BIGINT
+);
+INSERT INTO data_version VALUES (1, 0) ON CONFLICT DO NOTHING;
@@ -0,0 +1,8 @@
+-- One row per metric per ETL run (see src/metrics.py), so a metric can be
+-- tracked across nights, e.g. WHERE metric = 'fetch.latency_p95_ms'.
+CREATE TABLE IF NOT EXISTS run_metrics (
+    run_started TIMESTAMP,
+    metric      VARCHAR,
+    value       DOUBLE,
+    PRIMARY KEY (run_started, metric)
+);
@@ -0,0 +1,6 @@
+-- Fingerprint of the RRSchedules payload each train was last loaded from (see
+-- src.progress): a content hash, plus the response's ETag and Last-Modified for
+-- conditional requests. A refetch that matches skips transform and load.
+ALTER TABLE etl_progress ADD COLUMN IF NOT EXISTS payload_hash VARCHAR;
+ALTER TABLE etl_progress ADD COLUMN IF NOT EXISTS etag VARCHAR;
+ALTER TABLE etl_progress ADD COLUMN IF NOT EXISTS last_modified VARCHAR;
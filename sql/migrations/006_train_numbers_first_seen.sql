@@ -0,0 +1,3 @@
+-- Poll time at which the collector first observed each train number (see
+-- scripts/collect_train_numbers.py). Set on insert and never rewritten.
+ALTER TABLE train_numbers ADD COLUMN IF NOT EXISTS first_seen TIMESTAMP;
@@ -0,0 +1,104 @@
+"""Aggregation module for project-nexline.
+
+This module maintains the materialized daily delay aggregates read by `src.queries`:
+per train, per station, and per station and scheduled hour. Aggregates are rebuilt
+one service date at a time from `schedules_all` (hot table plus Parquet archive),
+so the ETL only recomputes the dates it has just loaded.
+"""
+from datetime import date
+from typing import Dict, Iterable, List
+
+import duckdb
+
+import config
+from src.db import bump_data_version
+
+# Aggregate table -> grouping columns besides date_scraped
+_AGGREGATES: Dict[str, str] = {
+    "daily_train_delays": "train_no",
+    "daily_station_delays": "station",
+    "daily_hourly_delays": "station, hour",
+}
+
+# One row per stop of the refreshed dates; `schedules_all` reads a train reloaded
+# after its date was archived from the hot table only
+_SOURCE_SQL: str = """
+    CREATE OR REPLACE TEMP TABLE aggregate_source AS
+    SELECT date_scraped, train_no, station, hour(sched_time)::TINYINT AS hour, act_delay_sec
+    FROM schedules_all WHERE list_contains($dates, date_scraped)
+"""
+
+_INSERT_TEMPLATE: str = """
+    INSERT INTO {table}
+    SELECT
+        date_scraped,
+        {keys},
+        count(*),
+        count(act_delay_sec),
+        count_if(act_delay_sec <= $threshold),
+        sum(act_delay_sec),
+        max(act_delay_sec)
+    FROM aggregate_source
+    GROUP BY date_scraped, {keys}
+"""
+
+
+def refresh_daily_aggregates(
+    conn: duckdb.DuckDBPyConnection,
+    dates: Iterable[date],
+    threshold_sec: int = config.ON_TIME_THRESHOLD_SEC,
+) -> int:
+    """
+    Rebuild every daily aggregate table for the given service dates in one transaction.
+
+    Bumps the data version, so cached query results are recomputed.
+
+    Args:
+        conn (duckdb.DuckDBPyConnection): Connection to write through.
+        dates (Iterable[date]): Service dates to rebuild.
+        threshold_sec (int, optional): Maximum delay, in seconds, of an on-time
+            stop. Defaults to `config.ON_TIME_THRESHOLD_SEC`.
+
+    Returns:
+        int: The number of service dates rebuilt.
+
+    Raises:
+        Exception: Propagates any database errors after rolling back.
+    """
+    days = sorted(set(dates))
+    if not days:
+        return 0
+
+    conn.begin()
+    try:
+        conn.execute(_SOURCE_SQL, {"dates": days})
+        for table, keys in _AGGREGATES.items():
+            conn.execute(f"DELETE FROM {table} WHERE list_contains($dates, date_scraped)", {"dates": days})
+            conn.execute(_INSERT_TEMPLATE.format(table=table, keys=keys), {"threshold": threshold_sec})
+        conn.execute("DROP TABLE aggregate_source")
+        bump_data_version(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(days)
+
+
+def get_unaggregated_dates(conn: duckdb.DuckDBPyConnection) -> List[date]:
+    """
+    Find service dates in the hot `schedules` table that have no aggregates yet.
+
+    Args:
+        conn (duckdb.DuckDBPyConnection): Connection to read through.
+
+    Returns:
+        List[date]: The dates, in ascending order.
+    """
+    rows = conn.execute(
+        """
+        SELECT DISTINCT date_scraped FROM schedules
+        WHERE date_scraped NOT IN (SELECT date_scraped FROM daily_train_delays)
+        ORDER BY 1
+        """
+    ).fetchall()
+    return [row[0] for row in rows]
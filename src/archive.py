@@ -0,0 +1,215 @@
+"""Archival module for project-nexline.
+
+This module moves closed service dates out of the hot `schedules` table into a
+Hive-partitioned, zstd-compressed Parquet archive next to the database file:
+
+    archive/schedules/year=YYYY/month=MM/day_YYYY-MM-DD_<id>.parquet
+
+Archiving writes one small file per service date and then deletes that date from
+`schedules`, so the table, its primary-key index and nightly inserts stay small.
+Compaction later merges a month's small files into one sorted file; a date whose
+archived rows were corrected in the hot table has its partition rewritten the same
+way when it is archived again. Readers query both tiers through the `schedules_all`
+view (see `src.db.refresh_schedules_view`).
+"""
+import uuid
+from datetime import date
+from pathlib import Path
+from typing import Dict, List
+
+import duckdb
+
+from src.db import get_archive_dir, refresh_schedules_view
+
+# Rows of one service date in the hot table not yet present in the given files
+_UNARCHIVED_SQL: str = """
+    SELECT s.* FROM (SELECT * FROM schedules WHERE date_scraped = $day) s
+    ANTI JOIN (
+        SELECT train_no, station
+        FROM read_parquet($files, hive_partitioning = false, union_by_name = true)
+        WHERE date_scraped = $day
+    ) a USING (train_no, station)
+"""
+
+# Rows of one service date in the hot table archived with different times, e.g.
+# after a replay corrected them; act_time is cast as older files store it as text
+_STALE_SQL: str = """
+    SELECT count(*) FROM (SELECT * FROM schedules WHERE date_scraped = $day) s
+    JOIN (
+        SELECT train_no, station, sched_time, est_time, TRY_CAST(act_time AS TIME) AS act_time
+        FROM read_parquet($files, hive_partitioning = false, union_by_name = true)
+        WHERE date_scraped = $day
+    ) a USING (train_no, station)
+    WHERE s.sched_time IS DISTINCT FROM a.sched_time
+        OR s.est_time IS DISTINCT FROM a.est_time
+        OR s.act_time IS DISTINCT FROM a.act_time
+"""
+
+# A partition's archived rows with those of one service date replaced by the hot table's
+_REWRITE_SQL: str = """
+    SELECT * FROM (
+        SELECT * FROM read_parquet($files, hive_partitioning = false, union_by_name = true)
+        ANTI JOIN (
+            SELECT date_scraped, train_no, station FROM schedules WHERE date_scraped = $day
+        ) h USING (date_scraped, train_no, station)
+    )
+    UNION ALL BY NAME
+    SELECT * FROM schedules WHERE date_scraped = $day
+    ORDER BY date_scraped, train_no, station
+"""
+
+_PARQUET_OPTIONS: str = "(FORMAT PARQUET, COMPRESSION ZSTD)"
+
+
+def _partition_dir(service_date: date) -> Path:
+    """
+    Get the Hive partition directory holding a service date.
+
+    Args:
+        service_date (date): The service date.
+
+    Returns:
+        Path: The `year=YYYY/month=MM` directory under the archive root.
+    """
+    return get_archive_dir() / f"year={service_date.year}" / f"month={service_date.month:02d}"
+
+
+def _copy_to_parquet(conn: duckdb.DuckDBPyConnection, query: str, params: dict, target: Path) -> None:
+    """
+    Write a query result to a Parquet file, replacing the target atomically.
+
+    Args:
+        conn (duckdb.DuckDBPyConnection): Connection to run the query on.
+        query (str): The SELECT statement to export.
+        params (dict): Named parameters of `query`.
+        target (Path): Final location of the file.
+    """
+    target.parent.mkdir(parents=True, exist_ok=True)
+    partial = target.with_suffix(".parquet.tmp")
+    path = partial.as_posix().replace("'", "''")
+    conn.execute(f"COPY ({query}) TO '{path}' {_PARQUET_OPTIONS}", params)
+    partial.replace(target)
+
+
+def archive_date(conn: duckdb.DuckDBPyConnection, service_date: date) -> int:
+    """
+    Move one service date from the `schedules` table to the Parquet archive.
+
+    Rows already archived by an earlier run (e.g. when a date was reloaded after
+    archiving) are not written twice. If any of them changed since (e.g. a replay
+    corrected them), the partition is rewritten instead, with the date's archived
+    rows replaced by the hot ones. The date is only deleted from `schedules` once
+    every row is confirmed present in the archive.
+
+    Args:
+        conn (duckdb.DuckDBPyConnection): Connection to read and delete through.
+        service_date (date): The service date to archive.
+
+    Returns:
+        int: The number of rows newly written to the archive, counting every hot
+            row of the date when the partition was rewritten.
+
+    Raises:
+        RuntimeError: If rows are still missing from the archive after writing.
+    """
+    partition = _partition_dir(service_date)
+    existing = [p.as_posix() for p in sorted(partition.glob("*.parquet"))]
+    if existing and conn.execute(_STALE_SQL, {"day": service_date, "files": existing}).fetchone()[0]:
+        written = conn.execute(
+            "SELECT count(*) FROM schedules WHERE date_scraped = ?", [service_date]
+        ).fetchone()[0]
+        target = partition / f"compacted_{uuid.uuid4().hex[:8]}.parquet"
+        _copy_to_parquet(conn, _REWRITE_SQL, {"day": service_date, "files": existing}, target)
+        for path in existing:
+            Path(path).unlink()
+    else:
+        if existing:
+            query = _UNARCHIVED_SQL
+            params: dict = {"day": service_date, "files": existing}
+        else:
+            query = "SELECT * FROM schedules WHERE date_scraped = $day"
+            params = {"day": service_date}
+
+        written = conn.execute(f"SELECT count(*) FROM ({query})", params).fetchone()[0]
+        if written:
+            target = partition / f"day_{service_date.isoformat()}_{uuid.uuid4().hex[:8]}.parquet"
+            _copy_to_parquet(conn, query + " ORDER BY train_no, station", params, target)
+
+    files = [p.as_posix() for p in sorted(partition.glob("*.parquet"))]
+    if files:
+        missing = conn.execute(
+            f"SELECT count(*) FROM ({_UNARCHIVED_SQL})", {"day": service_date, "files": files}
+        ).fetchone()[0]
+        if missing:
+            raise RuntimeError(f"{missing} rows of {service_date} missing from archive; not deleting")
+
+    conn.execute("DELETE FROM schedules WHERE date_scraped = ?", [service_date])
+    return int(written)
+
+
+def archive_before(conn: duckdb.DuckDBPyConnection, cutoff: date) -> Dict[date, int]:
+    """
+    Archive every service date in `schedules` earlier than `cutoff`.
+
+    Args:
+        conn (duckdb.DuckDBPyConnection): Connection to read and delete through.
+        cutoff (date): First service date to keep in the hot table.
+
+    Returns:
+        Dict[date, int]: Rows newly written to the archive, per archived date.
+    """
+    dates: List[date] = [
+        row[0]
+        for row in conn.execute(
+            "SELECT DISTINCT date_scraped FROM schedules WHERE date_scraped < ? ORDER BY 1",
+            [cutoff],
+        ).fetchall()
+    ]
+    archived = {service_date: archive_date(conn, service_date) for service_date in dates}
+    if archived:
+        refresh_schedules_view(conn)
+        # Releases the space of deleted row groups back to the database file
+        conn.execute("CHECKPOINT")
+    return archived
+
+
+def compact_archive(conn: duckdb.DuckDBPyConnection, min_files: int = 2) -> Dict[str, int]:
+    """
+    Merge the small files of each archive partition into one sorted file.
+
+    Duplicate rows (left behind by an interrupted compaction or rewrite) are
+    dropped, keeping the copy from the most recently written file, so compaction
+    can safely be re-run.
+
+    Args:
+        conn (duckdb.DuckDBPyConnection): Connection used to read and write Parquet.
+        min_files (int, optional): Only compact partitions holding at least this
+            many files. Defaults to 2.
+
+    Returns:
+        Dict[str, int]: Number of files merged, keyed by partition path relative
+            to the archive root (e.g. "year=2025/month=06").
+    """
+    root = get_archive_dir()
+    compacted: Dict[str, int] = {}
+    for partition in sorted(root.glob("year=*/month=*")):
+        # Newest first, so the window below keeps the latest copy of a row
+        files = sorted(partition.glob("*.parquet"), key=lambda p: p.stat().st_mtime_ns, reverse=True)
+        if len(files) < max(2, min_files):
+            continue
+        query = """
+            SELECT * EXCLUDE (filename)
+            FROM read_parquet($files, hive_partitioning = false, union_by_name = true, filename = true)
+            QUALIFY row_number() OVER (
+                PARTITION BY date_scraped, train_no, station ORDER BY list_position($files, filename)
+            ) = 1
+            ORDER BY date_scraped, train_no, station
+        """
+        target = partition / f"compacted_{uuid.uuid4().hex[:8]}.parquet"
+        _copy_to_parquet(conn, query, {"files": [p.as_posix() for p in files]}, target)
+        for path in files:
+            path.unlink()
+        compacted[partition.relative_to(root).as_posix()] = len(files)
+    if compacted:
+        refresh_schedules_view(conn)
+    return compacted
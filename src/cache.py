@@ -0,0 +1,92 @@
+"""Result caching module for project-nexline.
+
+This module provides a bounded, thread-safe LRU cache whose entries are tagged with
+the data version they were computed at (see `src.db.get_data_version`). An entry is
+only served while the version is unchanged and it is younger than an optional TTL,
+so repeated reads come from memory but no result survives a load.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+
+class ResultCache:
+    """
+    Least-recently-used cache of query results keyed on arguments and data version.
+
+    Holds at most `maxsize` entries; inserting into a full cache evicts the entry
+    used least recently.
+    """
+
+    def __init__(self, maxsize: int = 128, ttl: Optional[float] = None) -> None:
+        """
+        Initialize an empty cache.
+
+        Args:
+            maxsize (int, optional): Maximum number of entries. Defaults to 128.
+            ttl (Optional[float], optional): Seconds after which an entry expires
+                even if the data version is unchanged. Defaults to no expiry.
+
+        Raises:
+            ValueError: If `maxsize` is not positive.
+        """
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Tuple[int, float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Return the number of entries held."""
+        return len(self._entries)
+
+    def get(self, key: Hashable, version: int) -> Tuple[bool, Any]:
+        """
+        Look up a result computed at the given data version.
+
+        Args:
+            key (Hashable): Identifies the query and its arguments.
+            version (int): The current data version.
+
+        Returns:
+            Tuple[bool, Any]: (True, value) on a hit; (False, None) otherwise. A
+                stale or expired entry is dropped.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_version, stored_at, value = entry
+                expired = self.ttl is not None and time.monotonic() - stored_at > self.ttl
+                if stored_version == version and not expired:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key: Hashable, version: int, value: Any) -> None:
+        """
+        Store a result computed at the given data version.
+
+        Args:
+            key (Hashable): Identifies the query and its arguments.
+            version (int): The data version the value was computed at.
+            value (Any): The result to cache.
+        """
+        with self._lock:
+            self._entries[key] = (version, time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop every entry and reset the hit and miss counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
@@ -1,70 +1,400 @@
 """Database module for managing DuckDB connection and schema initialization.
 
 This module provides functions to connect to the DuckDB database file and initialize
-its schema by loading all SQL DDL files from the `sql/` directory.
+its schema. The DDL files in the `sql/` directory form the baseline; later changes are
+numbered migrations in `sql/migrations/`, tracked in the `schema_version` table so
+that only pending ones are applied. It also locates the Parquet archive of closed
+service dates kept next to the database file (see `src.archive`) and maintains the
+`schedules_all` view over both tiers.
+
+Bulk writers stage their rows through `columns_source` and `encode_columns`: the
+rows travel as one JSON document of equal-length column arrays, bound as a single
+parameter and unnested into typed columns by DuckDB's `from_json`. Binding the
+arrays as typed list parameters instead costs about 0.35 ms per value in the
+Python client, over a hundred times more.
 """
+import json
+import time
 from datetime import date
 from pathlib import Path
-from typing import List
+from typing import Any, List, Mapping, Optional, Sequence, Set, Tuple
 
 import duckdb
 
+import config
+
 # Base directory of the project (two levels up from this file)
 BASE_DIR: Path = Path(__file__).parent.parent
 # Path to the DuckDB database file
 DB_FILE: Path = BASE_DIR / 'data' / 'schedules.duckdb'
 # Directory containing all SQL schema files
 SCHEMA_DIR: Path = BASE_DIR / 'sql'
+# (database file, schema directory) pairs already brought up to date by this process
+_CURRENT_SCHEMAS: Set[Tuple[Path, Path]] = set()
+
+
+def is_lock_error(error: Exception) -> bool:
+    """
+    Tell whether a DuckDB error means another process holds the database file lock.
 
+    Args:
+        error (Exception): The error raised while opening a database.
 
-def get_connection() -> duckdb.DuckDBPyConnection:
+    Returns:
+        bool: True for a file-lock conflict.
+    """
+    return isinstance(error, duckdb.IOException) and 'lock' in str(error).lower()
+
+
+def get_connection(
+    read_only: bool = False,
+    lock_timeout: float = config.DB_LOCK_TIMEOUT_SEC,
+) -> duckdb.DuckDBPyConnection:
     """
     Get a DuckDB connection to the schedules database file.
 
+    DuckDB lets only one process open a file while it is being written, so if
+    another process briefly holds it (e.g. a reader refreshing its snapshot, see
+    `src.readers`), the connection is retried until `lock_timeout` runs out.
+
+    Args:
+        read_only (bool, optional): Open the file read-only. Defaults to False.
+        lock_timeout (float, optional): Seconds to keep retrying while the file
+            is locked. Defaults to `config.DB_LOCK_TIMEOUT_SEC`.
+
     Returns:
         duckdb.DuckDBPyConnection: An open connection to the DuckDB file.
+
+    Raises:
+        duckdb.IOException: If the file is still locked after `lock_timeout`.
     """
     DB_FILE.parent.mkdir(parents=True, exist_ok=True)
 
-    return duckdb.connect(database=str(DB_FILE), read_only=False)
+    deadline = time.monotonic() + lock_timeout
+    delay = 0.05
+    while True:
+        try:
+            return duckdb.connect(database=str(DB_FILE), read_only=read_only)
+        except duckdb.IOException as error:
+            if not is_lock_error(error) or time.monotonic() + delay > deadline:
+                raise
+        time.sleep(delay)
+        delay = min(delay * 2, 1.0)
 
 
-def init_db() -> None:
+def init_db(conn: Optional[duckdb.DuckDBPyConnection] = None) -> List[int]:
     """
-    Initialize the database schema by executing all DDL files in the SQL directory.
+    Bring the database schema up to date.
 
-    Iterates over each `.sql` file in `sql/`, sorted alphabetically, and executes their
-    contents against the DuckDB database to ensure required tables exist.
+    Startup costs one query: the stored schema version is compared with the newest
+    migration in `sql/migrations/`, and only pending migrations are applied. A
+    database without a `schema_version` table (new, or created before versioning)
+    first gets the baseline DDL: every `.sql` file in `sql/`, sorted alphabetically.
+    Once a database is current, later calls in the same process return immediately.
+
+    Args:
+        conn (Optional[duckdb.DuckDBPyConnection], optional): Open connection to
+            the current `DB_FILE` to migrate through. Defaults to a short-lived
+            connection.
+
+    Returns:
+        List[int]: Versions applied by this call, in order (0 is the baseline).
 
     Raises:
         FileNotFoundError: If the schema directory does not exist.
     """
+    key = (DB_FILE.resolve(), SCHEMA_DIR.resolve())
+    if key in _CURRENT_SCHEMAS:
+        return []
     if not SCHEMA_DIR.exists() or not SCHEMA_DIR.is_dir():
         raise FileNotFoundError(f"Schema directory not found: {SCHEMA_DIR}")
 
-    # Execute all schema DDL files in order
-    conn = get_connection()
-    for schema_file in sorted(SCHEMA_DIR.glob('*.sql')):
-        ddl = schema_file.read_text()
-        conn.execute(ddl)
-    conn.close()
+    owns_conn = conn is None
+    if conn is None:
+        conn = get_connection()
+    try:
+        applied = apply_migrations(conn)
+        if applied:
+            refresh_schedules_view(conn)
+    finally:
+        if owns_conn:
+            conn.close()
+    _CURRENT_SCHEMAS.add(key)
+    return applied
+
+
+def get_schema_version(conn: duckdb.DuckDBPyConnection) -> Optional[int]:
+    """
+    Read the schema version of a database.
+
+    Args:
+        conn (duckdb.DuckDBPyConnection): Connection to the database.
+
+    Returns:
+        Optional[int]: The highest applied version, or None if the database has
+            no `schema_version` table yet.
+    """
+    try:
+        return conn.execute("SELECT max(version) FROM schema_version").fetchone()[0]
+    except duckdb.CatalogException:
+        return None
+
+
+def list_migrations() -> List[Tuple[int, Path]]:
+    """
+    List the migration files in `sql/migrations/`, ordered by version.
+
+    Migration files are named `<version>_<description>.sql`, e.g.
+    `001_typed_act_time_and_delays.sql`; versions start at 1.
+
+    Returns:
+        List[Tuple[int, Path]]: (version, path) pairs in ascending version order.
+
+    Raises:
+        ValueError: If a file name does not start with a positive numeric version
+            or two files share a version.
+    """
+    migrations: List[Tuple[int, Path]] = []
+    for path in sorted((SCHEMA_DIR / 'migrations').glob('*.sql')):
+        prefix = path.name.split('_', 1)[0]
+        if not prefix.isdigit() or int(prefix) == 0:
+            raise ValueError(f"Migration file lacks a positive numeric version: {path.name}")
+        migrations.append((int(prefix), path))
+    versions = [version for version, _ in migrations]
+    if len(set(versions)) != len(versions):
+        raise ValueError("Duplicate migration versions in sql/migrations")
+    return sorted(migrations)
+
+
+def apply_migrations(conn: duckdb.DuckDBPyConnection) -> List[int]:
+    """
+    Apply the baseline DDL if needed, then every migration newer than the schema version.
+
+    Each step runs in its own transaction together with the `schema_version` row
+    recording it, so a failed step leaves neither partial changes nor a version
+    behind.
+
+    Args:
+        conn (duckdb.DuckDBPyConnection): Connection to migrate through.
+
+    Returns:
+        List[int]: Versions applied by this call, in order (0 is the baseline).
+
+    Raises:
+        Exception: Propagates the error of a failing step after rolling it back.
+    """
+    current = get_schema_version(conn)
+    migrations = list_migrations()
+    latest = migrations[-1][0] if migrations else 0
+    if current is not None and current >= latest:
+        return []
+
+    steps: List[Tuple[int, str, List[Path]]] = []
+    if current is None:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS schema_version ("
+            "version INTEGER PRIMARY KEY, name VARCHAR, applied_at TIMESTAMP)"
+        )
+        steps.append((0, 'baseline', sorted(SCHEMA_DIR.glob('*.sql'))))
+        current = -1
+    steps.extend((version, path.stem, [path]) for version, path in migrations if version > current)
+
+    applied: List[int] = []
+    for version, name, paths in steps:
+        conn.begin()
+        try:
+            for path in paths:
+                conn.execute(path.read_text())
+            conn.execute(
+                "INSERT INTO schema_version VALUES (?, ?, current_timestamp) ON CONFLICT DO NOTHING",
+                [version, name],
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+
+def get_archive_dir() -> Path:
+    """
+    Get the root of the Parquet archive that belongs to the current database file.
+
+    Returns:
+        Path: `archive/schedules` next to `DB_FILE`, partitioned as
+            `year=YYYY/month=MM/*.parquet`.
+    """
+    return DB_FILE.parent / 'archive' / 'schedules'
+
+
+def get_raw_dir() -> Path:
+    """
+    Get the root of the raw response store that belongs to the current database file.
+
+    Returns:
+        Path: `raw/rrschedules` next to `DB_FILE`, partitioned as
+            `date=YYYY-MM-DD/*.parquet`.
+    """
+    return DB_FILE.parent / 'raw' / 'rrschedules'
+
+
+def refresh_schedules_view(conn: duckdb.DuckDBPyConnection) -> None:
+    """
+    (Re)create the `schedules_all` view over the hot table and the Parquet archive.
+
+    A train whose date was reloaded after archiving is read from the hot table
+    only, so each stop appears once. DuckDB checks that the archive glob matches
+    files when the view is created, so this must run again once the archive gains
+    its first files. Does nothing if the database has no `schedules` table.
+
+    Args:
+        conn (duckdb.DuckDBPyConnection): Connection to create the view through.
+    """
+    has_schedules = conn.execute(
+        "SELECT count(*) FROM duckdb_tables() WHERE table_name = 'schedules'"
+    ).fetchone()[0]
+    if not has_schedules:
+        return
+    archive_dir = get_archive_dir()
+    pattern = f"{archive_dir.as_posix()}/*/*/*.parquet".replace("'", "''")
+    sql = 'CREATE OR REPLACE VIEW schedules_all AS SELECT * FROM schedules'
+    if any(archive_dir.glob('*/*/*.parquet')):
+        # BY NAME, so columns missing from older archive files read as NULL; the
+        # anti-join drops archived copies of trains reloaded into the hot table
+        sql += (
+            " UNION ALL BY NAME SELECT * EXCLUDE (year, month)"
+            f" FROM read_parquet('{pattern}', hive_partitioning = true, union_by_name = true)"
+            " ANTI JOIN (SELECT DISTINCT date_scraped, train_no FROM schedules) USING (date_scraped, train_no)"
+        )
+    conn.execute(sql)
+
+
+def get_data_version(conn: duckdb.DuckDBPyConnection) -> int:
+    """
+    Read the data-version counter.
+
+    Args:
+        conn (duckdb.DuckDBPyConnection): Connection to read through.
+
+    Returns:
+        int: The current version; it grows whenever schedules or aggregates change.
+    """
+    return conn.execute("SELECT version FROM data_version").fetchone()[0]
+
+
+def bump_data_version(conn: duckdb.DuckDBPyConnection) -> None:
+    """
+    Increment the data-version counter, invalidating cached query results.
+
+    Call inside the transaction that makes the change, so the new version becomes
+    visible together with the data.
+
+    Args:
+        conn (duckdb.DuckDBPyConnection): Connection to write through.
+    """
+    conn.execute("UPDATE data_version SET version = version + 1")
+
+
+def columns_source(types: Mapping[str, str], param: str = '?', ordinal: Optional[str] = None) -> str:
+    """
+    Build a subquery yielding one typed row per position of a staged column document.
+
+    Args:
+        types (Mapping[str, str]): DuckDB type per column, in output order.
+        param (str, optional): Placeholder the document is bound to, e.g. `$rows`.
+            Defaults to '?'.
+        ordinal (Optional[str], optional): Name of an extra column numbering the rows
+            from 0 in document order. Defaults to None (no such column).
+
+    Returns:
+        str: A parenthesized SELECT usable wherever a table is.
+    """
+    schema = json.dumps({column: f'{sql_type}[]' for column, sql_type in types.items()}).replace("'", "''")
+    columns = [f'unnest(s.{column}) AS {column}' for column in types]
+    if ordinal is not None:
+        columns.append(f'unnest(range(len(s.{next(iter(types))}))) AS {ordinal}')
+    return f"(SELECT {', '.join(columns)} FROM (SELECT from_json({param}::JSON, '{schema}') AS s))"
+
+
+def encode_columns(columns: Mapping[str, Sequence[Any]]) -> str:
+    """
+    Encode columns as the document bound to a `columns_source` placeholder.
+
+    Args:
+        columns (Mapping[str, Sequence[Any]]): Equal-length lists of values per
+            column; dates and times as ISO strings.
+
+    Returns:
+        str: The JSON document.
+    """
+    return json.dumps(dict(columns))
 
 
-def get_stored_train_numbers(service_date: date) -> List[str]:
+def get_stored_train_numbers(
+    service_date: date,
+    conn: Optional[duckdb.DuckDBPyConnection] = None,
+) -> List[str]:
     """
     Retrieve distinct train numbers stored for a given service date.
 
     Args:
         service_date (date): The service date to filter train numbers by.
+        conn (Optional[duckdb.DuckDBPyConnection], optional): Open connection to
+            read through. Defaults to a short-lived connection.
 
     Returns:
         List[str]: A list of train numbers saved for that date.
     """
-    conn = get_connection()
+    owns_conn = conn is None
+    if conn is None:
+        conn = get_connection()
     try:
         rows = conn.execute(
             "SELECT train_no FROM train_numbers WHERE date_scraped = ?", [service_date]
         ).fetchall()
     finally:
-        conn.close()
+        if owns_conn:
+            conn.close()
+    return [row[0] for row in rows]
+
+
+def get_incomplete_train_numbers(
+    service_date: date,
+    conn: Optional[duckdb.DuckDBPyConnection] = None,
+) -> List[str]:
+    """
+    Retrieve the trains of a service date whose stored schedule is not final yet.
+
+    A train is incomplete while any of its stops lacks an actual time, or while it
+    was collected but has no stored stops at all.
+
+    Args:
+        service_date (date): The service date to check.
+        conn (Optional[duckdb.DuckDBPyConnection], optional): Open connection to
+            read through. Defaults to a short-lived connection.
+
+    Returns:
+        List[str]: Train numbers in ascending order.
+    """
+    owns_conn = conn is None
+    if conn is None:
+        conn = get_connection()
+    try:
+        rows = conn.execute(
+            """
+            SELECT train_no FROM schedules WHERE date_scraped = $date AND act_time IS NULL
+            UNION
+            SELECT train_no FROM train_numbers t
+            WHERE date_scraped = $date
+              AND NOT EXISTS (
+                  SELECT 1 FROM schedules s WHERE s.date_scraped = $date AND s.train_no = t.train_no
+              )
+            ORDER BY train_no
+            """,
+            {"date": service_date},
+        ).fetchall()
+    finally:
+        if owns_conn:
+            conn.close()
     return [row[0] for row in rows]
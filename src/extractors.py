@@ -1,41 +1,138 @@
 """Extraction module for project-nexline.
 
 This module provides functionality to fetch SEPTA's TrainView API endpoint and
-extract a set of train numbers operating on the current service day.
+extract a set of train numbers operating on the current service day, as well as
+the live position, lateness and next stop of every train in the same payload.
 """
-from typing import Set, Optional
-
-import requests
+from typing import Any, Dict, List, Set, Optional, TypedDict
 
 import config
+from src import http_client
 
 
-def get_train_numbers() -> Set[str]:
-    """
-    Fetch the TrainView API and return a set of unique train numbers.
+class TrainPosition(TypedDict):
+    """Type definition for one train's live state in a TrainView poll."""
+    train_no: str
+    line: str
+    dest: str
+    next_stop: str
+    lat: Optional[float]
+    lon: Optional[float]
+    late: Optional[int]
+
 
-    Performs an HTTP GET request to the configured TRAINVIEW_URL, parses the JSON
-    response to extract train numbers, and returns them without duplicates.
+def fetch_trainview() -> List[Dict[str, Any]]:
+    """
+    Fetch the raw TrainView payload.
 
     Returns:
-        Set[str]: A set of train numbers as strings.
+        List[Dict[str, Any]]: One JSON object per train currently in service.
 
     Raises:
         requests.HTTPError: If the HTTP request to the TrainView API fails.
         ValueError: If the JSON structure is unexpected.
     """
-    response = requests.get(config.TRAINVIEW_URL)
+    response = http_client.get_session().get(config.TRAINVIEW_URL)
     response.raise_for_status()
 
     data = response.json()
     if not isinstance(data, list):
         raise ValueError("Unexpected JSON format: expected a list of train records")
+    return data
+
+
+def _clean_train_no(raw: Any) -> Optional[str]:
+    """
+    Normalize a TrainView train number, dropping the dots SEPTA sometimes adds.
+
+    Args:
+        raw (Any): The `trainno` value from the payload.
+
+    Returns:
+        Optional[str]: The cleaned train number, or None if missing.
+    """
+    if not raw:
+        return None
+    return str(raw).replace(".", "")  # Data cleaning from source data
+
+
+def _to_float(raw: Any) -> Optional[float]:
+    """Convert a payload value to float, returning None if it is not numeric."""
+    try:
+        return float(raw)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_int(raw: Any) -> Optional[int]:
+    """Convert a payload value to int, returning None if it is not numeric."""
+    try:
+        return int(float(raw))
+    except (TypeError, ValueError):
+        return None
 
+
+def extract_train_numbers(data: List[Dict[str, Any]]) -> Set[str]:
+    """
+    Extract the unique train numbers from a TrainView payload.
+
+    Args:
+        data (List[Dict[str, Any]]): The decoded TrainView payload.
+
+    Returns:
+        Set[str]: A set of train numbers as strings.
+    """
     train_numbers: Set[str] = set()
     for record in data:
-        train_no: Optional[str] = record.get("trainno")
+        train_no = _clean_train_no(record.get("trainno"))
         if train_no:
-            train_no = train_no.replace(".", "")  # Data cleaning from source data
-            train_numbers.add(str(train_no))
-
+            train_numbers.add(train_no)
     return train_numbers
+
+
+def extract_positions(data: List[Dict[str, Any]]) -> List[TrainPosition]:
+    """
+    Extract each train's position, lateness and next stop from a TrainView payload.
+
+    Args:
+        data (List[Dict[str, Any]]): The decoded TrainView payload.
+
+    Returns:
+        List[TrainPosition]: One entry per record with a train number; values that
+            are missing or not numeric become None (or "" for text fields).
+    """
+    positions: List[TrainPosition] = []
+    for record in data:
+        train_no = _clean_train_no(record.get("trainno"))
+        if not train_no:
+            continue
+        positions.append(
+            TrainPosition(
+                train_no=train_no,
+                line=str(record.get("line") or ""),
+                dest=str(record.get("dest") or ""),
+                next_stop=str(record.get("nextstop") or ""),
+                lat=_to_float(record.get("lat")),
+                lon=_to_float(record.get("lon")),
+                late=_to_int(record.get("late")),
+            )
+        )
+    return positions
+
+
+def get_train_numbers() -> Set[str]:
+    """
+    Fetch the TrainView API and return a set of unique train numbers.
+
+    Performs an HTTP GET request to the configured TRAINVIEW_URL over the shared
+    pooled session, parses the JSON response to extract train numbers, and returns
+    them without duplicates.
+
+    Returns:
+        Set[str]: A set of train numbers as strings.
+
+    Raises:
+        requests.HTTPError: If the HTTP request to the TrainView API fails.
+        ValueError: If the JSON structure is unexpected.
+    """
+    return extract_train_numbers(fetch_trainview())
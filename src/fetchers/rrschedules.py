@@ -1,15 +1,40 @@
 """Fetcher for project-nexline: RRSchedules endpoint.
 
 This module provides functionality to retrieve the schedule for a given train number
-from SEPTA's RRSchedules API, handling rate-limiting and retry logic.
+from SEPTA's RRSchedules API. `fetch_payload_once_async` makes a single attempt
+without blocking the event loop, paced through a token bucket shared by every
+in-flight request, and can make it conditional on the ETag or Last-Modified of an
+earlier response. It returns the decoded JSON before validation, so callers can
+keep raw payloads (see `src.raw_store`); `parse_records` validates it. Retries are
+scheduled by the caller (see `src.pipeline`).
+
+Only transient failures are worth retrying: connection errors, timeouts, 408, 425,
+429 and 5xx responses, raised as `TransientFetchError` with the suggested backoff.
+Other errors, such as 404 for a cancelled train, are raised as is. A `Retry-After`
+header lengthens the backoff up to `config.HTTP_MAX_RETRY_AFTER_SEC`.
 """
+import asyncio
 import time
-from typing import List, TypedDict
+from concurrent.futures import Executor
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Optional, Tuple, TypedDict
 
 import requests
-from requests.exceptions import HTTPError
+from requests.exceptions import ConnectionError, RequestException, Timeout
 
 import config
+from src import http_client
+from src.metrics import RunMetrics
+from src.ratelimit import AdaptiveLimiter, CircuitBreaker, TokenBucket
+
+# Limiter shared by every request made in this process
+RATE_LIMITER: TokenBucket = TokenBucket(config.RATE_LIMIT_RPS)
+
+
+# Status codes worth retrying besides 5xx
+_TRANSIENT_STATUS = {408, 425, 429}
 
 
 class ScheduleRecord(TypedDict):
@@ -20,56 +45,71 @@ class ScheduleRecord(TypedDict):
     act_tm: str
 
 
-def fetch_schedule(
-        train_no: str,
-        max_retries: int = 3,
-        retry_backoff: float = 0.5,
-) -> List[ScheduleRecord]:
+class FetchResult(TypedDict):
+    """Outcome of one successful attempt by `fetch_payload_once_async`."""
+    payload: Any                  # decoded JSON body; None if not modified
+    not_modified: bool            # the server answered 304 to a conditional request
+    etag: Optional[str]
+    last_modified: Optional[str]
+
+
+def is_transient(error: RequestException, response: Optional[requests.Response]) -> bool:
     """
-    Fetch the schedule for a specific train number, with retries and rate-limiting.
+    Decide whether a failed request may succeed if retried.
 
     Args:
-        train_no (str): The train number to fetch the schedule for.
-        max_retries (int, optional): Maximum number of retry attempts on HTTP errors.
-            Defaults to 3.
-        retry_backoff (float, optional): Base backoff time in seconds for retries.
-            Defaults to 0.5.
+        error (RequestException): The error raised by sending the request or by
+            `raise_for_status`.
+        response (Optional[requests.Response]): The response, if one was received.
 
     Returns:
-        List[ScheduleRecord]: A list of schedule records, each containing:
-            - station: Name of the station.
-            - sched_tm: Scheduled time (e.g. "15:08").
-            - est_tm: Estimated time (e.g. "15:11").
-            - act_tm: Actual time or "na".
+        bool: True for connection errors, timeouts, 408, 425, 429 and 5xx.
+    """
+    if isinstance(error, (ConnectionError, Timeout)) or response is None:
+        return True
+    return response.status_code in _TRANSIENT_STATUS or response.status_code >= 500
 
-    Raises:
-        HTTPError: If the HTTP request ultimately fails after retries.
-        ValueError: If the JSON response is not a list.
-        RuntimeError: If no response is received.
+
+def retry_delay(response: Optional[requests.Response], attempts: int, retry_backoff: float) -> float:
     """
-    url = config.RRSCHEDULES_URL
-    params = {"req1": train_no}
+    Work out how long to wait before the next attempt.
 
-    response = None  # type: ignore
-    attempts = 0
-    total_attempts = max_retries + 1
+    Args:
+        response (Optional[requests.Response]): The failed response, if any.
+        attempts (int): Failed attempts so far, at least 1.
+        retry_backoff (float): Base backoff time in seconds.
 
-    while attempts < total_attempts:
-        response = requests.get(url, params=params)
+    Returns:
+        float: The exponential backoff, or the server's `Retry-After` (seconds or
+            HTTP date, capped at `config.HTTP_MAX_RETRY_AFTER_SEC`) if longer.
+    """
+    delay = retry_backoff * (2 ** (attempts - 1))
+    header = response.headers.get("Retry-After") if response is not None else None
+    if header:
         try:
-            response.raise_for_status()
-            break
-        except HTTPError:
-            attempts += 1
-            if attempts >= total_attempts:
-                raise
-            backoff_time = retry_backoff * (2 ** (attempts - 1))
-            time.sleep(backoff_time)
-
-    if response is None:
-        raise RuntimeError("fetch_schedule did not receive a response.")
-
-    data = response.json()
+            requested = float(header)
+        except ValueError:
+            try:
+                requested = (parsedate_to_datetime(header) - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                requested = 0.0
+        delay = max(delay, min(requested, config.HTTP_MAX_RETRY_AFTER_SEC))
+    return delay
+
+
+def parse_records(data: Any) -> List[ScheduleRecord]:
+    """
+    Convert a decoded RRSchedules JSON payload into schedule records.
+
+    Args:
+        data (Any): The decoded JSON body.
+
+    Returns:
+        List[ScheduleRecord]: One record per item in the payload.
+
+    Raises:
+        ValueError: If the JSON payload is not a list.
+    """
     if not isinstance(data, list):
         raise ValueError(
             "Unexpected JSON format: expected a list of schedule records"
@@ -85,7 +125,141 @@ def fetch_schedule(
                 act_tm=str(item.get("act_tm", "")),
             )
         )
+    return records
 
-    time.sleep(1 / config.RATE_LIMIT_RPS)
 
-    return records
+def _send(
+        train_no: str,
+        conditional: Dict[str, Any],
+) -> Tuple[Optional[requests.Response], Optional[RequestException], float]:
+    """
+    Send one RRSchedules request, timing it in the thread that sends it.
+
+    Timing here rather than around the hand-off to a thread keeps time spent
+    waiting for a free thread out of the latency.
+
+    Args:
+        train_no (str): The train number to fetch the schedule for.
+        conditional (Dict[str, Any]): Extra `requests` arguments, e.g. headers.
+
+    Returns:
+        Tuple[Optional[requests.Response], Optional[RequestException], float]:
+            The response if one was received, the error if the request failed,
+            and the seconds the request took.
+    """
+    response = None
+    error: Optional[RequestException] = None
+    sent = time.perf_counter()
+    try:
+        response = http_client.get_session().get(config.RRSCHEDULES_URL, params={"req1": train_no}, **conditional)
+        response.raise_for_status()
+    except RequestException as exc:
+        error = exc
+    return response, error, time.perf_counter() - sent
+
+
+class TransientFetchError(Exception):
+    """
+    A failed attempt that may succeed if retried later.
+
+    Attributes:
+        error (RequestException): The underlying failure.
+        delay (float): Seconds to wait before the next attempt.
+    """
+
+    def __init__(self, error: RequestException, delay: float) -> None:
+        super().__init__(str(error))
+        self.error = error
+        self.delay = delay
+
+
+async def fetch_payload_once_async(
+        train_no: str,
+        limiter: TokenBucket,
+        failed_attempts: int = 0,
+        retry_backoff: float = 0.5,
+        metrics: Optional[RunMetrics] = None,
+        controller: Optional[AdaptiveLimiter] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        executor: Optional[Executor] = None,
+) -> FetchResult:
+    """
+    Make one attempt at fetching a train's raw schedule payload, leaving retries to the caller.
+
+    The attempt takes a token from `limiter` before it is sent, so the request
+    rate is bounded globally rather than per worker. Given the validators of an
+    earlier response, the request is conditional, and a server supporting them
+    answers 304 without a body if nothing changed.
+
+    Args:
+        train_no (str): The train number to fetch the schedule for.
+        limiter (TokenBucket): Rate limiter shared by all in-flight requests.
+        failed_attempts (int, optional): Earlier failed attempts for this train,
+            which lengthen the suggested backoff. Defaults to 0.
+        retry_backoff (float, optional): Base backoff time in seconds. Defaults to 0.5.
+        metrics (Optional[RunMetrics], optional): Receives the attempt's latency
+            and `fetch.transient_errors` and `fetch.permanent_errors` counts.
+            Defaults to no instrumentation.
+        controller (Optional[AdaptiveLimiter], optional): Adapts concurrency and
+            rate to the attempt's outcome. Defaults to no adaptation.
+        breaker (Optional[CircuitBreaker], optional): Holds the attempt back while
+            the API is down. Defaults to none.
+        etag (Optional[str], optional): ETag of an earlier response, sent as
+            `If-None-Match`. Defaults to none.
+        last_modified (Optional[str], optional): Last-Modified of an earlier
+            response, sent as `If-Modified-Since`. Defaults to none.
+        executor (Optional[Executor], optional): Thread pool that sends the
+            request; size it to the concurrency so no request queues for a
+            thread. Defaults to the event loop's default executor.
+
+    Returns:
+        FetchResult: The decoded JSON body, not yet validated, or the 304 answer,
+            with the validators of the response.
+
+    Raises:
+        TransientFetchError: If the attempt failed in a way worth retrying; carries
+            the backoff to wait first.
+        RequestException: If the request failed permanently (e.g. 404).
+        CircuitOpenError: If `breaker` gave up waiting for the API.
+    """
+    if breaker is not None:
+        await breaker.wait()
+    async with controller.slot() if controller is not None else nullcontext():
+        await limiter.acquire_async()
+        conditional: Dict[str, Any] = {}
+        if etag:
+            conditional["headers"] = {"If-None-Match": etag}
+        if last_modified:
+            conditional.setdefault("headers", {})["If-Modified-Since"] = last_modified
+        response, error, latency = await asyncio.get_running_loop().run_in_executor(
+            executor, _send, train_no, conditional
+        )
+        transient = error is not None and is_transient(error, response)
+        if controller is not None:
+            controller.record(latency, congested=transient)
+
+    if metrics is not None:
+        metrics.record_latency(latency)
+    if breaker is not None:
+        # Any answer other than a transient failure shows the API is up
+        if transient:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+    if error is None:
+        not_modified = response.status_code == 304
+        return FetchResult(
+            payload=None if not_modified else response.json(),
+            not_modified=not_modified,
+            etag=response.headers.get("ETag", etag if not_modified else None),
+            last_modified=response.headers.get("Last-Modified", last_modified if not_modified else None),
+        )
+    if not transient:
+        if metrics is not None:
+            metrics.increment("fetch.permanent_errors")
+        raise error
+    if metrics is not None:
+        metrics.increment("fetch.transient_errors")
+    raise TransientFetchError(error, retry_delay(response, failed_attempts + 1, retry_backoff))
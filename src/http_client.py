@@ -0,0 +1,95 @@
+"""HTTP transport module for project-nexline.
+
+This module owns the process-wide `requests.Session` used for every SEPTA API call.
+Sharing one pooled session keeps TCP/TLS connections alive between requests, so the
+handshake cost is paid once per run instead of once per call.
+"""
+import threading
+from typing import Any, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import config
+
+_session: Optional[requests.Session] = None
+_lock = threading.Lock()
+
+
+class _TimeoutAdapter(HTTPAdapter):
+    """Transport adapter applying the configured timeouts to requests that set none."""
+
+    def send(self, request: requests.PreparedRequest, **kwargs: Any) -> requests.Response:
+        """Send a request, defaulting its (connect, read) timeout from `config`."""
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = (config.HTTP_CONNECT_TIMEOUT_SEC, config.HTTP_READ_TIMEOUT_SEC)
+        return super().send(request, **kwargs)
+
+
+def _build_session(pool_size: int) -> requests.Session:
+    """
+    Create a session with keep-alive connection pooling, gzip negotiation and
+    default timeouts, so a hung socket can never stall a worker indefinitely.
+
+    Args:
+        pool_size (int): Maximum number of pooled connections per host.
+
+    Returns:
+        requests.Session: A newly configured session.
+    """
+    session = requests.Session()
+    adapter = _TimeoutAdapter(pool_maxsize=max(1, pool_size))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(
+        {
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive",
+            "User-Agent": config.HTTP_USER_AGENT,
+        }
+    )
+    return session
+
+
+def get_session() -> requests.Session:
+    """
+    Return the shared session, creating it on first use.
+
+    Returns:
+        requests.Session: The process-wide pooled session.
+    """
+    global _session
+    with _lock:
+        if _session is None:
+            _session = _build_session(config.HTTP_POOL_SIZE)
+        return _session
+
+
+def configure_session(pool_size: int) -> requests.Session:
+    """
+    Replace the shared session with one sized for `pool_size` concurrent requests.
+
+    Should be called before work starts, e.g. with the `--workers` value, so that
+    every concurrent request can hold its own kept-alive connection.
+
+    Args:
+        pool_size (int): Maximum number of pooled connections per host.
+
+    Returns:
+        requests.Session: The new shared session.
+    """
+    global _session
+    with _lock:
+        if _session is not None:
+            _session.close()
+        _session = _build_session(pool_size)
+        return _session
+
+
+def close_session() -> None:
+    """Close the shared session and release its pooled connections."""
+    global _session
+    with _lock:
+        if _session is not None:
+            _session.close()
+            _session = None
@@ -3,21 +3,260 @@ Loading module for project-nexline.
 
 This module provides functionality to load cleaned schedule records into the
 DuckDB `schedules` table. It handles inserting new records and ignores duplicates
-based on the primary key constraints.
+based on the primary key constraints. Estimated and actual delays in seconds are
+derived from the times as rows are inserted.
+
+Records are shipped to DuckDB as a single columnar JSON document (see
+`src.db.columns_source`) and inserted with one `INSERT ... SELECT` over the
+unnested columns, so a whole day's worth of trains is written in one statement and
+one transaction instead of row by row. Output of
+the columnar transform is inserted straight from its DuckDB relation.
+
+For intraday refreshes the same statements can upsert instead: stops already
+stored get their schedule, estimate and newly observed actual time updated, in
+the same batched statement, and only where one of them actually changed. A
+stored actual time is never cleared by a later snapshot that lacks it. A replay
+replaces the stored stops of its trains instead, deleting and reinserting them in
+the same transaction so a failed batch leaves the old rows in place.
 
 Strictly follows PEP8, uses Google style docstrings, and includes type hints.
 """
 from datetime import date
-from typing import List
+from typing import Dict, List, Mapping, Optional, Union
+
+import duckdb
+
+from src.db import bump_data_version, columns_source, encode_columns, get_connection
+from src.transformer import CleanRecord, CompactRecords, record_count
+
+# Column types of the staged records
+_STAGED_TYPES: Dict[str, str] = {
+    "train_no": "VARCHAR",
+    "station": "VARCHAR",
+    "sched_time": "TIME",
+    "est_time": "TIME",
+    "act_time": "TIME",
+}
+
+# Inserts from `source`, which yields (train_no, station, sched_time, est_time,
+# act_time, ord); `ord` keeps the input order so the first record per
+# (train_no, station) wins, matching row-at-a-time inserts. Delays are computed
+# here once with the `delay_seconds` macro from migration 001. `on_conflict` is
+# `_KEEP_STORED` or `_UPDATE_CHANGED`.
+_INSERT_TEMPLATE: str = """
+    INSERT INTO schedules (
+        date_scraped, train_no, station, sched_time, est_time, act_time,
+        est_delay_sec, act_delay_sec
+    )
+    SELECT
+        ?, train_no, station, sched_time, est_time, act_time,
+        delay_seconds(sched_time, est_time), delay_seconds(sched_time, act_time)
+    FROM ({source})
+    QUALIFY row_number() OVER (PARTITION BY train_no, station ORDER BY ord) = 1
+    ON CONFLICT (date_scraped, train_no, station) {on_conflict}
+"""
+
+_KEEP_STORED: str = "DO NOTHING"
+
+# Rows whose values are unchanged are left alone, so they are not counted and
+# a refresh that changes nothing does not bump the data version
+_UPDATE_CHANGED: str = """
+    DO UPDATE SET
+        sched_time = EXCLUDED.sched_time,
+        est_time = EXCLUDED.est_time,
+        act_time = COALESCE(EXCLUDED.act_time, schedules.act_time),
+        est_delay_sec = EXCLUDED.est_delay_sec,
+        act_delay_sec = delay_seconds(EXCLUDED.sched_time, COALESCE(EXCLUDED.act_time, schedules.act_time))
+    WHERE schedules.sched_time IS DISTINCT FROM EXCLUDED.sched_time
+        OR schedules.est_time IS DISTINCT FROM EXCLUDED.est_time
+        OR (EXCLUDED.act_time IS NOT NULL AND schedules.act_time IS DISTINCT FROM EXCLUDED.act_time)
+"""
+
+_BULK_SOURCE: str = f"SELECT * FROM {columns_source(_STAGED_TYPES, ordinal='ord')}"
+
+# Reads the view registered for a relation produced by `transform_columns`
+_RELATION_SOURCE: str = "SELECT * FROM clean_relation"
+
+_DELETE_TRAINS_SQL: str = (
+    f"DELETE FROM schedules WHERE date_scraped = ? AND train_no IN (SELECT train_no FROM "
+    f"{columns_source({'train_no': 'VARCHAR'})})"
+)
+
+_BULK_INSERT_SQL: str = _INSERT_TEMPLATE.format(source=_BULK_SOURCE, on_conflict=_KEEP_STORED)
+_BULK_UPSERT_SQL: str = _INSERT_TEMPLATE.format(source=_BULK_SOURCE, on_conflict=_UPDATE_CHANGED)
+_RELATION_INSERT_SQL: str = _INSERT_TEMPLATE.format(source=_RELATION_SOURCE, on_conflict=_KEEP_STORED)
+_RELATION_UPSERT_SQL: str = _INSERT_TEMPLATE.format(source=_RELATION_SOURCE, on_conflict=_UPDATE_CHANGED)
+
+
+def _staging_payload(records_by_train: Mapping[str, Union[List[CleanRecord], CompactRecords]]) -> str:
+    """
+    Serialize cleaned records for many trains into one columnar JSON document.
+
+    Args:
+        records_by_train (Mapping[str, Union[List[CleanRecord], CompactRecords]]):
+            Cleaned records keyed by train number.
+
+    Returns:
+        str: A JSON object with one array per `schedules` column.
+    """
+    columns: Dict[str, list] = {
+        "train_no": [],
+        "station": [],
+        "sched_time": [],
+        "est_time": [],
+        "act_time": [],
+    }
+    for train_no, records in records_by_train.items():
+        if isinstance(records, dict):
+            # Already staged as arrays by `transformer.compact`
+            columns["train_no"].extend([train_no] * len(records["station"]))
+            for column in ("station", "sched_time", "est_time", "act_time"):
+                columns[column].extend(records[column])
+            continue
+        for record in records:
+            act_time = record["act_time"]
+            columns["train_no"].append(train_no)
+            columns["station"].append(record["station"])
+            columns["sched_time"].append(record["sched_time"].isoformat())
+            columns["est_time"].append(record["est_time"].isoformat())
+            columns["act_time"].append(None if act_time is None else act_time.isoformat())
+    return encode_columns(columns)
+
+
+def load_batch(
+    date_scraped: date,
+    records_by_train: Mapping[str, Union[List[CleanRecord], CompactRecords]],
+    conn: Optional[duckdb.DuckDBPyConnection] = None,
+    upsert: bool = False,
+    replace: bool = False,
+) -> int:
+    """
+    Load cleaned records for many trains in a single transaction.
+
+    Args:
+        date_scraped (date): The date for which records were scraped.
+        records_by_train (Mapping[str, Union[List[CleanRecord], CompactRecords]]):
+            Cleaned records keyed by train number, as lists or compact arrays.
+        conn (Optional[duckdb.DuckDBPyConnection], optional): Open connection to
+            write through. When omitted, a connection is opened and closed for
+            this call only.
+        upsert (bool, optional): Update stored stops whose times changed instead
+            of skipping them. Defaults to False.
+        replace (bool, optional): Delete every stored stop of the given trains
+            for the date in the same transaction, so the records replace them.
+            Takes precedence over `upsert`. Defaults to False.
+
+    Returns:
+        int: The number of rows actually inserted, or inserted and updated when
+            upserting (unchanged duplicates are skipped).
 
-from src.db import get_connection
-from src.transformer import CleanRecord
+    Raises:
+        Exception: Propagates any database errors after rolling back.
+    """
+    if not replace and not any(record_count(records) for records in records_by_train.values()):
+        return 0
+
+    payload = _staging_payload(records_by_train)
+    owns_conn = conn is None
+    if conn is None:
+        conn = get_connection()
+
+    try:
+        return _insert(
+            conn,
+            _BULK_UPSERT_SQL if upsert and not replace else _BULK_INSERT_SQL,
+            [date_scraped, payload],
+            replace_trains=list(records_by_train) if replace else None,
+            date_scraped=date_scraped,
+        )
+    finally:
+        if owns_conn:
+            conn.close()
+
+
+def load_relation(
+    date_scraped: date,
+    relation: duckdb.DuckDBPyRelation,
+    conn: duckdb.DuckDBPyConnection,
+    upsert: bool = False,
+    replace_trains: Optional[List[str]] = None,
+) -> int:
+    """
+    Load the output of `transform_columns` in a single transaction.
+
+    Args:
+        date_scraped (date): The date for which records were scraped.
+        relation (duckdb.DuckDBPyRelation): Rows of (train_no, station, sched_time,
+            est_time, act_time, ord) living on `conn`.
+        conn (duckdb.DuckDBPyConnection): The connection that owns `relation`.
+        upsert (bool, optional): Update stored stops whose times changed instead
+            of skipping them. Defaults to False.
+        replace_trains (Optional[List[str]], optional): Trains whose stored stops
+            for the date are deleted in the same transaction, so the relation
+            replaces them. Takes precedence over `upsert`. Defaults to None.
+
+    Returns:
+        int: The number of rows actually inserted, or inserted and updated when
+            upserting (unchanged duplicates are skipped).
+
+    Raises:
+        Exception: Propagates any database errors after rolling back.
+    """
+    relation.create_view("clean_relation", replace=True)
+    return _insert(
+        conn,
+        _RELATION_UPSERT_SQL if upsert and replace_trains is None else _RELATION_INSERT_SQL,
+        [date_scraped],
+        replace_trains=replace_trains,
+        date_scraped=date_scraped,
+    )
+
+
+def _insert(
+    conn: duckdb.DuckDBPyConnection,
+    sql: str,
+    params: list,
+    replace_trains: Optional[List[str]] = None,
+    date_scraped: Optional[date] = None,
+) -> int:
+    """
+    Run one insert, upsert or delete statement in its own transaction, bumping the data
+    version if any row was changed.
+
+    Args:
+        conn (duckdb.DuckDBPyConnection): Connection to write through.
+        sql (str): The INSERT or DELETE statement.
+        params (list): Statement parameters.
+        replace_trains (Optional[List[str]], optional): Trains whose rows of
+            `date_scraped` are deleted first, in the same transaction. Defaults
+            to None.
+        date_scraped (Optional[date], optional): The date of `replace_trains`.
+
+    Returns:
+        int: The number of rows changed by `sql`.
+    """
+    conn.begin()
+    try:
+        deleted = 0
+        if replace_trains:
+            trains = encode_columns({"train_no": replace_trains})
+            deleted = conn.execute(_DELETE_TRAINS_SQL, [date_scraped, trains]).fetchone()[0]
+        row = conn.execute(sql, params).fetchone()
+        inserted = int(row[0]) if row else 0
+        if inserted or deleted:
+            bump_data_version(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return inserted
 
 
 def load_records(
     date_scraped: date,
     train_no: str,
-    records: List[CleanRecord]
+    records: List[CleanRecord],
+    conn: Optional[duckdb.DuckDBPyConnection] = None,
 ) -> None:
     """
     Load cleaned schedule records into the DuckDB database.
@@ -26,34 +265,10 @@ def load_records(
         date_scraped (date): The date for which records were scraped.
         train_no (str): The train number associated with these records.
         records (List[CleanRecord]): A list of cleaned schedule records.
+        conn (Optional[duckdb.DuckDBPyConnection], optional): Open connection to
+            write through. Defaults to a short-lived connection.
 
     Raises:
         Exception: Propagates any database errors.
     """
-    conn = get_connection()
-    insert_sql = (
-        """
-        INSERT INTO schedules (
-            date_scraped, train_no, station, sched_time, est_time, act_time
-        ) VALUES (?, ?, ?, ?, ?, ?)
-        ON CONFLICT (date_scraped, train_no, station) DO NOTHING
-        """
-    )
-
-    params_list: List[tuple] = []
-    for record in records:
-        params_list.append(
-            (
-                date_scraped,
-                train_no,
-                record["station"],
-                record["sched_time"],
-                record["est_time"],
-                record["act_time"],
-            )
-        )
-
-    with conn:
-        conn.executemany(insert_sql, params_list)
-        conn.commit()
-    conn.close()
+    load_batch(date_scraped, {train_no: records}, conn=conn)
@@ -0,0 +1,231 @@
+"""Run metrics module for project-nexline.
+
+This module instruments an ETL run: busy wall time and CPU time per stage, rows per
+second for transform and load, HTTP request latency percentiles and histogram,
+retry and failure counts, and the peak resident set size of the process. A run's
+metrics are stored as one row per metric in the `run_metrics` table, so a metric
+can be compared across nights with a single filter, and can also be written as a
+JSON summary.
+"""
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import duckdb
+
+from src.db import columns_source, encode_columns
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None  # type: ignore[assignment]
+
+# Upper bounds, in milliseconds, of the request latency histogram buckets
+LATENCY_BUCKETS_MS: List[float] = [50, 100, 250, 500, 1000, 2500, 5000]
+
+# Column types of a staged summary
+_SUMMARY_TYPES: Dict[str, str] = {"metric": "VARCHAR", "value": "DOUBLE"}
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    """
+    Nearest-rank percentile of an ascending list.
+
+    Args:
+        ordered (List[float]): Values sorted in ascending order; not empty.
+        q (float): Percentile between 0 and 100.
+
+    Returns:
+        float: The smallest value with at least `q` percent of values at or below it.
+    """
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+def peak_rss_mb() -> Optional[float]:
+    """
+    Get the peak resident set size of this process.
+
+    Returns:
+        Optional[float]: Megabytes, or None where the platform cannot report it.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux and the BSDs kilobytes
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(peak / divisor, 1)
+
+
+class RunMetrics:
+    """
+    Thread-safe collector of one run's timings and counters.
+
+    Stage times are busy times: only the time spent inside `timed()` blocks counts,
+    so overlapping pipeline stages are each charged for their own work.
+    """
+
+    def __init__(self) -> None:
+        """Start the run clock."""
+        self.started_at = datetime.now()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        self._wall: Dict[str, float] = {}
+        self._cpu: Dict[str, float] = {}
+        self._rows: Dict[str, int] = {}
+        self._counters: Dict[str, int] = {}
+        self._latencies_ms: List[float] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def timed(self, stage: str) -> Iterator[None]:
+        """
+        Charge the wall and CPU time of a block to a stage.
+
+        CPU time is that of the current thread, so the block should not hand its
+        work to other threads.
+
+        Args:
+            stage (str): Stage name, e.g. "transform".
+        """
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.thread_time() - cpu
+            with self._lock:
+                self._wall[stage] = self._wall.get(stage, 0.0) + wall
+                self._cpu[stage] = self._cpu.get(stage, 0.0) + cpu
+
+    def add_time(self, stage: str, wall: float, cpu: float) -> None:
+        """
+        Charge time measured elsewhere, e.g. in a worker process, to a stage.
+
+        Args:
+            stage (str): Stage name.
+            wall (float): Busy wall time in seconds.
+            cpu (float): CPU time in seconds.
+        """
+        with self._lock:
+            self._wall[stage] = self._wall.get(stage, 0.0) + wall
+            self._cpu[stage] = self._cpu.get(stage, 0.0) + cpu
+
+    def add_rows(self, stage: str, rows: int) -> None:
+        """
+        Count rows processed by a stage.
+
+        Args:
+            stage (str): Stage name.
+            rows (int): Rows processed.
+        """
+        with self._lock:
+            self._rows[stage] = self._rows.get(stage, 0) + rows
+
+    def increment(self, counter: str, amount: int = 1) -> None:
+        """
+        Increase a named counter, e.g. "fetch.retries".
+
+        Args:
+            counter (str): Counter name.
+            amount (int, optional): Amount to add. Defaults to 1.
+        """
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + amount
+
+    def record_latency(self, seconds: float) -> None:
+        """
+        Record the latency of one HTTP request.
+
+        Args:
+            seconds (float): Time from sending the request to receiving the response.
+        """
+        with self._lock:
+            self._latencies_ms.append(seconds * 1000)
+
+    def summary(self) -> Dict[str, float]:
+        """
+        Summarize the run so far as flat `<stage>.<metric>` values.
+
+        Returns:
+            Dict[str, float]: Metric name to value, sorted by name.
+        """
+        with self._lock:
+            values: Dict[str, float] = {
+                "run.wall_sec": time.perf_counter() - self._wall_start,
+                "run.cpu_sec": time.process_time() - self._cpu_start,
+            }
+            rss = peak_rss_mb()
+            if rss is not None:
+                values["run.peak_rss_mb"] = rss
+            for stage, wall in self._wall.items():
+                values[f"{stage}.wall_sec"] = wall
+                values[f"{stage}.cpu_sec"] = self._cpu[stage]
+            for stage, rows in self._rows.items():
+                values[f"{stage}.rows"] = rows
+                wall = self._wall.get(stage, 0.0)
+                if wall > 0:
+                    values[f"{stage}.rows_per_sec"] = rows / wall
+            values.update(self._counters)
+
+            latencies = sorted(self._latencies_ms)
+            values["fetch.requests"] = len(latencies)
+            if latencies:
+                for q in (50, 95, 99):
+                    values[f"fetch.latency_p{q}_ms"] = _percentile(latencies, q)
+                values["fetch.latency_max_ms"] = latencies[-1]
+                lower = 0.0
+                for upper in LATENCY_BUCKETS_MS + [float("inf")]:
+                    name = f"le_{upper:g}ms" if upper != float("inf") else "le_inf"
+                    values[f"fetch.latency_hist.{name}"] = sum(lower < ms <= upper for ms in latencies)
+                    lower = upper
+        return {name: round(float(value), 3) for name, value in sorted(values.items())}
+
+
+def write_run_metrics(conn: duckdb.DuckDBPyConnection, metrics: RunMetrics) -> Dict[str, float]:
+    """
+    Store a run's summary in the `run_metrics` table, one row per metric.
+
+    Args:
+        conn (duckdb.DuckDBPyConnection): Connection to write through.
+        metrics (RunMetrics): The run's metrics.
+
+    Returns:
+        Dict[str, float]: The summary that was stored.
+    """
+    summary = metrics.summary()
+    conn.execute(
+        f"""
+        INSERT INTO run_metrics
+        SELECT $started_at, metric, value FROM {columns_source(_SUMMARY_TYPES, param="$summary")}
+        ON CONFLICT DO NOTHING
+        """,
+        {
+            "started_at": metrics.started_at,
+            "summary": encode_columns({"metric": list(summary), "value": list(summary.values())}),
+        },
+    )
+    return summary
+
+
+def write_json_summary(path: Path, metrics: RunMetrics, extra: Optional[Dict[str, object]] = None) -> None:
+    """
+    Write a run's summary as a JSON document.
+
+    Args:
+        path (Path): Destination file; parent directories are created.
+        metrics (RunMetrics): The run's metrics.
+        extra (Optional[Dict[str, object]], optional): Additional top-level fields,
+            e.g. the service dates of the run.
+    """
+    document: Dict[str, object] = {"started_at": metrics.started_at.isoformat(timespec="seconds")}
+    document.update(extra or {})
+    document["metrics"] = metrics.summary()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(document, indent=2))
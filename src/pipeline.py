@@ -0,0 +1,514 @@
+"""Streaming ETL pipeline for project-nexline.
+
+Fetch, transform and load run as concurrent stages connected by bounded queues:
+fetched trains flow into transformation and then into a batching loader while other
+trains are still being fetched. A full queue pauses the stage that feeds it, so
+memory is bounded by the queue and batch sizes rather than by the size of the day.
+
+A run may span several service dates: the train-level work of every date shares
+one pool of fetch workers, one rate limiter, and one database connection.
+
+Unless running dry, the load stage also records each train's progress in
+`etl_progress` (see `src.progress`), so an interrupted run can be resumed.
+
+With a capture store, every fetched payload is also kept in the raw response store
+(see `src.raw_store`) before it is parsed. With a replay store, the fetch stage
+reads payloads from that store instead of the network, so history can be
+re-transformed and reloaded at local-disk speed.
+
+Unless told otherwise, a train whose fetched payload is identical to the one it was
+last loaded from (by content hash, or by a 304 to a request made conditional on the
+stored ETag/Last-Modified) skips transform and load: nothing about it changed.
+
+A train whose fetch fails transiently does not hold its worker through the
+backoff: it is put on a deferred retry queue and picked up again, by whichever
+worker is free, once its backoff has expired; until then workers fetch other
+trains. Trains still failing after their last retry count as failed.
+
+Fetches adapt to the API: an `AdaptiveLimiter` lowers the concurrency and rate
+below their ceilings while SEPTA slows down or throttles, and a `CircuitBreaker`
+pauses every worker during an outage (see `src.ratelimit`).
+
+With several transform workers, trains are transformed in chunks on a process pool
+(see `src.transformer.transform_chunk`) and come back as compact ISO-string columns
+that the loader stages as they are. Workers cost far more to start than a day's
+transform, so the pool only starts once a run has transformed
+`config.TRANSFORM_POOL_MIN_RECORDS` records in-process (see
+`benchmarks/bench_transform.py`), and finished chunks are forwarded as they complete.
+
+Each stage charges its busy time, rows, and request latencies to a `RunMetrics`
+(see `src.metrics`), so a slow run shows which stage it spent its time in.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple, TypedDict
+
+import duckdb
+
+import config
+from src.fetchers.rrschedules import (
+    RATE_LIMITER, ScheduleRecord, TransientFetchError, fetch_payload_once_async, parse_records
+)
+from src.loader import load_batch, load_relation
+from src.metrics import RunMetrics
+from src.progress import (
+    FAILED, FETCHED, LOADED, PayloadFingerprint, get_payload_fingerprints, payload_hash, record_progress
+)
+from src.ratelimit import AdaptiveLimiter, CircuitBreaker, TokenBucket
+from src.raw_store import RawResponseStore
+from src.transformer import (
+    TransformedChunk, parse_time, record_count, to_columns, transform, transform_chunk, transform_columns
+)
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineSummary(TypedDict):
+    """Counts reported by a finished pipeline run."""
+    fetched: int
+    failed: int
+    cleaned: int
+    loaded: int
+
+
+async def run_streaming(
+    jobs: Mapping[date, Sequence[str]],
+    conn: duckdb.DuckDBPyConnection,
+    concurrency: int = 10,
+    queue_size: int = config.PIPELINE_QUEUE_SIZE,
+    batch_size: int = config.LOAD_BATCH_TRAINS,
+    columnar: bool = False,
+    dry_run: bool = False,
+    limiter: Optional[TokenBucket] = None,
+    metrics: Optional[RunMetrics] = None,
+    capture: Optional[RawResponseStore] = None,
+    replay_from: Optional[RawResponseStore] = None,
+    max_retries: int = config.FETCH_MAX_RETRIES,
+    retry_backoff: float = config.FETCH_RETRY_BACKOFF_SEC,
+    skip_unchanged: bool = True,
+    upsert: bool = False,
+    replace: bool = False,
+    transform_workers: int = 0,
+    pool_min_records: int = config.TRANSFORM_POOL_MIN_RECORDS,
+) -> Dict[date, PipelineSummary]:
+    """
+    Fetch, transform, and load trains for one or more service dates as overlapping stages.
+
+    Args:
+        jobs (Mapping[date, Sequence[str]]): Train numbers to process, keyed by
+            service date.
+        conn (duckdb.DuckDBPyConnection): Connection used by the load stage, and
+            to read stored payload fingerprints before the stages start.
+        concurrency (int, optional): Maximum number of fetches in flight; fewer
+            run while the API is congested. Defaults to 10.
+        queue_size (int, optional): Capacity of each inter-stage queue, in trains.
+            Defaults to `config.PIPELINE_QUEUE_SIZE`.
+        batch_size (int, optional): Trains per load batch. Defaults to
+            `config.LOAD_BATCH_TRAINS`.
+        columnar (bool, optional): Transform each batch with `transform_columns`
+            in the load stage instead of per train. Defaults to False.
+        dry_run (bool, optional): Transform but skip database writes. Defaults to False.
+        limiter (Optional[TokenBucket], optional): Rate limiter for fetches; its
+            rate is the ceiling of the adaptive rate. Defaults to the shared
+            RRSchedules limiter.
+        metrics (Optional[RunMetrics], optional): Collects stage timings, row
+            counts and request latencies. Defaults to a private collector.
+        capture (Optional[RawResponseStore], optional): Keep every fetched
+            payload in this store; buffered captures are written with each load
+            batch. Defaults to no capture.
+        replay_from (Optional[RawResponseStore], optional): Read payloads from
+            this store instead of fetching them; trains it has no capture of
+            count as failed. Defaults to fetching.
+        max_retries (int, optional): Deferred retries of a transiently failing
+            train. Defaults to `config.FETCH_MAX_RETRIES`.
+        retry_backoff (float, optional): Base retry backoff in seconds. Defaults
+            to `config.FETCH_RETRY_BACKOFF_SEC`.
+        skip_unchanged (bool, optional): Skip transform and load of fetched trains
+            whose payload matches the one they were last loaded from; they count
+            as fetched. Ignored on replay. Defaults to True.
+        upsert (bool, optional): Update stored stops whose times changed, e.g. to
+            fill in actual times during the day, instead of keeping the first
+            snapshot. Defaults to False.
+        replace (bool, optional): Replace all stored stops of each loaded train,
+            deleting them in the load transaction that writes its new records,
+            e.g. to apply a transformer fix on replay. Takes precedence over
+            `upsert`. Defaults to False.
+        transform_workers (int, optional): Worker processes transforming chunks
+            of `config.TRANSFORM_CHUNK_TRAINS` trains; 0 or 1 transforms
+            in-process. Ignored when columnar. Defaults to 0.
+        pool_min_records (int, optional): Raw records to transform in-process
+            before starting the pool, so runs smaller than this never pay its
+            startup cost. Defaults to `config.TRANSFORM_POOL_MIN_RECORDS`.
+
+    Returns:
+        Dict[date, PipelineSummary]: Per service date, counts of fetched and failed
+            trains, cleaned records, and records actually inserted (or updated,
+            when upserting).
+
+    Raises:
+        Exception: Propagates any transform or database error after stopping all
+            stages. Fetch (and replay) errors are logged and counted instead.
+    """
+    bucket = limiter if limiter is not None else RATE_LIMITER
+    metrics = metrics if metrics is not None else RunMetrics()
+    controller = AdaptiveLimiter(max_concurrency=concurrency, max_rps=bucket.rate)
+    breaker = CircuitBreaker()
+    parse_misses = parse_time.cache_info().misses
+    raw_queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, queue_size))
+    load_queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, queue_size))
+    planned = {
+        service_date: list(dict.fromkeys(train_nos))
+        for service_date, train_nos in jobs.items()
+    }
+    pending = iter(
+        [(service_date, train_no) for service_date, train_nos in planned.items() for train_no in train_nos]
+    )
+    summaries = {
+        service_date: PipelineSummary(fetched=0, failed=0, cleaned=0, loaded=0)
+        for service_date in planned
+    }
+    # Fetch errors awaiting a progress write by the load stage
+    failures: Dict[Tuple[date, str], str] = {}
+    # Fingerprints of the payloads trains were last loaded from, and of the ones
+    # fetched now, the latter stored by the load stage once their train is loaded
+    loaded_from: Dict[date, Dict[str, PayloadFingerprint]] = {
+        service_date: get_payload_fingerprints(conn, service_date)
+        if skip_unchanged and replay_from is None else {}
+        for service_date in planned
+    }
+    fingerprints: Dict[Tuple[date, str], PayloadFingerprint] = {}
+    # Trains waiting out a retry backoff: (due time, tie-breaker, date, train, failed attempts)
+    deferred: List[Tuple[float, int, date, str, int]] = []
+    deferred_order = itertools.count()
+    # Trains claimed by a worker and not yet fetched, failed or deferred
+    claimed = 0
+    # Set whenever a claimed train is settled, so idle workers re-check for work
+    settled = asyncio.Event()
+
+    def fail(service_date: date, train_no: str, exc: Exception) -> None:
+        metrics.increment("fetch.failures")
+        summaries[service_date]["failed"] += 1
+        failures[(service_date, train_no)] = str(exc) or type(exc).__name__
+        logger.error(f"Failed to fetch schedule for train {train_no} ({service_date}): {exc}")
+
+    async def next_fetch() -> Optional[Tuple[date, str, int]]:
+        """Claim a due retry or else a new train; None once nothing is left to fetch."""
+        nonlocal claimed
+        loop = asyncio.get_running_loop()
+        while True:
+            if deferred and deferred[0][0] <= loop.time():
+                _, _, service_date, train_no, attempts = heapq.heappop(deferred)
+                claimed += 1
+                return service_date, train_no, attempts
+            # Workers share one iterator, so each train is claimed exactly once
+            job = next(pending, None)
+            if job is not None:
+                claimed += 1
+                return job[0], job[1], 0
+            if not deferred and not claimed:
+                return None
+            # Wait for the earliest backoff to expire, or for a claimed train
+            # to settle (it may be deferred with an earlier due time)
+            settled.clear()
+            timeout = deferred[0][0] - loop.time() if deferred else None
+            try:
+                await asyncio.wait_for(settled.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def fetch_worker() -> None:
+        nonlocal claimed
+        while True:
+            job = await next_fetch()
+            if job is None:
+                return
+            service_date, train_no, attempts = job
+            previous = loaded_from[service_date].get(train_no)
+            unchanged = False
+            try:
+                try:
+                    result = await fetch_payload_once_async(
+                        train_no, bucket, failed_attempts=attempts, retry_backoff=retry_backoff,
+                        metrics=metrics, controller=controller, breaker=breaker,
+                        etag=previous["etag"] if previous else None,
+                        last_modified=previous["last_modified"] if previous else None,
+                        executor=fetch_threads,
+                    )
+                except TransientFetchError as exc:
+                    if attempts >= max_retries:
+                        raise exc.error from None
+                    metrics.increment("fetch.retries")
+                    due = asyncio.get_running_loop().time() + exc.delay
+                    heapq.heappush(deferred, (due, next(deferred_order), service_date, train_no, attempts + 1))
+                    logger.debug(f"Retrying train {train_no} ({service_date}) in {exc.delay:.1f}s: {exc}")
+                    continue
+                unchanged = result["not_modified"]
+                if not unchanged:
+                    payload = result["payload"]
+                    if capture is not None:
+                        # Kept before validation, so a payload the parser rejects
+                        # today can still be reprocessed once the parser is fixed
+                        capture.add(service_date, train_no, payload)
+                    fingerprint = PayloadFingerprint(
+                        payload_hash=payload_hash(payload), etag=result["etag"], last_modified=result["last_modified"]
+                    )
+                    unchanged = previous is not None and previous["payload_hash"] == fingerprint["payload_hash"]
+                    if not unchanged:
+                        records = parse_records(payload)
+                        if not dry_run:
+                            fingerprints[(service_date, train_no)] = fingerprint
+            except Exception as exc:
+                fail(service_date, train_no, exc)
+                continue
+            finally:
+                claimed -= 1
+                settled.set()
+            summaries[service_date]["fetched"] += 1
+            if unchanged:
+                metrics.increment("fetch.unchanged")
+                logger.debug(f"Train {train_no} ({service_date}) is unchanged since it was loaded")
+                continue
+            logger.debug(f"Fetched {len(records)} records for train {train_no} ({service_date})")
+            await raw_queue.put((service_date, train_no, records))
+
+    def read_captured(service_date: date) -> Dict[str, Any]:
+        with metrics.timed("replay"):
+            return replay_from.read(service_date)
+
+    async def replay_worker() -> None:
+        for service_date, train_nos in planned.items():
+            payloads = await asyncio.to_thread(read_captured, service_date)
+            for train_no in train_nos:
+                try:
+                    if train_no not in payloads:
+                        raise LookupError("no captured payload")
+                    records = parse_records(payloads[train_no])
+                    if not dry_run:
+                        fingerprints[(service_date, train_no)] = PayloadFingerprint(
+                            payload_hash=payload_hash(payloads[train_no]), etag=None, last_modified=None
+                        )
+                except Exception as exc:
+                    fail(service_date, train_no, exc)
+                    continue
+                summaries[service_date]["fetched"] += 1
+                await raw_queue.put((service_date, train_no, records))
+
+    async def fetch_stage() -> None:
+        if replay_from is not None:
+            await replay_worker()
+        else:
+            await asyncio.gather(*(fetch_worker() for _ in range(max(1, concurrency))))
+        await raw_queue.put(None)
+
+    async def pooled_transform_stage(pool: ProcessPoolExecutor, item: Tuple[date, str, List[ScheduleRecord]]) -> None:
+        loop = asyncio.get_running_loop()
+        chunk: List[Tuple[date, str, List[ScheduleRecord]]] = []
+        # Submitted chunks, with the service date of each of their trains
+        in_flight: Dict["asyncio.Future[TransformedChunk]", List[date]] = {}
+
+        def submit() -> None:
+            trains = [(train_no, records) for _, train_no, records in chunk]
+            future = loop.run_in_executor(pool, transform_chunk, trains)
+            in_flight[future] = [service_date for service_date, _, _ in chunk]
+            chunk.clear()
+
+        async def forward(future: "asyncio.Future[TransformedChunk]") -> None:
+            service_dates = in_flight.pop(future)
+            result = future.result()
+            metrics.add_time("transform", result["wall_sec"], result["cpu_sec"])
+            metrics.increment("transform.pool_chunks")
+            for service_date, (train_no, records) in zip(service_dates, result["trains"]):
+                metrics.add_rows("transform", record_count(records))
+                await load_queue.put((service_date, train_no, records))
+
+        received_all = False
+        getter: Optional["asyncio.Future[Any]"] = None
+        try:
+            while True:
+                if item is not None:
+                    chunk.append(item)
+                    item = None
+                    if len(chunk) >= config.TRANSFORM_CHUNK_TRAINS:
+                        submit()
+                # Keep every worker busy with one chunk queued behind it, no more
+                if getter is None and not received_all and len(in_flight) <= 2 * transform_workers:
+                    getter = asyncio.ensure_future(raw_queue.get())
+                waiting = set(in_flight) | ({getter} if getter is not None else set())
+                if not waiting:
+                    break
+                done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+                # Finished chunks move on at once, in completion order, rather
+                # than waiting in memory behind a slower chunk submitted earlier
+                for future in [future for future in in_flight if future in done]:
+                    await forward(future)
+                if getter in done:
+                    item = getter.result()
+                    getter = None
+                    if item is None:
+                        received_all = True
+                        if chunk:
+                            submit()
+        finally:
+            if getter is not None:
+                getter.cancel()
+        await load_queue.put(None)
+
+    def start_pool() -> ProcessPoolExecutor:
+        logger.info(
+            f"Transformed {in_process_records} records in-process; "
+            f"transforming the rest on {transform_workers} worker processes"
+        )
+        # Spawned rather than forked: this process already runs threads and
+        # holds an open DuckDB connection, neither of which survives a fork
+        return ProcessPoolExecutor(max_workers=transform_workers, mp_context=multiprocessing.get_context("spawn"))
+
+    async def transform_stage() -> None:
+        nonlocal pool, in_process_records
+        while True:
+            item: Optional[Tuple[date, str, List[ScheduleRecord]]] = await raw_queue.get()
+            if item is None:
+                await load_queue.put(None)
+                return
+            # The pool only starts once the run has proven big enough to repay it
+            if pool is None and use_pool and in_process_records >= pool_min_records:
+                pool = start_pool()
+            if pool is not None:
+                await pooled_transform_stage(pool, item)
+                return
+            service_date, train_no, records = item
+            in_process_records += len(records)
+            # Columnar batches are transformed by the load stage inside DuckDB
+            if not columnar:
+                with metrics.timed("transform"):
+                    records = transform(records)
+                metrics.add_rows("transform", len(records))
+            await load_queue.put((service_date, train_no, records))
+
+    def write_date(
+        service_date: date,
+        batch: Dict[str, list],
+        failed: Dict[str, str],
+    ) -> Tuple[int, int]:
+        if not dry_run:
+            with metrics.timed("progress"):
+                record_progress(conn, service_date, FAILED, list(failed), errors=failed)
+                record_progress(conn, service_date, FETCHED, list(batch))
+        if not batch:
+            return 0, 0
+        if columnar:
+            with metrics.timed("transform"):
+                relation = transform_columns(conn, to_columns(batch))
+                cleaned = relation.aggregate("count(*)").fetchone()[0]
+            metrics.add_rows("transform", cleaned)
+        else:
+            cleaned = sum(record_count(records) for records in batch.values())
+        try:
+            if dry_run:
+                return cleaned, 0
+            with metrics.timed("load"):
+                if columnar:
+                    loaded = load_relation(
+                        service_date, relation, conn, upsert=upsert, replace_trains=list(batch) if replace else None
+                    )
+                else:
+                    loaded = load_batch(service_date, batch, conn=conn, upsert=upsert, replace=replace)
+        finally:
+            if columnar:
+                # Each batch is staged in its own temporary table
+                conn.execute(f"DROP TABLE IF EXISTS {relation.alias}")
+        metrics.add_rows("load", cleaned)
+        metrics.increment("load.transactions")
+        # A crash before this point leaves the batch `fetched`, so a resumed
+        # run refetches it; the loader's conflict handling makes that harmless
+        loaded_fingerprints = {
+            train_no: fingerprints.pop((service_date, train_no))
+            for train_no in batch
+            if (service_date, train_no) in fingerprints
+        }
+        with metrics.timed("progress"):
+            record_progress(conn, service_date, LOADED, list(batch), fingerprints=loaded_fingerprints)
+        return cleaned, loaded
+
+    def write_batch(
+        batch: Dict[date, Dict[str, list]],
+        failed: Dict[Tuple[date, str], str],
+    ) -> Dict[date, Tuple[int, int]]:
+        if capture is not None:
+            with metrics.timed("capture"):
+                capture.flush()
+        dates = set(batch) | {service_date for service_date, _ in failed}
+        return {
+            service_date: write_date(
+                service_date,
+                batch.get(service_date, {}),
+                {tn: error for (day, tn), error in failed.items() if day == service_date},
+            )
+            for service_date in sorted(dates)
+        }
+
+    def report(service_date: date) -> None:
+        summary = summaries[service_date]
+        done = summary["fetched"] + summary["failed"]
+        logger.info(
+            f"{service_date}: {done}/{len(planned[service_date])} trains fetched, "
+            f"{summary['loaded']} of {summary['cleaned']} records loaded, "
+            f"{summary['failed']} failed"
+        )
+
+    async def load_stage() -> None:
+        batch: Dict[date, Dict[str, list]] = {}
+        size = 0
+        while True:
+            item = await load_queue.get()
+            if item is not None:
+                service_date, train_no, records = item
+                batch.setdefault(service_date, {})[train_no] = records
+                size += 1
+            if (batch or failures) and (item is None or size >= batch_size):
+                failed = dict(failures)
+                failures.clear()
+                # Off the event loop, so fetching continues while DuckDB writes
+                written = await asyncio.to_thread(write_batch, batch, failed)
+                for service_date, (cleaned, loaded) in written.items():
+                    summaries[service_date]["cleaned"] += cleaned
+                    summaries[service_date]["loaded"] += loaded
+                    report(service_date)
+                batch, size = {}, 0
+            if item is None:
+                return
+
+    # One thread per fetch worker, so no request waits for a thread with its
+    # latency clock running and the default executor's size does not cap them
+    fetch_threads = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="fetch")
+    pool: Optional[ProcessPoolExecutor] = None
+    use_pool = transform_workers > 1 and not columnar
+    # Raw records transformed in-process so far, before any pool was started
+    in_process_records = 0
+
+    tasks = [
+        asyncio.ensure_future(fetch_stage()),
+        asyncio.ensure_future(transform_stage()),
+        asyncio.ensure_future(load_stage()),
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    finally:
+        # Distinct time strings that needed parsing rather than a cache hit
+        metrics.increment("transform.parse_cache_misses", parse_time.cache_info().misses - parse_misses)
+        metrics.increment("fetch.backoffs", controller.decreases)
+        metrics.increment("fetch.circuit_opens", breaker.opens)
+        fetch_threads.shutdown(wait=False, cancel_futures=True)
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    return summaries
@@ -0,0 +1,173 @@
+"""Position capture module for project-nexline.
+
+This module stores live TrainView polls in the append-only `train_positions` table.
+Train numbers, stations and lines are dictionary-encoded into small integer IDs,
+and polls are buffered in memory and appended a batch at a time, so polling every
+30 seconds for a whole service day costs one short transaction every few minutes.
+Without a connection of its own, the writer opens the database only for each of
+those transactions, leaving the file lock free for other processes in between.
+
+IDs are allocated by the database inside that transaction, so any number of
+writers can share a database without assigning the same ID twice.
+"""
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+import duckdb
+
+import config
+from src.db import columns_source, encode_columns, get_connection
+from src.extractors import TrainPosition
+
+# Column types of the staged polls
+_STAGED_TYPES: Dict[str, str] = {
+    "polled_at": "TIMESTAMP_S",
+    "date_scraped": "DATE",
+    "train_no": "VARCHAR",
+    "line": "VARCHAR",
+    "dest": "VARCHAR",
+    "next_stop": "VARCHAR",
+    "late_min": "SMALLINT",
+    "lat": "FLOAT",
+    "lon": "FLOAT",
+}
+
+_STAGE_SQL: str = (
+    f"CREATE OR REPLACE TEMP TABLE position_staging AS SELECT * FROM {columns_source(_STAGED_TYPES, ordinal='ord')}"
+)
+
+# (table, id column, value column, staged columns holding its values) of each dictionary
+_DICTIONARIES: List[Tuple[str, str, str, Tuple[str, ...]]] = [
+    ("position_trains", "train_id", "train_no", ("train_no",)),
+    ("position_stations", "station_id", "name", ("dest", "next_stop")),
+    ("position_lines", "line_id", "name", ("line",)),
+]
+
+# Numbers the staged values missing from a dictionary after its highest stored ID,
+# in order of first appearance, then by value; empty values stay unencoded (NULL)
+_ADD_VALUES_TEMPLATE: str = """
+    INSERT INTO {table} ({key}, {value})
+    SELECT (SELECT coalesce(max({key}), 0) FROM {table}) + row_number() OVER (ORDER BY first_ord, new.v), new.v
+    FROM (
+        SELECT v, min(ord) AS first_ord FROM ({staged}) WHERE v <> '' GROUP BY v
+    ) new
+    ANTI JOIN {table} d ON d.{value} = new.v
+"""
+
+_APPEND_SQL: str = """
+    INSERT INTO train_positions
+    SELECT s.polled_at, s.date_scraped, t.train_id, l.line_id, d.station_id, n.station_id, s.late_min, s.lat, s.lon
+    FROM position_staging s
+    LEFT JOIN position_trains t ON t.train_no = s.train_no
+    LEFT JOIN position_lines l ON l.name = s.line
+    LEFT JOIN position_stations d ON d.name = s.dest
+    LEFT JOIN position_stations n ON n.name = s.next_stop
+    ORDER BY s.ord
+"""
+
+
+class PositionWriter:
+    """
+    Buffered writer that appends TrainView polls to `train_positions`.
+
+    Polls are buffered as text; each flush adds the values not yet in the
+    dictionaries and encodes the buffered rows against them in one transaction.
+    """
+
+    def __init__(
+        self,
+        conn: Optional[duckdb.DuckDBPyConnection] = None,
+        flush_polls: int = config.POSITION_FLUSH_POLLS,
+    ) -> None:
+        """
+        Initialize the writer without touching the database.
+
+        Args:
+            conn (Optional[duckdb.DuckDBPyConnection], optional): Connection for all
+                writes. Defaults to a short-lived connection per flush.
+            flush_polls (int, optional): Number of buffered polls that triggers a
+                write. Defaults to `config.POSITION_FLUSH_POLLS`.
+        """
+        self.conn = conn
+        self.flush_polls = max(1, flush_polls)
+        self._columns: Dict[str, list] = self._empty_columns()
+        self._polls = 0
+
+    @staticmethod
+    def _empty_columns() -> Dict[str, list]:
+        """Return one empty list per staged column."""
+        return {column: [] for column in _STAGED_TYPES}
+
+    @property
+    def pending(self) -> int:
+        """Number of buffered rows not yet written."""
+        return len(self._columns["train_no"])
+
+    def add(self, polled_at: datetime, service_date: date, positions: List[TrainPosition]) -> int:
+        """
+        Buffer one poll, writing the buffer once `flush_polls` polls are held.
+
+        Args:
+            polled_at (datetime): When the poll was taken.
+            service_date (date): The service date the poll belongs to.
+            positions (List[TrainPosition]): Positions extracted from the poll.
+
+        Returns:
+            int: The number of rows written by this call (0 if only buffered).
+        """
+        columns = self._columns
+        stamp = polled_at.isoformat(sep=" ", timespec="seconds")
+        day = service_date.isoformat()
+        for position in positions:
+            columns["polled_at"].append(stamp)
+            columns["date_scraped"].append(day)
+            columns["train_no"].append(position["train_no"])
+            columns["line"].append(position["line"])
+            columns["dest"].append(position["dest"])
+            columns["next_stop"].append(position["next_stop"])
+            columns["late_min"].append(position["late"])
+            columns["lat"].append(position["lat"])
+            columns["lon"].append(position["lon"])
+        self._polls += 1
+        if self._polls >= self.flush_polls:
+            return self.flush()
+        return 0
+
+    def flush(self) -> int:
+        """
+        Write new dictionary entries and all buffered rows in one transaction.
+
+        Returns:
+            int: The number of position rows written.
+
+        Raises:
+            Exception: Propagates any database errors after rolling back; the
+                buffer is kept so the next flush retries it.
+        """
+        rows = self.pending
+        if not rows:
+            self._polls = 0
+            return 0
+
+        owns_conn = self.conn is None
+        conn = get_connection() if owns_conn else self.conn
+        try:
+            conn.begin()
+            try:
+                conn.execute(_STAGE_SQL, [encode_columns(self._columns)])
+                for table, key, value, columns in _DICTIONARIES:
+                    staged = " UNION ALL ".join(f"SELECT {c} AS v, ord FROM position_staging" for c in columns)
+                    conn.execute(_ADD_VALUES_TEMPLATE.format(table=table, key=key, value=value, staged=staged))
+                conn.execute(_APPEND_SQL)
+                conn.execute("DROP TABLE position_staging")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        finally:
+            if owns_conn:
+                conn.close()
+
+        self._columns = self._empty_columns()
+        self._polls = 0
+        return rows
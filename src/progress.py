@@ -0,0 +1,203 @@
+"""Progress tracking module for project-nexline.
+
+This module records per-train ETL progress in the `etl_progress` table, so that an
+interrupted run can be resumed by fetching only the trains not yet loaded for the
+service date.
+
+Loaded trains also keep a fingerprint of the payload they were loaded from: a
+content hash and the response's HTTP validators. A later fetch returning the
+same payload (or a 304) needs no transform or load.
+"""
+import hashlib
+import json
+from datetime import date
+from typing import Any, Dict, Mapping, Optional, Sequence, Set, TypedDict
+
+import duckdb
+
+from src.db import columns_source, encode_columns
+
+# Progress states, in the order a train normally moves through them
+FETCHED = "fetched"
+LOADED = "loaded"
+FAILED = "failed"
+
+
+class PayloadFingerprint(TypedDict):
+    """Identifies the payload a train was loaded from."""
+    payload_hash: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+
+
+# Column types of the staged progress updates
+_STAGED_TYPES: Dict[str, str] = {
+    "train_no": "VARCHAR",
+    "last_error": "VARCHAR",
+    "payload_hash": "VARCHAR",
+    "etag": "VARCHAR",
+    "last_modified": "VARCHAR",
+}
+
+_UPSERT_SQL: str = f"""
+    INSERT INTO etl_progress (
+        date_scraped, train_no, status, attempts, last_error, updated_at,
+        payload_hash, etag, last_modified
+    )
+    SELECT $date_scraped, p.train_no, $status, $increment, p.last_error, current_timestamp,
+           p.payload_hash, p.etag, p.last_modified
+    FROM {columns_source(_STAGED_TYPES, param="$payload")} p
+    ON CONFLICT (date_scraped, train_no) DO UPDATE SET
+        status = EXCLUDED.status,
+        attempts = etl_progress.attempts + EXCLUDED.attempts,
+        last_error = COALESCE(EXCLUDED.last_error, etl_progress.last_error),
+        updated_at = EXCLUDED.updated_at,
+        payload_hash = CASE WHEN EXCLUDED.payload_hash IS NULL THEN etl_progress.payload_hash
+                            ELSE EXCLUDED.payload_hash END,
+        etag = CASE WHEN EXCLUDED.payload_hash IS NULL THEN etl_progress.etag ELSE EXCLUDED.etag END,
+        last_modified = CASE WHEN EXCLUDED.payload_hash IS NULL THEN etl_progress.last_modified
+                             ELSE EXCLUDED.last_modified END
+"""
+
+
+def payload_hash(payload: Any) -> str:
+    """
+    Hash a decoded payload independently of key order and whitespace.
+
+    Args:
+        payload (Any): The decoded JSON body.
+
+    Returns:
+        str: A hex digest, equal for equal payloads.
+    """
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+
+def record_progress(
+    conn: duckdb.DuckDBPyConnection,
+    date_scraped: date,
+    status: str,
+    train_nos: Sequence[str],
+    errors: Optional[Mapping[str, str]] = None,
+    fingerprints: Optional[Mapping[str, PayloadFingerprint]] = None,
+) -> None:
+    """
+    Set the progress state of many trains in one statement.
+
+    Entering the `fetched` or `failed` state counts as one fetch attempt; the
+    `loaded` state only confirms an earlier fetch.
+
+    Args:
+        conn (duckdb.DuckDBPyConnection): Connection to write through.
+        date_scraped (date): The service date the trains belong to.
+        status (str): One of `FETCHED`, `LOADED`, or `FAILED`.
+        train_nos (Sequence[str]): Train numbers to update.
+        errors (Optional[Mapping[str, str]], optional): Error message per train
+            number; trains without an entry keep their previous `last_error`.
+        fingerprints (Optional[Mapping[str, PayloadFingerprint]], optional):
+            Fingerprint of the payload per train number; trains without an entry
+            keep their previous fingerprint.
+
+    Raises:
+        ValueError: If `status` is not a known progress state.
+    """
+    if status not in (FETCHED, LOADED, FAILED):
+        raise ValueError(f"Unknown progress status: {status}")
+    if not train_nos:
+        return
+
+    errors = errors or {}
+    fingerprints = fingerprints or {}
+    payload = encode_columns(
+        {
+            "train_no": list(train_nos),
+            "last_error": [errors.get(train_no) for train_no in train_nos],
+            "payload_hash": [fingerprints.get(tn, {}).get("payload_hash") for tn in train_nos],
+            "etag": [fingerprints.get(tn, {}).get("etag") for tn in train_nos],
+            "last_modified": [fingerprints.get(tn, {}).get("last_modified") for tn in train_nos],
+        }
+    )
+    conn.execute(
+        _UPSERT_SQL,
+        {
+            "date_scraped": date_scraped,
+            "status": status,
+            "increment": 0 if status == LOADED else 1,
+            "payload": payload,
+        },
+    )
+
+
+def get_loaded_train_numbers(
+    conn: duckdb.DuckDBPyConnection,
+    date_scraped: date,
+) -> Set[str]:
+    """
+    Retrieve the train numbers already loaded for a service date.
+
+    Args:
+        conn (duckdb.DuckDBPyConnection): Connection to read through.
+        date_scraped (date): The service date to check.
+
+    Returns:
+        Set[str]: Train numbers whose status is `loaded`.
+    """
+    rows = conn.execute(
+        "SELECT train_no FROM etl_progress WHERE date_scraped = ? AND status = ?",
+        [date_scraped, LOADED],
+    ).fetchall()
+    return {row[0] for row in rows}
+
+
+def get_failed_trains(
+    conn: duckdb.DuckDBPyConnection,
+    date_scraped: date,
+) -> Dict[str, str]:
+    """
+    Retrieve the trains whose latest fetch failed for a service date, with their errors.
+
+    Args:
+        conn (duckdb.DuckDBPyConnection): Connection to read through.
+        date_scraped (date): The service date to check.
+
+    Returns:
+        Dict[str, str]: Last error per train number whose status is `failed`, in
+            train number order.
+    """
+    rows = conn.execute(
+        "SELECT train_no, last_error FROM etl_progress WHERE date_scraped = ? AND status = ? ORDER BY train_no",
+        [date_scraped, FAILED],
+    ).fetchall()
+    return {train_no: last_error or "" for train_no, last_error in rows}
+
+
+def get_payload_fingerprints(
+    conn: duckdb.DuckDBPyConnection,
+    date_scraped: date,
+) -> Dict[str, PayloadFingerprint]:
+    """
+    Retrieve the fingerprints of the payloads trains were loaded from for a service date.
+
+    Only trains whose status is `loaded` are returned, so a train whose later
+    fetch or load did not complete is never mistaken for up to date.
+
+    Args:
+        conn (duckdb.DuckDBPyConnection): Connection to read through.
+        date_scraped (date): The service date to check.
+
+    Returns:
+        Dict[str, PayloadFingerprint]: Fingerprint per train number.
+    """
+    rows = conn.execute(
+        """
+        SELECT train_no, payload_hash, etag, last_modified
+        FROM etl_progress
+        WHERE date_scraped = ? AND status = ? AND payload_hash IS NOT NULL
+        """,
+        [date_scraped, LOADED],
+    ).fetchall()
+    return {
+        train_no: PayloadFingerprint(payload_hash=digest, etag=etag, last_modified=last_modified)
+        for train_no, digest, etag, last_modified in rows
+    }
@@ -0,0 +1,258 @@
+"""Query module for project-nexline.
+
+This module is the read API for delay analytics. Every function reads only the
+daily aggregate tables maintained by `src.aggregates`, so a query over months of
+service scans thousands of aggregate rows rather than every stop event.
+
+Delays are actual delays in seconds (`act_delay_sec`) over stops with an actual
+time; a stop counts as on time when it is at most `config.ON_TIME_THRESHOLD_SEC`
+late.
+
+Results are cached in `QUERY_CACHE` per database, query and arguments, and reused
+until the data version changes (see `src.db.bump_data_version`), so a repeated
+question costs one single-row version lookup. Without an explicit connection,
+queries read through the process-wide `src.readers` pool, so they never hold the
+database file lock that the ETL needs.
+"""
+from datetime import date
+from typing import Any, Dict, List, Optional, TypedDict, cast
+
+import duckdb
+
+import config
+from src.cache import ResultCache
+from src.readers import get_reader_pool
+
+# Shared by every query function of this process
+QUERY_CACHE = ResultCache(maxsize=config.QUERY_CACHE_SIZE, ttl=config.QUERY_CACHE_TTL_SEC)
+
+# Current data version and the file of the connected database, in one lookup
+_VERSION_SQL: str = """
+    SELECT
+        version,
+        (SELECT path FROM duckdb_databases() WHERE database_name = current_database())
+    FROM data_version
+"""
+
+
+class TrainPerformance(TypedDict):
+    """On-time performance of one train over a date range."""
+    train_no: str
+    days: int
+    observed_stops: int
+    on_time_stops: int
+    on_time_pct: Optional[float]
+    avg_delay_sec: Optional[float]
+    max_delay_sec: Optional[int]
+
+
+class StationDelay(TypedDict):
+    """Delay statistics of one station over a date range."""
+    station: str
+    observed_stops: int
+    on_time_pct: Optional[float]
+    avg_delay_sec: Optional[float]
+    max_delay_sec: Optional[int]
+
+
+class HeatmapCell(TypedDict):
+    """Average delay for one ISO weekday (1 = Monday) and scheduled hour."""
+    weekday: int
+    hour: int
+    observed_stops: int
+    avg_delay_sec: Optional[float]
+
+
+# Shared select list turning summed counters into rates
+_STATS: str = """
+    sum(observed_stops)::INTEGER AS observed_stops,
+    round(100.0 * sum(on_time_stops) / nullif(sum(observed_stops), 0), 2) AS on_time_pct,
+    round(sum(sum_delay_sec) / nullif(sum(observed_stops), 0), 1) AS avg_delay_sec,
+    max(max_delay_sec) AS max_delay_sec
+"""
+
+_TRAIN_SQL: str = f"""
+    SELECT
+        train_no,
+        count(*)::INTEGER AS days,
+        {_STATS},
+        sum(on_time_stops)::INTEGER AS on_time_stops
+    FROM daily_train_delays
+    WHERE date_scraped BETWEEN $start AND $end
+      AND ($train_no IS NULL OR train_no = $train_no)
+    GROUP BY train_no
+"""
+
+
+def _fetch(
+    conn: Optional[duckdb.DuckDBPyConnection],
+    sql: str,
+    params: Dict[str, Any],
+) -> List[Dict[str, Any]]:
+    """
+    Run a query, or reuse its cached result, and return rows as dictionaries.
+
+    Args:
+        conn (Optional[duckdb.DuckDBPyConnection]): Connection to read through;
+            when omitted, a cursor is borrowed from the reader pool.
+        sql (str): The SELECT statement.
+        params (Dict[str, Any]): Named parameters of `sql`.
+
+    Returns:
+        List[Dict[str, Any]]: One dictionary per result row, keyed by column name.
+            The rows are copies, so callers may modify them freely.
+    """
+    if conn is None:
+        with get_reader_pool().cursor() as cursor:
+            return _fetch(cursor, sql, params)
+
+    version, database = conn.execute(_VERSION_SQL).fetchone()
+    key = (database, sql, tuple(sorted(params.items())))
+    hit, rows = QUERY_CACHE.get(key, version)
+    if not hit:
+        result = conn.execute(sql, params)
+        columns = [column[0] for column in result.description]
+        rows = tuple(dict(zip(columns, row)) for row in result.fetchall())
+        QUERY_CACHE.put(key, version, rows)
+    return [dict(row) for row in rows]
+
+
+def train_on_time_performance(
+    start: date,
+    end: date,
+    train_no: Optional[str] = None,
+    conn: Optional[duckdb.DuckDBPyConnection] = None,
+) -> List[TrainPerformance]:
+    """
+    Get the on-time performance of each train between two service dates.
+
+    Args:
+        start (date): First service date, inclusive.
+        end (date): Last service date, inclusive.
+        train_no (Optional[str], optional): Restrict to one train. Defaults to all.
+        conn (Optional[duckdb.DuckDBPyConnection], optional): Connection to read
+            through. Defaults to a cursor from the reader pool.
+
+    Returns:
+        List[TrainPerformance]: One entry per train, ordered by train number.
+    """
+    rows = _fetch(
+        conn,
+        _TRAIN_SQL + " ORDER BY train_no",
+        {"start": start, "end": end, "train_no": train_no},
+    )
+    return cast(List[TrainPerformance], rows)
+
+
+def worst_trains(
+    start: date,
+    end: date,
+    limit: int = 10,
+    min_observed_stops: int = 1,
+    conn: Optional[duckdb.DuckDBPyConnection] = None,
+) -> List[TrainPerformance]:
+    """
+    Get the trains with the highest average delay between two service dates.
+
+    Args:
+        start (date): First service date, inclusive.
+        end (date): Last service date, inclusive.
+        limit (int, optional): Maximum number of trains returned. Defaults to 10.
+        min_observed_stops (int, optional): Ignore trains with fewer observed
+            stops in the range. Defaults to 1.
+        conn (Optional[duckdb.DuckDBPyConnection], optional): Connection to read
+            through. Defaults to a cursor from the reader pool.
+
+    Returns:
+        List[TrainPerformance]: Up to `limit` trains, worst first.
+    """
+    rows = _fetch(
+        conn,
+        f"""
+        SELECT * FROM ({_TRAIN_SQL})
+        WHERE observed_stops >= $min_observed
+        ORDER BY avg_delay_sec DESC, train_no
+        LIMIT $limit
+        """,
+        {
+            "start": start,
+            "end": end,
+            "train_no": None,
+            "min_observed": max(1, min_observed_stops),
+            "limit": limit,
+        },
+    )
+    return cast(List[TrainPerformance], rows)
+
+
+def station_average_delays(
+    start: date,
+    end: date,
+    station: Optional[str] = None,
+    conn: Optional[duckdb.DuckDBPyConnection] = None,
+) -> List[StationDelay]:
+    """
+    Get the average delay at each station between two service dates.
+
+    Args:
+        start (date): First service date, inclusive.
+        end (date): Last service date, inclusive.
+        station (Optional[str], optional): Restrict to one station. Defaults to all.
+        conn (Optional[duckdb.DuckDBPyConnection], optional): Connection to read
+            through. Defaults to a cursor from the reader pool.
+
+    Returns:
+        List[StationDelay]: One entry per station, highest average delay first.
+    """
+    rows = _fetch(
+        conn,
+        f"""
+        SELECT station, {_STATS}
+        FROM daily_station_delays
+        WHERE date_scraped BETWEEN $start AND $end
+          AND ($station IS NULL OR station = $station)
+        GROUP BY station
+        ORDER BY avg_delay_sec DESC NULLS LAST, station
+        """,
+        {"start": start, "end": end, "station": station},
+    )
+    return cast(List[StationDelay], rows)
+
+
+def hourly_delay_heatmap(
+    start: date,
+    end: date,
+    station: Optional[str] = None,
+    conn: Optional[duckdb.DuckDBPyConnection] = None,
+) -> List[HeatmapCell]:
+    """
+    Get the average delay per weekday and scheduled hour between two service dates.
+
+    Args:
+        start (date): First service date, inclusive.
+        end (date): Last service date, inclusive.
+        station (Optional[str], optional): Restrict to one station. Defaults to all.
+        conn (Optional[duckdb.DuckDBPyConnection], optional): Connection to read
+            through. Defaults to a cursor from the reader pool.
+
+    Returns:
+        List[HeatmapCell]: One cell per (weekday, hour) with stops, ordered by
+            weekday then hour.
+    """
+    rows = _fetch(
+        conn,
+        """
+        SELECT
+            isodow(date_scraped)::INTEGER AS weekday,
+            hour::INTEGER AS hour,
+            sum(observed_stops)::INTEGER AS observed_stops,
+            round(sum(sum_delay_sec) / nullif(sum(observed_stops), 0), 1) AS avg_delay_sec
+        FROM daily_hourly_delays
+        WHERE date_scraped BETWEEN $start AND $end
+          AND ($station IS NULL OR station = $station)
+        GROUP BY ALL
+        ORDER BY weekday, hour
+        """,
+        {"start": start, "end": end, "station": station},
+    )
+    return cast(List[HeatmapCell], rows)
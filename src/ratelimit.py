@@ -0,0 +1,266 @@
+"""Rate limiting module for project-nexline.
+
+This module provides a token-bucket limiter that can be shared by every in-flight
+request against the SEPTA API, so the aggregate request rate stays at the configured
+RPS no matter how many requests run concurrently.
+
+Within those ceilings, an `AdaptiveLimiter` backs off when SEPTA slows down or
+throttles (additive increase, multiplicative decrease of both concurrency and
+rate), and a `CircuitBreaker` pauses all fetching while the API is down instead of
+spending the run on retries that cannot succeed.
+"""
+import asyncio
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket usable from both worker threads and asyncio tasks.
+
+    Tokens refill continuously at `rate` per second up to `capacity`. A caller that
+    finds the bucket empty reserves a future token instead of spinning, so waiters
+    are released in order and the long-run throughput is exactly `rate`.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0) -> None:
+        """
+        Initialize the bucket full.
+
+        Args:
+            rate (float): Tokens added per second.
+            capacity (float, optional): Maximum burst size. Defaults to 1.0.
+
+        Raises:
+            ValueError: If `rate` or `capacity` is not positive.
+        """
+        if rate <= 0 or capacity <= 0:
+            raise ValueError("rate and capacity must be positive")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Take one token and return how long the caller must wait before using it.
+
+        Returns:
+            float: Seconds to wait; 0.0 if a token was immediately available.
+        """
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._updated
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self) -> None:
+        """Block the current thread until a token is available."""
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self) -> None:
+        """Suspend the current task until a token is available."""
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD controller of in-flight requests and request rate, for use from one event loop.
+
+    Starts at its ceilings. Each healthy response adds 1/limit to the concurrency
+    limit and 1/rate to the rate, i.e. about one unit per round of requests, up to
+    the ceilings. A congested response (throttled, transient failure, or slower
+    than `target_latency`) halves both, at most once per `decrease_interval`, so a
+    burst of failures from one round counts as one signal.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_rps: float,
+        min_rps: float = config.FETCH_MIN_RPS,
+        target_latency: float = config.FETCH_TARGET_LATENCY_SEC,
+        decrease_interval: Optional[float] = None,
+    ) -> None:
+        """
+        Initialize the controller at its ceilings.
+
+        Args:
+            max_concurrency (int): Most requests ever in flight at once.
+            max_rps (float): Highest request rate ever allowed.
+            min_rps (float, optional): Lowest rate backed off to. Defaults to
+                `config.FETCH_MIN_RPS`.
+            target_latency (float, optional): Responses slower than this many
+                seconds count as congestion. Defaults to `config.FETCH_TARGET_LATENCY_SEC`.
+            decrease_interval (Optional[float], optional): Minimum seconds between
+                two decreases. Defaults to `target_latency`.
+        """
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_rps = max_rps
+        self.min_rps = min(min_rps, max_rps)
+        self.target_latency = target_latency
+        self.decrease_interval = target_latency if decrease_interval is None else decrease_interval
+        self.concurrency = float(self.max_concurrency)
+        self.decreases = 0
+        self._bucket = TokenBucket(max_rps)
+        self._in_flight = 0
+        self._last_decrease: Optional[float] = None
+        self._condition: Optional[asyncio.Condition] = None
+
+    @property
+    def rps(self) -> float:
+        """The current request rate."""
+        return self._bucket.rate
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Wait until the concurrency limit and the current rate allow one more request."""
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < int(self.concurrency))
+            self._in_flight += 1
+        try:
+            await self._bucket.acquire_async()
+            yield
+        finally:
+            async with self._condition:
+                self._in_flight -= 1
+                self._condition.notify_all()
+
+    def record(self, latency: float, congested: bool = False) -> None:
+        """
+        Adjust the limits after one response.
+
+        Args:
+            latency (float): Seconds the request took.
+            congested (bool, optional): True if the request was throttled or failed
+                transiently. Defaults to False.
+        """
+        if congested or latency > self.target_latency:
+            now = time.monotonic()
+            if self._last_decrease is not None and now - self._last_decrease < self.decrease_interval:
+                return
+            self._last_decrease = now
+            self.decreases += 1
+            self.concurrency = max(1.0, self.concurrency / 2)
+            self._bucket.rate = max(self.min_rps, self._bucket.rate / 2)
+            logger.info(f"Backing off to {int(self.concurrency)} requests in flight at {self.rps:.2f} req/s")
+        else:
+            self.concurrency = min(float(self.max_concurrency), self.concurrency + 1 / self.concurrency)
+            self._bucket.rate = min(self.max_rps, self._bucket.rate + 1 / self._bucket.rate)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised once the upstream API has been down for longer than the breaker waits."""
+
+
+class CircuitBreaker:
+    """
+    Pauses every request of a run while the upstream API is down, for use from one event loop.
+
+    Opens after `failure_threshold` consecutive transient failures. While open,
+    callers of `wait()` are held until the cooldown ends, then one probe request is
+    let through: success closes the breaker, failure reopens it with a doubled
+    cooldown. Once an outage has lasted `give_up_after` seconds, `wait()` raises
+    `CircuitOpenError` so the remaining work fails fast and can be resumed later.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = config.CIRCUIT_FAILURE_THRESHOLD,
+        cooldown: float = config.CIRCUIT_COOLDOWN_SEC,
+        max_cooldown: float = config.CIRCUIT_MAX_COOLDOWN_SEC,
+        give_up_after: float = config.CIRCUIT_GIVE_UP_SEC,
+    ) -> None:
+        """
+        Initialize a closed breaker.
+
+        Args:
+            failure_threshold (int, optional): Consecutive transient failures that
+                open the breaker. Defaults to `config.CIRCUIT_FAILURE_THRESHOLD`.
+            cooldown (float, optional): Seconds before the first probe. Defaults
+                to `config.CIRCUIT_COOLDOWN_SEC`.
+            max_cooldown (float, optional): Longest pause between probes. Defaults
+                to `config.CIRCUIT_MAX_COOLDOWN_SEC`.
+            give_up_after (float, optional): Seconds of outage after which waiting
+                stops. Defaults to `config.CIRCUIT_GIVE_UP_SEC`.
+        """
+        self.failure_threshold = max(1, failure_threshold)
+        self.base_cooldown = cooldown
+        self.max_cooldown = max(cooldown, max_cooldown)
+        self.give_up_after = give_up_after
+        self.opens = 0
+        self._failures = 0
+        self._cooldown = cooldown
+        self._open_until: Optional[float] = None
+        self._outage_start: Optional[float] = None
+        self._probing = False
+
+    @property
+    def is_open(self) -> bool:
+        """True while requests are being held back."""
+        return self._open_until is not None
+
+    async def wait(self) -> None:
+        """
+        Return once a request may be sent.
+
+        Raises:
+            CircuitOpenError: If the current outage has lasted `give_up_after` seconds.
+        """
+        while self._open_until is not None:
+            now = time.monotonic()
+            down_for = now - self._outage_start
+            if down_for >= self.give_up_after:
+                raise CircuitOpenError(f"SEPTA API unavailable for {down_for:.0f}s; giving up")
+            if now < self._open_until:
+                await asyncio.sleep(min(self._open_until, self._outage_start + self.give_up_after) - now)
+            elif not self._probing:
+                # This caller sends the probe; everyone else keeps waiting for its outcome
+                self._probing = True
+                return
+            else:
+                await asyncio.sleep(min(1.0, self._cooldown))
+
+    def record_success(self) -> None:
+        """Note that the API answered, closing the breaker if it was open."""
+        if self._open_until is not None:
+            logger.info("SEPTA API is answering again; resuming")
+        self._failures = 0
+        self._cooldown = self.base_cooldown
+        self._open_until = None
+        self._outage_start = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        """Note a transient failure, opening (or reopening) the breaker as needed."""
+        self._failures += 1
+        now = time.monotonic()
+        if self._probing:
+            self._probing = False
+            self._cooldown = min(self._cooldown * 2, self.max_cooldown)
+            self._open_until = now + self._cooldown
+        elif self._open_until is None and self._failures >= self.failure_threshold:
+            self.opens += 1
+            self._open_until = now + self._cooldown
+            self._outage_start = now
+            logger.warning(
+                f"{self._failures} consecutive fetch failures; pausing all requests for {self._cooldown:.0f}s"
+            )
@@ -0,0 +1,154 @@
+"""Raw response store for project-nexline.
+
+RRSchedules only serves the current day, so once a schedule has been transformed
+its raw payload cannot be fetched again. This module keeps every captured payload
+in an append-only, zstd-compressed Parquet store next to the database file:
+
+    raw/rrschedules/date=YYYY-MM-DD/part_<captured>_<id>.parquet
+
+Each file holds (train_no, fetched_at, payload) rows, the payload being the JSON
+body as decoded from the API. Files are only ever added, never rewritten; when a
+train was captured more than once for a date, the latest capture wins on read.
+Replaying a date from here re-runs transform and load without any network access.
+"""
+import json
+import threading
+import uuid
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import duckdb
+
+from src.db import columns_source, encode_columns, get_raw_dir
+
+# Column types of the buffered captures
+_CAPTURE_TYPES: Dict[str, str] = {"train_no": "VARCHAR", "fetched_at": "TIMESTAMP", "payload": "VARCHAR"}
+
+
+class RawResponseStore:
+    """
+    Buffered, append-only writer and reader of raw RRSchedules payloads.
+
+    Thread-safe: captures may be added from any thread; `flush` writes everything
+    buffered so far as one new file per service date.
+    """
+
+    def __init__(self, root: Optional[Path] = None) -> None:
+        """
+        Initialize the store without touching the disk.
+
+        Args:
+            root (Optional[Path], optional): Directory holding the `date=` partitions.
+                Defaults to `src.db.get_raw_dir()`.
+        """
+        self.root = root if root is not None else get_raw_dir()
+        self._pending: Dict[date, List[Tuple[str, str, str]]] = {}
+        self._lock = threading.Lock()
+
+    def _partition_dir(self, service_date: date) -> Path:
+        """Return the directory holding the captures of one service date."""
+        return self.root / f"date={service_date.isoformat()}"
+
+    def add(self, service_date: date, train_no: str, payload: Any) -> None:
+        """
+        Buffer one train's decoded payload for the next flush.
+
+        Args:
+            service_date (date): The service date the train was fetched for.
+            train_no (str): The train number.
+            payload (Any): The decoded JSON body of the response.
+        """
+        fetched_at = datetime.now().isoformat(sep=" ")
+        with self._lock:
+            self._pending.setdefault(service_date, []).append((train_no, fetched_at, json.dumps(payload)))
+
+    def flush(self) -> int:
+        """
+        Write every buffered capture, as one new Parquet file per service date.
+
+        Returns:
+            int: The number of captures written.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        conn = duckdb.connect()
+        try:
+            for service_date, rows in sorted(pending.items()):
+                train_nos, fetched_at, payloads = (list(column) for column in zip(*rows))
+                document = encode_columns({"train_no": train_nos, "fetched_at": fetched_at, "payload": payloads})
+                stamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+                target = self._partition_dir(service_date) / f"part_{stamp}_{uuid.uuid4().hex[:8]}.parquet"
+                target.parent.mkdir(parents=True, exist_ok=True)
+                # Renamed into place whole, so readers never see a partial file
+                partial = target.with_suffix(".parquet.tmp")
+                path = partial.as_posix().replace("'", "''")
+                conn.execute(
+                    f"""
+                    COPY (SELECT * FROM {columns_source(_CAPTURE_TYPES)})
+                    TO '{path}' (FORMAT PARQUET, COMPRESSION ZSTD)
+                    """,
+                    [document],
+                )
+                partial.replace(target)
+        finally:
+            conn.close()
+        return sum(len(rows) for rows in pending.values())
+
+    def _files(self, service_date: date) -> List[str]:
+        """Return the capture files of one service date, oldest first."""
+        return [path.as_posix() for path in sorted(self._partition_dir(service_date).glob("*.parquet"))]
+
+    def train_numbers(self, service_date: date) -> List[str]:
+        """
+        List the trains captured for one service date, without reading payloads.
+
+        Args:
+            service_date (date): The service date to list.
+
+        Returns:
+            List[str]: Distinct train numbers in ascending order.
+        """
+        files = self._files(service_date)
+        if not files:
+            return []
+        conn = duckdb.connect()
+        try:
+            rows = conn.execute(
+                "SELECT DISTINCT train_no FROM read_parquet($files) ORDER BY train_no", {"files": files}
+            ).fetchall()
+        finally:
+            conn.close()
+        return [row[0] for row in rows]
+
+    def read(self, service_date: date) -> Dict[str, Any]:
+        """
+        Read the latest captured payload of every train for one service date.
+
+        Args:
+            service_date (date): The service date to read.
+
+        Returns:
+            Dict[str, Any]: Decoded payloads keyed by train number, in train number
+                order; empty if nothing was captured for the date.
+        """
+        files = self._files(service_date)
+        if not files:
+            return {}
+        conn = duckdb.connect()
+        try:
+            rows = conn.execute(
+                """
+                SELECT train_no, payload
+                FROM read_parquet($files)
+                QUALIFY row_number() OVER (PARTITION BY train_no ORDER BY fetched_at DESC) = 1
+                ORDER BY train_no
+                """,
+                {"files": files},
+            ).fetchall()
+        finally:
+            conn.close()
+        return {train_no: json.loads(payload) for train_no, payload in rows}
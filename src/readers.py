@@ -0,0 +1,228 @@
+"""Read-only connection module for project-nexline.
+
+DuckDB lets a database file be opened either by one read-write process or by any
+number of read-only processes, never both. A dashboard holding the file open would
+therefore make the nightly ETL fail, and would itself fail while the ETL runs.
+
+Readers here never keep the live file open. A `ReaderPool` serves cursors from one
+read-only handle on a snapshot copy kept next to the database, named after its data
+version (`snapshots/<name>.v<version>.duckdb`). At most every
+`config.READER_REFRESH_SEC` the pool copies the live file again, but only if the
+data version has changed and no writer holds the file at that moment; otherwise
+the newest existing snapshot keeps being served. The copy is a plain file copy
+made while the live file is attached read-only, so a writer arriving meanwhile
+waits (see `src.db.get_connection`) only as long as the filesystem takes to copy
+the file, well within `config.DB_LOCK_TIMEOUT_SEC` for any realistic size.
+"""
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import duckdb
+
+import config
+import src.db as db_module
+
+logger = logging.getLogger(__name__)
+
+
+def _wal_path(path: Path) -> Path:
+    """Return the write-ahead log DuckDB keeps next to a database file."""
+    return path.with_name(f"{path.name}.wal")
+
+
+def _quote(path: Path) -> str:
+    """Quote a file path as a SQL string literal (ATTACH takes no parameters)."""
+    return "'" + str(path).replace("'", "''") + "'"
+
+
+class ReaderPool:
+    """
+    Pool of read-only cursors over a periodically refreshed snapshot of a database.
+
+    Thread-safe: each thread should take its own cursor via `cursor()`.
+    """
+
+    def __init__(
+        self,
+        db_file: Path,
+        pool_size: int = config.READER_POOL_SIZE,
+        refresh_interval: float = config.READER_REFRESH_SEC,
+    ) -> None:
+        """
+        Initialize the pool without touching the database.
+
+        Args:
+            db_file (Path): The live database file.
+            pool_size (int, optional): Idle cursors kept for reuse. Defaults to
+                `config.READER_POOL_SIZE`.
+            refresh_interval (float, optional): Minimum seconds between checks
+                for newer data. Defaults to `config.READER_REFRESH_SEC`.
+        """
+        self.db_file = db_file
+        self.snapshot_dir = db_file.parent / "snapshots"
+        self.pool_size = pool_size
+        self.refresh_interval = refresh_interval
+        self._handle: Optional[duckdb.DuckDBPyConnection] = None
+        self._snapshot: Optional[Path] = None
+        self._generation = 0
+        self._idle: List[duckdb.DuckDBPyConnection] = []
+        self._checked_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _snapshot_path(self, version: int) -> Path:
+        """Return the snapshot file holding the given data version."""
+        return self.snapshot_dir / f"{self.db_file.stem}.v{version}.duckdb"
+
+    def _latest_snapshot(self) -> Optional[Path]:
+        """Return the snapshot with the highest data version, or None if there is none."""
+        snapshots = {}
+        for path in self.snapshot_dir.glob(f"{self.db_file.stem}.v*.duckdb"):
+            version = path.name[len(self.db_file.stem) + 2:-len(".duckdb")]
+            if version.isdigit():
+                snapshots[int(version)] = path
+        return snapshots[max(snapshots)] if snapshots else None
+
+    def _sync_snapshot(self) -> Path:
+        """
+        Make sure a snapshot of the live database's current data version exists.
+
+        Returns:
+            Path: The snapshot to read. While a writer holds the live file, this is
+                the newest existing snapshot.
+
+        Raises:
+            duckdb.IOException: If the live file is locked and there is no
+                snapshot to fall back on, or on any other I/O error.
+        """
+        conn = duckdb.connect()
+        try:
+            try:
+                conn.execute(f"ATTACH {_quote(self.db_file)} AS live (READ_ONLY)")
+            except duckdb.IOException as error:
+                latest = self._latest_snapshot()
+                if db_module.is_lock_error(error) and latest is not None:
+                    logger.info("Database is being written; serving the existing snapshot")
+                    return latest
+                raise
+            version = conn.execute("SELECT version FROM live.data_version").fetchone()[0]
+            target = self._snapshot_path(version)
+            if target.exists():
+                return target
+
+            self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+            staging = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+            # The attachment keeps writers out, so the file and any write-ahead log
+            # are copied consistently, at file-copy speed rather than row by row
+            copies = [(self.db_file, staging, target)]
+            wal = _wal_path(self.db_file)
+            if wal.exists():
+                copies.insert(0, (wal, _wal_path(staging), _wal_path(target)))
+            for source, copy, _ in copies:
+                shutil.copyfile(source, copy)
+        finally:
+            conn.close()
+
+        # Renamed into place whole, log first, so other processes never see a partial copy
+        for _, copy, final in copies:
+            copy.replace(final)
+        logger.info(f"Wrote reader snapshot at data version {version}")
+        for old in self.snapshot_dir.glob(f"{self.db_file.stem}.v*.duckdb"):
+            if old != target:
+                # Processes still reading an old snapshot keep their open file
+                old.unlink(missing_ok=True)
+                _wal_path(old).unlink(missing_ok=True)
+        return target
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Move to a newer snapshot if the check interval has passed (or `force` is set).
+
+        Cursors already handed out keep reading the snapshot they were opened on.
+
+        Args:
+            force (bool, optional): Check now regardless of the interval.
+                Defaults to False.
+
+        Returns:
+            bool: True if readers moved to a new snapshot.
+        """
+        with self._lock:
+            now = time.monotonic()
+            due = self._checked_at is None or now - self._checked_at >= self.refresh_interval
+            if not (force or due or self._handle is None):
+                return False
+            self._checked_at = now
+            target = self._sync_snapshot()
+            if target == self._snapshot and self._handle is not None:
+                return False
+            # Earlier cursors keep the old snapshot open until they are closed
+            for idle in self._idle:
+                idle.close()
+            self._idle = []
+            self._handle = duckdb.connect(str(target), read_only=True)
+            self._snapshot = target
+            self._generation += 1
+            return True
+
+    @contextmanager
+    def cursor(self) -> Iterator[duckdb.DuckDBPyConnection]:
+        """
+        Borrow a read-only cursor, returning it to the pool afterwards.
+
+        Yields:
+            duckdb.DuckDBPyConnection: A cursor on the current snapshot.
+        """
+        self.refresh()
+        with self._lock:
+            generation = self._generation
+            cursor = self._idle.pop() if self._idle else self._handle.cursor()
+        try:
+            yield cursor
+        finally:
+            with self._lock:
+                if generation == self._generation and len(self._idle) < self.pool_size:
+                    self._idle.append(cursor)
+                else:
+                    cursor.close()
+
+    def close(self) -> None:
+        """Close every idle cursor and the snapshot handle."""
+        with self._lock:
+            for idle in self._idle:
+                idle.close()
+            self._idle = []
+            if self._handle is not None:
+                self._handle.close()
+                self._handle = None
+
+
+_pools: Dict[Path, ReaderPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_reader_pool() -> ReaderPool:
+    """
+    Get the process-wide reader pool for the current `src.db.DB_FILE`.
+
+    Returns:
+        ReaderPool: The pool, created on first use.
+    """
+    db_file = db_module.DB_FILE.resolve()
+    with _pools_lock:
+        if db_file not in _pools:
+            _pools[db_file] = ReaderPool(db_file)
+        return _pools[db_file]
+
+
+def close_reader_pools() -> None:
+    """Close and forget every reader pool of this process."""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
@@ -3,14 +3,121 @@
 This module normalizes and validates raw schedule records fetched from the RRSchedules
 endpoint. It converts time strings to datetime.time objects, filters out duplicates,
  and discards malformed entries.
+
+Time strings are parsed by `parse_time`, which recognizes the handful of formats
+SEPTA actually sends ("3:08 pm", "15:08") directly and only falls back to
+`dateutil` for anything else.
+
+For large batches, `transform_columns` performs the same cleaning on column
+arrays inside DuckDB: each distinct time string is parsed once with vectorized
+string functions, and "na" handling and deduplication are set operations. The
+pass alone is slower than `transform`, but the loader inserts its result without
+staging the cleaned records again, which makes transform plus load faster from a
+few hundred trains per batch.
+
+For transforming in worker processes, `transform_chunk` cleans many trains at once
+and returns `CompactRecords`: parallel arrays of ISO time strings, which pickle
+far smaller and faster than lists of dicts of `time` objects and are what the
+loader stages anyway.
 """
+import re
+import time as clock
+import uuid
 from datetime import time
-from typing import List, Optional, TypedDict, Tuple, Set
+from functools import lru_cache
+from typing import Dict, List, Mapping, Optional, Sequence, TypedDict, Tuple, Set, Union
 
+import duckdb
 from dateutil import parser
 
+from src.db import columns_source, encode_columns
 from src.fetchers.rrschedules import ScheduleRecord
 
+# "15:08", "15:08:30", "3:08 pm", "3:08pm", "3:08 p.m."
+_TIME_PATTERN = re.compile(
+    r"(\d{1,2}):(\d{2})(?::(\d{2}))?\s*(?:([ap])\.?m\.?)?", re.IGNORECASE
+)
+# Values SEPTA uses for "no time"; dateutil rejects them too
+_MISSING_VALUES = frozenset({"", "na"})
+
+# Column arrays accepted by `transform_columns`, in staging order
+RAW_COLUMNS: Tuple[str, ...] = ("train_no", "station", "sched_tm", "est_tm", "act_tm")
+_RAW_SOURCE: str = columns_source({column: "VARCHAR" for column in RAW_COLUMNS}, param="$payload", ordinal="ord")
+
+# Characters removed from both ends of raw values: every character for which
+# str.isspace() holds, so SQL trim() matches str.strip()
+_STRIP_CHARS: str = (
+    "\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f \x85\xa0\u1680\u2000\u2001\u2002\u2003\u2004\u2005"
+    "\u2006\u2007\u2008\u2009\u200a\u2028\u2029\u202f\u205f\u3000"
+)
+
+# RE2 equivalent of `_TIME_PATTERN`; values it cannot resolve fall back to parse_time
+_SQL_TIME_PATTERN: str = (
+    r"(?i)^(\d{1,2}):(\d{2})(?::(\d{2}))?\s*(?:([ap])\.?m\.?)?$"
+)
+
+# Table names and the staged source are formatted in per call; see
+# `transform_columns`. Time strings are trimmed in the lookup, once per distinct value
+_STAGE_RAW_SQL: str = """
+    CREATE TEMP TABLE {raw} AS
+    SELECT ord, train_no, trim(station, $strip) AS station, sched_tm, est_tm, act_tm
+    FROM {source}
+"""
+
+_BUILD_LOOKUP_SQL: str = """
+    CREATE TEMP TABLE {lookup} AS
+    SELECT
+        raw,
+        value,
+        CASE
+            WHEN NOT regexp_full_match(value, $pattern) THEN NULL
+            WHEN mi < 60 AND sec < 60 AND mer = '' AND h < 24
+                THEN make_time(h, mi, sec)
+            WHEN mi < 60 AND sec < 60 AND mer <> '' AND h BETWEEN 1 AND 12
+                THEN make_time(h % 12 + CASE WHEN mer = 'p' THEN 12 ELSE 0 END, mi, sec)
+        END AS parsed
+    FROM (
+        SELECT
+            raw,
+            value,
+            TRY_CAST(p.h AS INTEGER) AS h,
+            TRY_CAST(p.mi AS INTEGER) AS mi,
+            COALESCE(TRY_CAST(NULLIF(p.s, '') AS INTEGER), 0) AS sec,
+            lower(p.mer) AS mer
+        FROM (
+            SELECT raw, value, regexp_extract(value, $pattern, ['h', 'mi', 's', 'mer']) AS p
+            FROM (
+                SELECT raw, trim(raw, $strip) AS value
+                FROM (SELECT DISTINCT unnest([sched_tm, est_tm, act_tm]) AS raw FROM {raw})
+            )
+        )
+    )
+"""
+
+_CLEAN_SQL: str = """
+    CREATE TEMP TABLE {clean} AS
+    SELECT train_no, station, sched_time, est_time, act_time, ord
+    FROM (
+        SELECT
+            r.ord,
+            r.train_no,
+            r.station,
+            s.parsed AS sched_time,
+            e.parsed AS est_time,
+            a.parsed AS act_time
+        FROM {raw} r
+        JOIN {lookup} s ON s.raw = r.sched_tm
+        JOIN {lookup} e ON e.raw = r.est_tm
+        JOIN {lookup} a ON a.raw = r.act_tm
+        WHERE s.parsed IS NOT NULL AND e.parsed IS NOT NULL
+        QUALIFY row_number() OVER (
+            PARTITION BY r.train_no, r.station, sched_time, est_time, act_time
+            ORDER BY r.ord
+        ) = 1
+    )
+    ORDER BY ord
+"""
+
 
 class CleanRecord(TypedDict):
     """Type definition for a cleaned schedule record."""
@@ -20,6 +127,58 @@ class CleanRecord(TypedDict):
     act_time: Optional[time]
 
 
+class CompactRecords(TypedDict):
+    """One train's cleaned records as parallel arrays, times as ISO strings."""
+    station: List[str]
+    sched_time: List[str]
+    est_time: List[str]
+    act_time: List[Optional[str]]
+
+
+class TransformedChunk(TypedDict):
+    """Output of `transform_chunk` with the time spent producing it."""
+    trains: List[Tuple[str, CompactRecords]]
+    wall_sec: float
+    cpu_sec: float
+
+
+@lru_cache(maxsize=4096)
+def parse_time(raw: str) -> Optional[time]:
+    """
+    Parse a SEPTA time string into a time of day.
+
+    Results are memoized, since the same minute strings repeat thousands of times
+    across a service day.
+
+    Args:
+        raw (str): The stripped time string, e.g. "3:08 pm" or "15:08".
+
+    Returns:
+        Optional[time]: The parsed time, or None if the string is not a time
+            (including "na" and the empty string).
+    """
+    if raw.lower() in _MISSING_VALUES:
+        return None
+
+    match = _TIME_PATTERN.fullmatch(raw)
+    if match:
+        hour, minute = int(match.group(1)), int(match.group(2))
+        second = int(match.group(3) or 0)
+        meridiem = match.group(4)
+        if minute < 60 and second < 60:
+            if meridiem is None and hour < 24:
+                return time(hour, minute, second)
+            if meridiem is not None and 1 <= hour <= 12:
+                hour = hour % 12 + (12 if meridiem.lower() == "p" else 0)
+                return time(hour, minute, second)
+
+    # Unrecognized shape: defer to the general-purpose parser
+    try:
+        return parser.parse(raw).time()
+    except (ValueError, TypeError):
+        return None
+
+
 def transform(raw_records: List[ScheduleRecord]) -> List[CleanRecord]:
     """
     Transform raw schedule records into cleaned records.
@@ -40,19 +199,12 @@ def transform(raw_records: List[ScheduleRecord]) -> List[CleanRecord]:
         raw_est = record.get("est_tm", "").strip()
         raw_act = record.get("act_tm", "").strip()
 
-        try:
-            sched_time = parser.parse(raw_sched).time()
-            est_time = parser.parse(raw_est).time()
-        except (ValueError, TypeError):
+        sched_time = parse_time(raw_sched)
+        est_time = parse_time(raw_est)
+        if sched_time is None or est_time is None:
             continue
 
-        if raw_act.lower() == "na" or not raw_act:
-            act_time: Optional[time] = None
-        else:
-            try:
-                act_time = parser.parse(raw_act).time()
-            except (ValueError, TypeError):
-                act_time = None
+        act_time: Optional[time] = parse_time(raw_act)
 
         key = (station, sched_time, est_time, act_time)
         if key in seen:
@@ -69,3 +221,153 @@ def transform(raw_records: List[ScheduleRecord]) -> List[CleanRecord]:
         )
 
     return cleaned
+
+
+def compact(records: List[CleanRecord]) -> CompactRecords:
+    """
+    Convert one train's cleaned records to parallel arrays.
+
+    Args:
+        records (List[CleanRecord]): Cleaned records, as returned by `transform`.
+
+    Returns:
+        CompactRecords: The same records with times as ISO strings.
+    """
+    return CompactRecords(
+        station=[record["station"] for record in records],
+        sched_time=[record["sched_time"].isoformat() for record in records],
+        est_time=[record["est_time"].isoformat() for record in records],
+        act_time=[None if record["act_time"] is None else record["act_time"].isoformat() for record in records],
+    )
+
+
+def record_count(records: Union[List[CleanRecord], CompactRecords]) -> int:
+    """
+    Count one train's cleaned records in either representation.
+
+    Args:
+        records (Union[List[CleanRecord], CompactRecords]): Cleaned records.
+
+    Returns:
+        int: The number of records.
+    """
+    return len(records["station"]) if isinstance(records, dict) else len(records)
+
+
+def transform_chunk(trains: Sequence[Tuple[str, List[ScheduleRecord]]]) -> TransformedChunk:
+    """
+    Transform many trains in one call, e.g. as a task of a worker process.
+
+    Args:
+        trains (Sequence[Tuple[str, List[ScheduleRecord]]]): (train number, raw
+            records) pairs.
+
+    Returns:
+        TransformedChunk: (train number, compact records) pairs in input order,
+            with the wall and CPU time the call took.
+    """
+    wall = clock.perf_counter()
+    cpu = clock.process_time()
+    transformed = [(train_no, compact(transform(records))) for train_no, records in trains]
+    return TransformedChunk(
+        trains=transformed,
+        wall_sec=clock.perf_counter() - wall,
+        cpu_sec=clock.process_time() - cpu,
+    )
+
+
+def to_columns(raw_by_train: Mapping[str, List[ScheduleRecord]]) -> Dict[str, List[str]]:
+    """
+    Flatten per-train raw records into the column arrays used by `transform_columns`.
+
+    Args:
+        raw_by_train (Mapping[str, List[ScheduleRecord]]): Raw records keyed by
+            train number.
+
+    Returns:
+        Dict[str, List[str]]: One list per name in `RAW_COLUMNS`.
+    """
+    columns: Dict[str, List[str]] = {column: [] for column in RAW_COLUMNS}
+    for train_no, records in raw_by_train.items():
+        for record in records:
+            columns["train_no"].append(train_no)
+            columns["station"].append(record.get("station", ""))
+            columns["sched_tm"].append(record.get("sched_tm", ""))
+            columns["est_tm"].append(record.get("est_tm", ""))
+            columns["act_tm"].append(record.get("act_tm", ""))
+    return columns
+
+
+def transform_columns(
+    conn: duckdb.DuckDBPyConnection,
+    columns: Mapping[str, Sequence[str]],
+) -> duckdb.DuckDBPyRelation:
+    """
+    Transform a whole service day of raw records held as column arrays.
+
+    Produces, for every train, the same rows as `transform` would for that train's
+    records, in the same order. The work runs inside DuckDB: the distinct time
+    strings are parsed once with vectorized regex functions (any the fast pattern
+    cannot resolve go through `parse_time`), and duplicates are removed with a
+    window over (train_no, station, sched, est, act). Values are stripped of the
+    same whitespace as `str.strip()` removes, so any text is accepted.
+
+    Staging tables are named uniquely per call, so a relation returned earlier on
+    the same connection keeps its rows. The table behind the result lives until
+    the connection closes or the caller drops it (its name is the relation's
+    `alias`).
+
+    On its own this is slower than `transform` (see `benchmarks/bench_transform.py`);
+    it pays off together with `src.loader.load_relation` on large batches, so the
+    ETL only uses it with `--columnar`.
+
+    Args:
+        conn (duckdb.DuckDBPyConnection): Connection that hosts the temporary
+            staging tables and the returned relation.
+        columns (Mapping[str, Sequence[str]]): Equal-length arrays for every name
+            in `RAW_COLUMNS`.
+
+    Returns:
+        duckdb.DuckDBPyRelation: Rows of (train_no, station, sched_time, est_time,
+            act_time, ord) ordered by `ord`, the row's position in the input
+            arrays; ready for `src.loader.load_relation`.
+
+    Raises:
+        ValueError: If a column is missing or the arrays differ in length.
+    """
+    missing = [column for column in RAW_COLUMNS if column not in columns]
+    if missing:
+        raise ValueError(f"Missing raw columns: {missing}")
+    lengths = {len(columns[column]) for column in RAW_COLUMNS}
+    if len(lengths) > 1:
+        raise ValueError("Raw column arrays must all have the same length")
+
+    payload = encode_columns({column: columns[column] for column in RAW_COLUMNS})
+
+    suffix = uuid.uuid4().hex[:12]
+    names = {"raw": f"raw_stage_{suffix}", "lookup": f"time_lookup_{suffix}", "clean": f"clean_stage_{suffix}"}
+    try:
+        conn.execute(_STAGE_RAW_SQL.format(source=_RAW_SOURCE, **names), {"payload": payload, "strip": _STRIP_CHARS})
+        conn.execute(_BUILD_LOOKUP_SQL.format(**names), {"pattern": _SQL_TIME_PATTERN, "strip": _STRIP_CHARS})
+
+        # Resolve the rare shapes the SQL pattern does not cover with parse_time
+        unresolved = conn.execute(
+            f"SELECT raw, value FROM {names['lookup']} WHERE parsed IS NULL AND lower(value) NOT IN ('', 'na')"
+        ).fetchall()
+        fallback = {raw: parse_time(value) for raw, value in unresolved}
+        resolved = {raw: parsed.isoformat() for raw, parsed in fallback.items() if parsed is not None}
+        if resolved:
+            conn.execute(
+                f"""
+                UPDATE {names['lookup']} SET parsed = f.parsed
+                FROM {columns_source({"raw": "VARCHAR", "parsed": "TIME"}, param="$fallback")} f
+                WHERE {names['lookup']}.raw = f.raw
+                """,
+                {"fallback": encode_columns({"raw": list(resolved), "parsed": list(resolved.values())})},
+            )
+
+        conn.execute(_CLEAN_SQL.format(**names))
+    finally:
+        conn.execute(f"DROP TABLE IF EXISTS {names['raw']}")
+        conn.execute(f"DROP TABLE IF EXISTS {names['lookup']}")
+    return conn.table(names["clean"]).order("ord").set_alias(names["clean"])
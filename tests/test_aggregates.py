@@ -0,0 +1,120 @@
+from datetime import date, time
+from pathlib import Path
+from typing import List
+
+import pytest
+
+import src.db as db_module
+from src.aggregates import get_unaggregated_dates, refresh_daily_aggregates
+from src.archive import archive_before
+from src.loader import load_batch
+from src.transformer import CleanRecord
+
+
+def setup_database(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Point the DB module at a fresh temporary database with the schema applied."""
+    monkeypatch.setattr(db_module, "DB_FILE", tmp_path / "aggregates.duckdb")
+    db_module.init_db()
+
+
+def stops(*delays_min: int) -> List[CleanRecord]:
+    """Return one 08:xx stop per delay in minutes; a negative delay means no actual time."""
+    return [
+        CleanRecord(
+            station=f"S{n}",
+            sched_time=time(8, n),
+            est_time=time(8, n),
+            act_time=None if delay < 0 else time(8 + (n + delay) // 60, (n + delay) % 60),
+        )
+        for n, delay in enumerate(delays_min)
+    ]
+
+
+def test_refresh_daily_aggregates_rebuilds_only_given_dates(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    refresh_daily_aggregates should summarize stops per train, station and hour,
+    and replace the aggregates of refreshed dates without touching others.
+    """
+    setup_database(tmp_path, monkeypatch)
+    conn = db_module.get_connection()
+    day1, day2 = date(2025, 6, 27), date(2025, 6, 28)
+    load_batch(day1, {"100": stops(0, 2, 10, -1), "200": stops(1)}, conn=conn)
+    load_batch(day2, {"100": stops(3)}, conn=conn)
+
+    assert get_unaggregated_dates(conn) == [day1, day2]
+    assert refresh_daily_aggregates(conn, [day1, day2, day1]) == 2
+    assert get_unaggregated_dates(conn) == []
+
+    train = conn.execute(
+        "SELECT * FROM daily_train_delays WHERE date_scraped = ? AND train_no = '100'", [day1]
+    ).fetchone()
+    # 4 stops, 3 observed, 2 within 5 minutes, delays 0 + 120 + 600 seconds
+    assert train == (day1, "100", 4, 3, 2, 720, 600)
+    station = conn.execute(
+        "SELECT stops, observed_stops, sum_delay_sec FROM daily_station_delays "
+        "WHERE date_scraped = ? AND station = 'S0'", [day1]
+    ).fetchone()
+    assert station == (2, 2, 60)
+    assert conn.execute(
+        "SELECT DISTINCT hour FROM daily_hourly_delays"
+    ).fetchall() == [(8,)]
+
+    # A reload of day2 only rebuilds day2
+    load_batch(day2, {"300": stops(20)}, conn=conn)
+    refresh_daily_aggregates(conn, [day2])
+    counts = conn.execute(
+        "SELECT date_scraped, count(*) FROM daily_train_delays GROUP BY 1 ORDER BY 1"
+    ).fetchall()
+    conn.close()
+    assert counts == [(day1, 2), (day2, 2)]
+
+
+def test_refresh_daily_aggregates_reads_archived_dates(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Aggregates should cover dates already moved to the Parquet archive, counting a
+    stop present in both tiers once.
+    """
+    setup_database(tmp_path, monkeypatch)
+    conn = db_module.get_connection()
+    day = date(2025, 6, 1)
+    load_batch(day, {"100": stops(1, 2)}, conn=conn)
+    archive_before(conn, date(2025, 6, 2))
+    load_batch(day, {"100": stops(1, 2)}, conn=conn)
+
+    refresh_daily_aggregates(conn, [day])
+    row = conn.execute(
+        "SELECT stops, sum_delay_sec FROM daily_train_delays WHERE date_scraped = ?", [day]
+    ).fetchone()
+    conn.close()
+
+    assert row == (2, 180)
+
+
+def test_refresh_daily_aggregates_prefers_hot_rows_over_archived(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    A stop corrected in the hot table after its date was archived should be
+    aggregated from the hot copy, never the stale archived one.
+    """
+    setup_database(tmp_path, monkeypatch)
+    conn = db_module.get_connection()
+    day = date(2025, 6, 1)
+    load_batch(day, {"100": stops(1, 2)}, conn=conn)
+    archive_before(conn, date(2025, 6, 2))
+    load_batch(day, {"100": stops(5, 6)}, conn=conn)
+
+    refresh_daily_aggregates(conn, [day])
+    row = conn.execute(
+        "SELECT stops, sum_delay_sec FROM daily_train_delays WHERE date_scraped = ?", [day]
+    ).fetchone()
+    conn.close()
+
+    assert row == (2, 660)
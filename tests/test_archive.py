@@ -0,0 +1,171 @@
+import os
+from datetime import date, time
+from pathlib import Path
+from typing import List
+
+import pytest
+
+import src.db as db_module
+from src.archive import archive_before, compact_archive
+from src.loader import load_batch
+from src.transformer import CleanRecord
+
+
+def setup_database(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Point the DB module at a fresh temporary database with the schema applied."""
+    monkeypatch.setattr(db_module, "DB_FILE", tmp_path / "archive.duckdb")
+    db_module.init_db()
+
+
+def make_records(stations: List[str]) -> List[CleanRecord]:
+    """Return one cleaned record per station."""
+    return [
+        CleanRecord(station=station, sched_time=time(8, n), est_time=time(8, n), act_time=None)
+        for n, station in enumerate(stations)
+    ]
+
+
+def count(conn, table: str) -> int:
+    """Return the number of rows in a table or view."""
+    return conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+
+
+def test_archive_before_moves_closed_dates_to_partitioned_parquet(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    archive_before should move older dates into year/month partitions, delete them
+    from the hot table, and keep them visible through schedules_all.
+    """
+    setup_database(tmp_path, monkeypatch)
+    conn = db_module.get_connection()
+    for day in (date(2025, 5, 31), date(2025, 6, 1), date(2025, 6, 2)):
+        load_batch(day, {"100": make_records(["A", "B"])}, conn=conn)
+
+    archived = archive_before(conn, date(2025, 6, 2))
+
+    assert archived == {date(2025, 5, 31): 2, date(2025, 6, 1): 2}
+    root = db_module.get_archive_dir()
+    assert len(list((root / "year=2025" / "month=05").glob("*.parquet"))) == 1
+    assert len(list((root / "year=2025" / "month=06").glob("*.parquet"))) == 1
+    assert count(conn, "schedules") == 2
+    assert count(conn, "schedules_all") == 6
+    assert conn.execute(
+        "SELECT DISTINCT date_scraped FROM schedules_all ORDER BY 1"
+    ).fetchall() == [(date(2025, 5, 31),), (date(2025, 6, 1),), (date(2025, 6, 2),)]
+    conn.close()
+
+
+def test_schedules_all_reads_reloaded_trains_once(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    A train reloaded into the hot table after its date was archived should be
+    read from the hot table only, while the date's other archived trains stay
+    visible.
+    """
+    setup_database(tmp_path, monkeypatch)
+    conn = db_module.get_connection()
+    day = date(2025, 6, 1)
+    load_batch(day, {"100": make_records(["A", "B"]), "200": make_records(["C"])}, conn=conn)
+    archive_before(conn, date(2025, 6, 2))
+    assert count(conn, "schedules_all") == 3
+
+    load_batch(day, {"100": make_records(["A", "B", "D"])}, conn=conn)
+
+    assert count(conn, "schedules") == 3
+    assert conn.execute(
+        "SELECT train_no, count(*) FROM schedules_all GROUP BY ALL ORDER BY ALL"
+    ).fetchall() == [("100", 3), ("200", 1)]
+    conn.close()
+
+
+def test_archive_skips_rows_already_archived_and_compaction_merges_files(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Reloading an archived date should only archive the new rows, and compaction
+    should merge the month's files without changing the data.
+    """
+    setup_database(tmp_path, monkeypatch)
+    conn = db_module.get_connection()
+    day = date(2025, 6, 1)
+    load_batch(day, {"100": make_records(["A", "B"])}, conn=conn)
+    archive_before(conn, date(2025, 6, 2))
+
+    # A rerun of the ETL puts the date back in the hot table with one extra station
+    load_batch(day, {"100": make_records(["A", "B", "C"])}, conn=conn)
+    load_batch(date(2025, 6, 3), {"200": make_records(["D"])}, conn=conn)
+    assert archive_before(conn, date(2025, 6, 10)) == {day: 1, date(2025, 6, 3): 1}
+
+    partition = db_module.get_archive_dir() / "year=2025" / "month=06"
+    assert len(list(partition.glob("*.parquet"))) == 3
+    before = conn.execute("SELECT * FROM schedules_all ORDER BY ALL").fetchall()
+
+    assert compact_archive(conn) == {"year=2025/month=06": 3}
+    assert [p.name.startswith("compacted_") for p in partition.glob("*.parquet")] == [True]
+    assert conn.execute("SELECT * FROM schedules_all ORDER BY ALL").fetchall() == before
+    assert len(before) == 4
+    # Nothing left to merge
+    assert compact_archive(conn) == {}
+    conn.close()
+
+
+def test_archive_rewrites_partition_when_archived_rows_changed(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Archiving a date whose archived rows were corrected in the hot table should
+    replace them in the archive rather than keep the stale copies.
+    """
+    setup_database(tmp_path, monkeypatch)
+    conn = db_module.get_connection()
+    day = date(2025, 6, 1)
+    load_batch(day, {"100": make_records(["A", "B"])}, conn=conn)
+    load_batch(date(2025, 6, 2), {"200": make_records(["C"])}, conn=conn)
+    archive_before(conn, date(2025, 6, 3))
+
+    # A replay puts corrected rows of the archived date back in the hot table
+    corrected = [CleanRecord(station="A", sched_time=time(9, 0), est_time=time(9, 5), act_time=None)]
+    load_batch(day, {"100": corrected}, conn=conn, replace=True)
+
+    assert archive_before(conn, date(2025, 6, 3)) == {day: 1}
+    partition = db_module.get_archive_dir() / "year=2025" / "month=06"
+    assert len(list(partition.glob("*.parquet"))) == 1
+    assert count(conn, "schedules") == 0
+    assert conn.execute(
+        "SELECT train_no, station, est_time FROM schedules_all ORDER BY ALL"
+    ).fetchall() == [("100", "A", time(9, 5)), ("100", "B", time(8, 1)), ("200", "C", time(8, 0))]
+    conn.close()
+
+
+def test_compaction_keeps_the_newest_copy_of_duplicated_rows(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    When an interrupted rewrite leaves two copies of a row in a partition,
+    compaction should keep the one from the most recently written file.
+    """
+    setup_database(tmp_path, monkeypatch)
+    conn = db_module.get_connection()
+    partition = db_module.get_archive_dir() / "year=2025" / "month=06"
+    partition.mkdir(parents=True)
+    day = date(2025, 6, 1)
+    # The stale file sorts and is read first, so only its age can rule it out
+    for name, minute, mtime in (("a_stale.parquet", 1, 1_000_000), ("b_fresh.parquet", 9, 2_000_000)):
+        load_batch(day, {"100": [CleanRecord(
+            station="A", sched_time=time(8, 0), est_time=time(8, minute), act_time=None
+        )]}, conn=conn, replace=True)
+        path = (partition / name).as_posix()
+        conn.execute(f"COPY (SELECT * FROM schedules) TO '{path}' (FORMAT PARQUET)")
+        os.utime(path, (mtime, mtime))
+    conn.execute("DELETE FROM schedules")
+
+    assert compact_archive(conn) == {"year=2025/month=06": 2}
+    assert conn.execute("SELECT est_time FROM schedules_all").fetchall() == [(time(8, 9),)]
+    conn.close()
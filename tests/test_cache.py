@@ -0,0 +1,50 @@
+import pytest
+
+import src.cache as cache_module
+from src.cache import ResultCache
+
+
+def test_result_cache_evicts_least_recently_used() -> None:
+    """
+    A full ResultCache should evict the entry used least recently.
+    """
+    cache = ResultCache(maxsize=2)
+    cache.put("a", 1, "A")
+    cache.put("b", 1, "B")
+    assert cache.get("a", 1) == (True, "A")
+
+    cache.put("c", 1, "C")
+
+    assert cache.get("b", 1) == (False, None)
+    assert cache.get("a", 1) == (True, "A")
+    assert cache.get("c", 1) == (True, "C")
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_result_cache_drops_entries_of_other_versions_and_expired(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    An entry should only be served for the data version it was computed at and
+    within its TTL.
+    """
+    now = [100.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = ResultCache(maxsize=4, ttl=60)
+
+    cache.put("q", 1, "old")
+    assert cache.get("q", 2) == (False, None)
+    # The stale entry is gone, even for its own version
+    assert cache.get("q", 1) == (False, None)
+
+    cache.put("q", 2, "new")
+    now[0] += 61
+    assert cache.get("q", 2) == (False, None)
+    assert len(cache) == 0
+
+
+def test_result_cache_rejects_non_positive_size() -> None:
+    """
+    ResultCache should require room for at least one entry.
+    """
+    with pytest.raises(ValueError):
+        ResultCache(maxsize=0)
@@ -0,0 +1,227 @@
+import random
+import subprocess
+import sys
+import threading
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, List, Set
+
+import pytest
+
+import scripts.collect_train_numbers as collect
+import src.db as db_module
+
+
+def setup_database(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Point the DB module at a fresh temporary database with the schema applied."""
+    monkeypatch.setattr(db_module, "DB_FILE", tmp_path / "collect.duckdb")
+    db_module.init_db()
+
+
+def stored_trains(service_date: date) -> Set[str]:
+    """Return the train numbers stored for a service date."""
+    return set(db_module.get_stored_train_numbers(service_date))
+
+
+def test_get_service_date_rolls_over_at_cutoff() -> None:
+    """
+    get_service_date should map times before 01:30 to the previous day.
+    """
+    assert collect.get_service_date(datetime(2025, 6, 28, 1, 29)) == date(2025, 6, 27)
+    assert collect.get_service_date(datetime(2025, 6, 28, 1, 30)) == date(2025, 6, 28)
+
+
+def test_in_quiet_hours() -> None:
+    """
+    in_quiet_hours should only be true inside the configured nightly window.
+    """
+    assert collect.in_quiet_hours(datetime(2025, 6, 28, 2, 0))
+    assert not collect.in_quiet_hours(datetime(2025, 6, 28, 1, 29))
+    assert not collect.in_quiet_hours(datetime(2025, 6, 28, 4, 0))
+
+
+def test_next_delay_stays_within_jitter() -> None:
+    """
+    next_delay should spread intervals by at most the configured fraction.
+    """
+    rng = random.Random(1)
+    delays = [collect.next_delay(60, 0.1, rng) for _ in range(200)]
+
+    assert all(54 <= d <= 66 for d in delays)
+    assert len(set(delays)) > 1
+
+
+def test_collector_writes_only_new_trains_and_rolls_over(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Collector.poll should seed from stored trains, write only unseen ones, and
+    start a fresh set when the service date changes.
+    """
+    setup_database(tmp_path, monkeypatch)
+    conn = db_module.get_connection()
+    conn.execute(
+        "INSERT INTO train_numbers (date_scraped, train_no) VALUES (?, ?)", [date(2025, 6, 27), "100"]
+    )
+    visible: List[Set[str]] = [{"100", "200"}, {"100", "200", "300"}, {"100"}]
+    monkeypatch.setattr(collect, "get_train_numbers", lambda: visible.pop(0))
+
+    collector = collect.Collector(conn)
+    assert collector.poll(datetime(2025, 6, 27, 9, 0)) == 1
+    assert collector.poll(datetime(2025, 6, 27, 9, 5)) == 1
+    # 02:00 on the 28th belongs to the 28th: "100" is new again
+    assert collector.poll(datetime(2025, 6, 28, 2, 0)) == 1
+    conn.close()
+
+    assert stored_trains(date(2025, 6, 27)) == {"100", "200", "300"}
+    assert stored_trains(date(2025, 6, 28)) == {"100"}
+
+
+def test_collector_records_first_seen_once(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Collector.poll should stamp each train with the poll at which it first
+    appeared and never rewrite it on later polls.
+    """
+    setup_database(tmp_path, monkeypatch)
+    monkeypatch.setattr(collect, "get_train_numbers", lambda: {"100"})
+    conn = db_module.get_connection()
+
+    collect.Collector(conn).poll(datetime(2025, 6, 27, 9, 0))
+    # A fresh process seeds its set from the store and writes nothing
+    assert collect.Collector(conn).poll(datetime(2025, 6, 27, 9, 5)) == 0
+    first_seen = conn.execute("SELECT first_seen FROM train_numbers").fetchall()
+    conn.close()
+
+    assert first_seen == [(datetime(2025, 6, 27, 9, 0),)]
+
+
+def test_main_inserts_only_new_trains(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch,
+        capsys: pytest.CaptureFixture
+) -> None:
+    """
+    The one-shot main() should insert only trains not yet stored for the day.
+    """
+    setup_database(tmp_path, monkeypatch)
+    monkeypatch.setattr(collect, "get_train_numbers", lambda: {"100", "200"})
+    monkeypatch.setattr(collect.sys, "argv", ["collect_train_numbers.py"])
+
+    collect.main()
+    collect.main()
+
+    output = capsys.readouterr().out.splitlines()
+    assert output[0].startswith("Stored 2 new train numbers")
+    assert output[1].startswith("Stored 0 new train numbers")
+
+
+def test_run_daemon_survives_failed_poll_and_stops(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    run_daemon should keep polling after an error and exit once stopped.
+    """
+    setup_database(tmp_path, monkeypatch)
+    stop = threading.Event()
+    calls: List[int] = []
+
+    def fake_fetch_trainview() -> List[Dict[str, Any]]:
+        calls.append(1)
+        if len(calls) == 1:
+            raise ValueError("Unexpected JSON format")
+        stop.set()
+        return [{"trainno": "500"}]
+
+    monkeypatch.setattr(collect, "fetch_trainview", fake_fetch_trainview)
+    monkeypatch.setattr(collect, "in_quiet_hours", lambda now: False)
+
+    collect.run_daemon(interval=0, jitter=0, stop=stop)
+
+    assert len(calls) == 2
+    assert "500" in stored_trains(collect.get_service_date(datetime.now()))
+
+
+def test_run_daemon_captures_positions_and_flushes_on_stop(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    With capture_positions, each poll should also append train positions, and
+    buffered positions should be written when the daemon stops.
+    """
+    setup_database(tmp_path, monkeypatch)
+    stop = threading.Event()
+    polls: List[int] = []
+
+    def fake_fetch_trainview() -> List[Dict[str, Any]]:
+        polls.append(1)
+        if len(polls) == 3:
+            stop.set()
+        return [
+            {"trainno": "500", "line": "Paoli/Thorndale", "dest": "Thorndale",
+             "nextstop": "Ardmore", "lat": "40.0", "lon": "-75.2", "late": len(polls)},
+        ]
+
+    monkeypatch.setattr(collect, "fetch_trainview", fake_fetch_trainview)
+    monkeypatch.setattr(collect, "in_quiet_hours", lambda now: False)
+
+    collect.run_daemon(interval=0, jitter=0, stop=stop, capture_positions=True)
+
+    conn = db_module.get_connection()
+    rows = conn.execute(
+        "SELECT train_no, next_stop, late_min FROM train_positions_decoded ORDER BY late_min"
+    ).fetchall()
+    conn.close()
+    assert rows == [("500", "Ardmore", 1), ("500", "Ardmore", 2), ("500", "Ardmore", 3)]
+
+
+def test_run_daemon_releases_database_between_polls(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    While the daemon waits for its next poll, another process should be able to
+    open the database for writing.
+    """
+    setup_database(tmp_path, monkeypatch)
+    stop = threading.Event()
+    waiting = threading.Event()
+
+    def fake_next_delay(interval: float, jitter: float, rng: random.Random) -> float:
+        waiting.set()
+        return 60
+
+    monkeypatch.setattr(collect, "fetch_trainview", lambda: [{"trainno": "500", "late": 0}])
+    monkeypatch.setattr(collect, "in_quiet_hours", lambda now: False)
+    monkeypatch.setattr(collect, "next_delay", fake_next_delay)
+
+    daemon = threading.Thread(
+        target=collect.run_daemon,
+        kwargs={"interval": 60, "jitter": 0, "stop": stop, "capture_positions": True},
+    )
+    daemon.start()
+    try:
+        assert waiting.wait(timeout=30)
+        other = subprocess.run(
+            [
+                sys.executable, "-c",
+                "import duckdb, sys; "
+                "conn = duckdb.connect(sys.argv[1]); "
+                "print(conn.execute('SELECT count(*) FROM train_numbers').fetchone()[0])",
+                str(db_module.DB_FILE),
+            ],
+            capture_output=True,
+            text=True,
+            timeout=60,
+        )
+    finally:
+        stop.set()
+        daemon.join(timeout=30)
+
+    assert other.returncode == 0, other.stderr
+    assert other.stdout.strip() == "1"
@@ -1,3 +1,4 @@
+from datetime import date, time
 from pathlib import Path
 
 import duckdb
@@ -89,3 +90,177 @@ def test_init_db_creates_table(
 
     table_names = [row[0] for row in tables]
     assert "schedules" in table_names
+
+
+def test_init_db_adds_first_seen_to_existing_train_numbers(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    init_db() should add the first_seen column to a train_numbers table created
+    before the column existed, keeping its rows.
+    """
+    tmp_db: Path = tmp_path / "old.duckdb"
+    conn = duckdb.connect(database=str(tmp_db))
+    conn.execute(
+        "CREATE TABLE train_numbers (date_scraped DATE, train_no VARCHAR, "
+        "PRIMARY KEY (date_scraped, train_no))"
+    )
+    conn.execute("INSERT INTO train_numbers VALUES ('2025-06-27', '100')")
+    conn.close()
+    monkeypatch.setattr(db, "DB_FILE", tmp_db)
+
+    db.init_db()
+
+    conn = duckdb.connect(database=str(tmp_db), read_only=True)
+    rows = conn.execute("SELECT train_no, first_seen FROM train_numbers").fetchall()
+    conn.close()
+    assert rows == [("100", None)]
+
+
+def test_init_db_migrates_legacy_schedules_once(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    init_db() should convert a legacy VARCHAR act_time to TIME, backfill the delay
+    columns, and record the migration so it is not applied again.
+    """
+    tmp_db: Path = tmp_path / "legacy.duckdb"
+    conn = duckdb.connect(database=str(tmp_db))
+    conn.execute(
+        "CREATE TABLE schedules (date_scraped DATE, train_no VARCHAR, station VARCHAR, "
+        "sched_time TIME, est_time TIME, act_time VARCHAR, "
+        "PRIMARY KEY (date_scraped, train_no, station))"
+    )
+    conn.execute(
+        "INSERT INTO schedules VALUES "
+        "('2025-06-27', '1', 'A', '23:55', '00:05', '00:01:00'), "
+        "('2025-06-27', '1', 'B', '08:00', '08:00', 'na')"
+    )
+    conn.close()
+    monkeypatch.setattr(db, "DB_FILE", tmp_db)
+
+    db.init_db()
+    db.init_db()
+
+    conn = duckdb.connect(database=str(tmp_db), read_only=True)
+    rows = conn.execute(
+        "SELECT station, act_time, est_delay_sec, act_delay_sec FROM schedules ORDER BY station"
+    ).fetchall()
+    act_type = conn.execute(
+        "SELECT data_type FROM information_schema.columns "
+        "WHERE table_name = 'schedules' AND column_name = 'act_time'"
+    ).fetchone()[0]
+    versions = conn.execute("SELECT version FROM schema_version ORDER BY version").fetchall()
+    conn.close()
+
+    assert act_type == "TIME"
+    assert rows == [("A", time(0, 1), 600, 360), ("B", None, 0, None)]
+    # Baseline DDL (0) for the unversioned database, then every migration once
+    assert versions == [(0,)] + [(version,) for version, _ in db.list_migrations()]
+
+
+def test_init_db_applies_only_pending_migrations(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    init_db() should apply the baseline and migrations once, skip the DDL entirely
+    when the schema is current, and apply only migrations added later.
+    """
+    schema_dir: Path = tmp_path / "sql"
+    (schema_dir / "migrations").mkdir(parents=True)
+    (schema_dir / "create_items.sql").write_text("CREATE TABLE IF NOT EXISTS items (id INTEGER);")
+    (schema_dir / "migrations" / "001_add_name.sql").write_text("ALTER TABLE items ADD COLUMN name VARCHAR;")
+    monkeypatch.setattr(db, "SCHEMA_DIR", schema_dir)
+    monkeypatch.setattr(db, "DB_FILE", tmp_path / "versions.duckdb")
+    monkeypatch.setattr(db, "_CURRENT_SCHEMAS", set())
+
+    assert db.init_db() == [0, 1]
+    # Not re-executed: rerunning 001 would fail because the column exists
+    assert db.init_db() == []
+    db._CURRENT_SCHEMAS.clear()
+    assert db.init_db() == []
+
+    (schema_dir / "migrations" / "002_add_index.sql").write_text("CREATE INDEX items_name ON items (name);")
+    db._CURRENT_SCHEMAS.clear()
+    conn = db.get_connection()
+    assert db.init_db(conn) == [2]
+    assert db.get_schema_version(conn) == 2
+    conn.close()
+
+
+def test_init_db_rolls_back_failed_migration(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    A failing migration should leave the schema version unchanged so the next
+    init_db() retries it.
+    """
+    schema_dir: Path = tmp_path / "sql"
+    (schema_dir / "migrations").mkdir(parents=True)
+    (schema_dir / "create_items.sql").write_text("CREATE TABLE IF NOT EXISTS items (id INTEGER);")
+    (schema_dir / "migrations" / "001_broken.sql").write_text(
+        "ALTER TABLE items ADD COLUMN name VARCHAR; SELECT * FROM missing_table;"
+    )
+    monkeypatch.setattr(db, "SCHEMA_DIR", schema_dir)
+    monkeypatch.setattr(db, "DB_FILE", tmp_path / "broken.duckdb")
+    monkeypatch.setattr(db, "_CURRENT_SCHEMAS", set())
+
+    with pytest.raises(duckdb.CatalogException):
+        db.init_db()
+
+    conn = db.get_connection()
+    columns = [row[0] for row in conn.execute("DESCRIBE items").fetchall()]
+    assert db.get_schema_version(conn) == 0
+    conn.close()
+    assert columns == ["id"]
+
+
+def test_get_incomplete_train_numbers_lists_trains_missing_actuals(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    get_incomplete_train_numbers should return trains of the date with any stop
+    lacking an actual time, plus collected trains with nothing stored.
+    """
+    monkeypatch.setattr(db, "DB_FILE", tmp_path / "incomplete.duckdb")
+    db.init_db()
+    conn = db.get_connection()
+    conn.execute(
+        "INSERT INTO train_numbers (date_scraped, train_no) VALUES "
+        "('2025-06-27', 'done'), ('2025-06-27', 'running'), ('2025-06-27', 'new'), ('2025-06-28', 'other')"
+    )
+    conn.execute(
+        "INSERT INTO schedules (date_scraped, train_no, station, sched_time, est_time, act_time) VALUES "
+        "('2025-06-27', 'done', 'A', '08:00', '08:00', '08:01'), "
+        "('2025-06-27', 'running', 'A', '09:00', '09:00', '09:02'), "
+        "('2025-06-27', 'running', 'B', '09:10', '09:12', NULL), "
+        "('2025-06-28', 'other', 'A', '09:10', '09:12', NULL)"
+    )
+
+    incomplete = db.get_incomplete_train_numbers(date(2025, 6, 27), conn=conn)
+    conn.close()
+
+    assert incomplete == ["new", "running"]
+
+
+def test_columns_source_unnests_staged_columns_as_typed_rows() -> None:
+    """
+    columns_source should turn an encoded column document into typed rows in
+    document order, keeping NULLs and quotes and numbering rows when asked.
+    """
+    conn = duckdb.connect()
+    source = db.columns_source({"name": "VARCHAR", "at": "TIME"}, param="$rows", ordinal="ord")
+    document = db.encode_columns({"name": ["O'Hare", None], "at": ["08:00:00", None]})
+
+    result = conn.execute(f"SELECT * FROM {source}", {"rows": document})
+    types = [column[1] for column in result.description]
+    rows = result.fetchall()
+    conn.close()
+
+    assert rows == [("O'Hare", time(8, 0), 0), (None, None, 1)]
+    assert types[:2] == ["VARCHAR", "TIME"]
@@ -2,6 +2,7 @@ from typing import Any, Dict, List, Set
 import pytest
 import requests
 import src.extractors as extractors
+from src import http_client
 
 
 class DummyResponse:
@@ -32,7 +33,7 @@ def test_get_train_numbers_success(monkeypatch: pytest.MonkeyPatch) -> None:
         {"trainno": "100"},  # duplicate
     ]
     monkeypatch.setattr(
-        requests, "get", lambda url: DummyResponse(sample, status_code=200)
+        http_client.get_session(), "get", lambda url: DummyResponse(sample, status_code=200)
     )
 
     result: Set[str] = extractors.get_train_numbers()
@@ -44,7 +45,7 @@ def test_get_train_numbers_http_error(monkeypatch: pytest.MonkeyPatch) -> None:
     get_train_numbers() should propagate HTTPError when the API returns a 5xx status.
     """
     monkeypatch.setattr(
-        requests, "get", lambda url: DummyResponse(None, status_code=500)
+        http_client.get_session(), "get", lambda url: DummyResponse(None, status_code=500)
     )
 
     with pytest.raises(requests.HTTPError):
@@ -57,8 +58,30 @@ def test_get_train_numbers_invalid_format(monkeypatch: pytest.MonkeyPatch) -> No
     """
     # Return a dict instead of a list
     monkeypatch.setattr(
-        requests, "get", lambda url: DummyResponse({"foo": "bar"}, status_code=200)
+        http_client.get_session(), "get", lambda url: DummyResponse({"foo": "bar"}, status_code=200)
     )
 
     with pytest.raises(ValueError):
         extractors.get_train_numbers()
+
+
+def test_extract_positions_parses_live_fields() -> None:
+    """
+    extract_positions() should keep position, lateness and next stop per train,
+    tolerating missing or non-numeric values.
+    """
+    sample: List[Dict[str, Any]] = [
+        {"trainno": "1.23", "line": "Paoli/Thorndale", "dest": "Thorndale",
+         "nextstop": "Ardmore", "lat": "40.0081", "lon": "-75.2903", "late": 4},
+        {"trainno": "456", "line": "Trenton", "dest": None, "lat": "", "late": "n/a"},
+        {"line": "no train number"},
+    ]
+
+    positions = extractors.extract_positions(sample)
+
+    assert positions == [
+        {"train_no": "123", "line": "Paoli/Thorndale", "dest": "Thorndale",
+         "next_stop": "Ardmore", "lat": 40.0081, "lon": -75.2903, "late": 4},
+        {"train_no": "456", "line": "Trenton", "dest": "", "next_stop": "",
+         "lat": None, "lon": None, "late": None},
+    ]
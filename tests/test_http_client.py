@@ -0,0 +1,74 @@
+from typing import Iterator
+
+import pytest
+import requests
+
+import config
+import src.http_client as http_client
+
+
+@pytest.fixture(autouse=True)
+def fresh_session() -> Iterator[None]:
+    """Start and finish every test without a cached shared session."""
+    http_client.close_session()
+    yield
+    http_client.close_session()
+
+
+def test_get_session_returns_shared_instance() -> None:
+    """
+    get_session() should build one session and hand the same instance to every caller.
+    """
+    first = http_client.get_session()
+    second = http_client.get_session()
+
+    assert isinstance(first, requests.Session)
+    assert first is second
+
+
+def test_session_negotiates_gzip_and_keep_alive() -> None:
+    """
+    The shared session should advertise gzip and keep connections alive.
+    """
+    session = http_client.get_session()
+
+    assert "gzip" in session.headers["Accept-Encoding"]
+    assert session.headers["Connection"] == "keep-alive"
+    assert session.headers["User-Agent"] == config.HTTP_USER_AGENT
+
+
+def test_configure_session_sets_pool_size_and_replaces_old(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    configure_session() should close the previous session and size the new pool.
+    """
+    old = http_client.get_session()
+    closed = []
+    monkeypatch.setattr(old, "close", lambda: closed.append(True))
+
+    new = http_client.configure_session(pool_size=25)
+
+    assert closed == [True]
+    assert new is not old
+    assert http_client.get_session() is new
+    adapter = new.get_adapter(config.RRSCHEDULES_URL)
+    assert adapter._pool_maxsize == 25
+
+
+def test_session_applies_default_timeouts(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Requests sent without a timeout should get the configured (connect, read) timeout.
+    """
+    sent = {}
+
+    def fake_send(self, request, **kwargs):
+        sent.update(kwargs)
+        return requests.Response()
+
+    monkeypatch.setattr(requests.adapters.HTTPAdapter, "send", fake_send)
+    session = http_client.get_session()
+
+    session.get(config.RRSCHEDULES_URL)
+    assert sent["timeout"] == (config.HTTP_CONNECT_TIMEOUT_SEC, config.HTTP_READ_TIMEOUT_SEC)
+
+    session.get(config.RRSCHEDULES_URL, timeout=3)
+    assert sent["timeout"] == 3
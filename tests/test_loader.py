@@ -6,8 +6,8 @@ import duckdb
 import pytest
 
 import src.db as db_module
-from src.loader import load_records
-from src.transformer import CleanRecord
+from src.loader import load_batch, load_records, load_relation
+from src.transformer import CleanRecord, compact, to_columns, transform, transform_columns
 
 
 def setup_database(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
@@ -136,3 +136,240 @@ def test_load_records_multiple_trains_and_dates(tmp_path: Path, monkeypatch: pyt
     entries = {(r[0], r[1], r[2]) for r in rows}
     assert (date(2025, 6, 27), "100", "A1") in entries
     assert (date(2025, 6, 28), "200", "B1") in entries
+
+
+def test_load_batch_writes_many_trains_in_one_call(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    load_batch should insert every train's records and report the inserted count.
+    """
+    db_path = setup_database(tmp_path, monkeypatch)
+    batch = {
+        "100": [
+            CleanRecord(station="A", sched_time=time(6, 0), est_time=time(6, 5), act_time=time(6, 6)),
+            CleanRecord(station="B, \"North\"", sched_time=time(6, 10), est_time=time(6, 15), act_time=None),
+        ],
+        "200": [
+            CleanRecord(station="A", sched_time=time(7, 0), est_time=time(7, 5), act_time=None),
+        ],
+        "300": [],
+    }
+
+    inserted = load_batch(date(2025, 6, 27), batch)
+    rows = fetch_all_records(db_path)
+
+    assert inserted == 3
+    assert {(r[1], r[2]) for r in rows} == {("100", "A"), ("100", "B, \"North\""), ("200", "A")}
+    by_key = {(r[1], r[2]): r for r in rows}
+    assert by_key[("100", "A")][3] == time(6, 0)
+    assert by_key[("100", "B, \"North\"")][5] is None
+
+
+def test_load_batch_skips_existing_and_keeps_first_duplicate(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    load_batch should skip rows already stored and keep the first of any
+    duplicate (train_no, station) within the batch, like row-at-a-time inserts.
+    """
+    db_path = setup_database(tmp_path, monkeypatch)
+    first = CleanRecord(station="S", sched_time=time(8, 0), est_time=time(8, 1), act_time=None)
+    later = CleanRecord(station="S", sched_time=time(9, 0), est_time=time(9, 1), act_time=None)
+
+    assert load_batch(date(2025, 6, 27), {"1": [first, later]}) == 1
+    assert load_batch(date(2025, 6, 27), {"1": [later], "2": [later]}) == 1
+
+    rows = fetch_all_records(db_path)
+    by_train = {r[1]: r for r in rows}
+    assert by_train["1"][3] == time(8, 0)
+    assert by_train["2"][3] == time(9, 0)
+
+
+def test_load_batch_reuses_given_connection(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    load_batch should write through a caller-supplied connection and leave it open.
+    """
+    setup_database(tmp_path, monkeypatch)
+    conn = db_module.get_connection()
+    record = CleanRecord(station="Z", sched_time=time(5, 0), est_time=time(5, 0), act_time=None)
+
+    load_batch(date(2025, 6, 27), {"9": [record]}, conn=conn)
+    count = conn.execute("SELECT COUNT(*) FROM schedules").fetchone()[0]
+    conn.close()
+
+    assert count == 1
+
+
+def test_load_relation_matches_load_batch(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    load_relation should store the columnar transform output exactly as
+    load_batch stores the per-train transform output.
+    """
+    setup_database(tmp_path, monkeypatch)
+    raw_by_train = {
+        "1": [
+            {"station": "A", "sched_tm": "8:00 am", "est_tm": "8:02 am", "act_tm": "8:03 am"},
+            {"station": "A", "sched_tm": "9:00 am", "est_tm": "9:02 am", "act_tm": "na"},
+        ],
+        "2": [{"station": "B", "sched_tm": "13:00", "est_tm": "13:05", "act_tm": "na"}],
+    }
+    conn = db_module.get_connection()
+
+    relation = transform_columns(conn, to_columns(raw_by_train))  # type: ignore
+    inserted = load_relation(date(2025, 6, 27), relation, conn)
+    columnar = conn.execute("SELECT * FROM schedules ORDER BY train_no, station").fetchall()
+
+    conn.execute("DELETE FROM schedules")
+    load_batch(
+        date(2025, 6, 27),
+        {tn: transform(raw) for tn, raw in raw_by_train.items()},  # type: ignore
+        conn=conn,
+    )
+    per_train = conn.execute("SELECT * FROM schedules ORDER BY train_no, station").fetchall()
+    conn.close()
+
+    assert inserted == 2
+    assert columnar == per_train
+
+
+def test_load_batch_accepts_compact_records(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    load_batch should store compact records exactly as the records they were built from.
+    """
+    setup_database(tmp_path, monkeypatch)
+    records_by_train = {
+        "1": transform([
+            {"station": "A", "sched_tm": "8:00 am", "est_tm": "8:02 am", "act_tm": "8:03 am"},
+            {"station": "B", "sched_tm": "9:00 am", "est_tm": "9:02 am", "act_tm": "na"},
+        ]),  # type: ignore
+        "2": [],
+    }
+    conn = db_module.get_connection()
+
+    inserted = load_batch(date(2025, 6, 27), records_by_train, conn=conn)
+    as_records = conn.execute("SELECT * FROM schedules ORDER BY train_no, station").fetchall()
+
+    conn.execute("DELETE FROM schedules")
+    compact_inserted = load_batch(
+        date(2025, 6, 27), {tn: compact(records) for tn, records in records_by_train.items()}, conn=conn
+    )
+    as_compact = conn.execute("SELECT * FROM schedules ORDER BY train_no, station").fetchall()
+    conn.close()
+
+    assert inserted == compact_inserted == 2
+    assert as_compact == as_records
+    assert load_batch(date(2025, 6, 27), {"2": compact([])}) == 0
+
+
+def test_load_batch_stores_delays_with_midnight_wrap(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    load_batch should store est/act delays in seconds, treating a time just past
+    midnight as late rather than nearly a day early.
+    """
+    setup_database(tmp_path, monkeypatch)
+    conn = db_module.get_connection()
+    batch = {
+        "1": [
+            CleanRecord(station="A", sched_time=time(8, 0), est_time=time(8, 2), act_time=time(7, 59, 30)),
+            CleanRecord(station="B", sched_time=time(23, 55), est_time=time(0, 5), act_time=None),
+            CleanRecord(station="C", sched_time=time(0, 2), est_time=time(23, 58), act_time=time(0, 2)),
+        ],
+    }
+
+    load_batch(date(2025, 6, 27), batch, conn=conn)
+    rows = conn.execute(
+        "SELECT station, est_delay_sec, act_delay_sec FROM schedules ORDER BY station"
+    ).fetchall()
+    conn.close()
+
+    assert rows == [("A", 120, -30), ("B", 600, None), ("C", -240, 0)]
+
+
+@pytest.mark.parametrize("columnar", [False, True])
+def test_upsert_updates_only_changed_stops_and_keeps_actuals(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch,
+        columnar: bool
+) -> None:
+    """
+    Upserting should insert new stops, update stops whose estimate or actual
+    time changed (recomputing delays), count only those, and never clear a
+    stored actual time.
+    """
+    db_path = setup_database(tmp_path, monkeypatch)
+    day = date(2025, 6, 27)
+    load_batch(day, {"100": [
+        CleanRecord(station="A", sched_time=time(6, 0), est_time=time(6, 2), act_time=time(6, 3)),
+        CleanRecord(station="B", sched_time=time(6, 10), est_time=time(6, 12), act_time=None),
+        CleanRecord(station="C", sched_time=time(6, 20), est_time=time(6, 22), act_time=None),
+    ]})
+    refreshed = {"100": [
+        CleanRecord(station="A", sched_time=time(6, 0), est_time=time(6, 2), act_time=None),
+        CleanRecord(station="B", sched_time=time(6, 10), est_time=time(6, 14), act_time=time(6, 15)),
+        CleanRecord(station="C", sched_time=time(6, 20), est_time=time(6, 22), act_time=None),
+        CleanRecord(station="D", sched_time=time(6, 30), est_time=time(6, 33), act_time=None),
+    ]}
+    conn = db_module.get_connection()
+    version = db_module.get_data_version(conn)
+
+    if columnar:
+        relation = transform_columns(conn, to_columns({
+            "100": [
+                {"station": r["station"], "sched_tm": r["sched_time"].strftime("%H:%M"),
+                 "est_tm": r["est_time"].strftime("%H:%M"),
+                 "act_tm": r["act_time"].strftime("%H:%M") if r["act_time"] else "na"}
+                for r in refreshed["100"]
+            ]
+        }))
+        changed = load_relation(day, relation, conn, upsert=True)
+    else:
+        changed = load_batch(day, refreshed, conn=conn, upsert=True)
+    unchanged = load_batch(day, refreshed, conn=conn, upsert=True)
+    delays = dict(conn.execute(
+        "SELECT station, [est_delay_sec, act_delay_sec] FROM schedules ORDER BY station"
+    ).fetchall())
+    new_version = db_module.get_data_version(conn)
+    conn.close()
+
+    assert changed == 2
+    assert unchanged == 0
+    assert new_version == version + 1
+    by_station = {r[2]: r for r in fetch_all_records(db_path)}
+    assert by_station["A"][5] == time(6, 3)
+    assert by_station["B"][4:] == (time(6, 14), time(6, 15))
+    assert delays == {"A": [120, 180], "B": [240, 300], "C": [120, None], "D": [180, None]}
+
+
+def test_replace_swaps_stored_stops_in_one_transaction(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Loading with replace should delete every stored stop of the batch's trains
+    for the date and insert the new ones atomically: a failing load keeps the
+    old stops, and other dates are left alone.
+    """
+    db_path = setup_database(tmp_path, monkeypatch)
+    day = date(2025, 6, 27)
+    old = [
+        CleanRecord(station="A", sched_time=time(6, 0), est_time=time(6, 2), act_time=time(6, 3)),
+        CleanRecord(station="B", sched_time=time(6, 10), est_time=time(6, 12), act_time=None),
+    ]
+    load_batch(day, {"100": old, "200": old})
+    load_batch(date(2025, 6, 28), {"100": old[:1]})
+    corrected = {"100": [CleanRecord(station="A", sched_time=time(6, 0), est_time=time(6, 2), act_time=None)]}
+    conn = db_module.get_connection()
+
+    def broken_bump(conn: duckdb.DuckDBPyConnection) -> None:
+        raise RuntimeError("disk full")
+
+    with monkeypatch.context() as patch:
+        patch.setattr("src.loader.bump_data_version", broken_bump)
+        with pytest.raises(RuntimeError):
+            load_batch(day, corrected, conn=conn, replace=True)
+    assert conn.execute("SELECT count(*) FROM schedules").fetchone()[0] == 5
+
+    loaded = load_batch(day, corrected, conn=conn, replace=True)
+    conn.close()
+
+    assert loaded == 1
+    assert sorted((r[0].day, r[1], r[2], r[5]) for r in fetch_all_records(db_path)) == [
+        (27, "100", "A", None), (27, "200", "A", time(6, 3)), (27, "200", "B", None), (28, "100", "A", time(6, 3)),
+    ]
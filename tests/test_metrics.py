@@ -0,0 +1,129 @@
+import json
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+import src.db as db_module
+import src.metrics as metrics_module
+from src.metrics import RunMetrics, write_json_summary, write_run_metrics
+
+
+def setup_database(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Point the DB module at a fresh temporary database with the schema applied."""
+    monkeypatch.setattr(db_module, "DB_FILE", tmp_path / "metrics.duckdb")
+    db_module.init_db()
+
+
+def test_percentile_uses_nearest_rank() -> None:
+    """
+    _percentile should return an observed value at the requested rank.
+    """
+    values = [float(n) for n in range(1, 101)]
+    assert metrics_module._percentile(values, 50) == 50
+    assert metrics_module._percentile(values, 95) == 95
+    assert metrics_module._percentile(values, 99) == 99
+    assert metrics_module._percentile([7.0], 99) == 7
+
+
+def test_run_metrics_summarizes_stages_and_latencies() -> None:
+    """
+    summary should report stage times, rows per second, counters, latency
+    percentiles and a histogram that accounts for every request.
+    """
+    metrics = RunMetrics()
+    with metrics.timed("transform"):
+        time.sleep(0.01)
+    metrics.add_rows("transform", 100)
+    metrics.increment("fetch.retries")
+    metrics.increment("fetch.retries", 2)
+    for ms in [20, 40, 60, 80, 3000]:
+        metrics.record_latency(ms / 1000)
+
+    summary = metrics.summary()
+
+    assert summary["transform.wall_sec"] >= 0.01
+    assert summary["transform.cpu_sec"] >= 0
+    assert summary["transform.rows"] == 100
+    assert 0 < summary["transform.rows_per_sec"] <= 100 / 0.01
+    assert summary["fetch.retries"] == 3
+    assert summary["fetch.requests"] == 5
+    assert summary["fetch.latency_p50_ms"] == 60
+    assert summary["fetch.latency_p99_ms"] == summary["fetch.latency_max_ms"] == 3000
+    assert summary["fetch.latency_hist.le_50ms"] == 2
+    histogram = [value for name, value in summary.items() if name.startswith("fetch.latency_hist.")]
+    assert sum(histogram) == 5
+    assert summary["run.wall_sec"] >= summary["transform.wall_sec"]
+    assert summary["run.peak_rss_mb"] > 0
+
+
+def test_run_metrics_without_requests_omits_percentiles() -> None:
+    """
+    A run that sent no requests should report zero requests and no percentiles.
+    """
+    summary = RunMetrics().summary()
+    assert summary["fetch.requests"] == 0
+    assert "fetch.latency_p95_ms" not in summary
+
+
+def test_write_run_metrics_stores_one_row_per_metric(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    write_run_metrics should store every summary value under the run's start time.
+    """
+    setup_database(tmp_path, monkeypatch)
+    metrics = RunMetrics()
+    metrics.add_rows("load", 10)
+    metrics.record_latency(0.2)
+    conn = db_module.get_connection()
+
+    summary = write_run_metrics(conn, metrics)
+    rows = dict(conn.execute("SELECT metric, value FROM run_metrics").fetchall())
+    started = conn.execute("SELECT DISTINCT run_started FROM run_metrics").fetchall()
+    conn.close()
+
+    assert rows == summary
+    assert rows["load.rows"] == 10
+    assert started == [(metrics.started_at,)]
+
+
+def test_write_json_summary(tmp_path: Path) -> None:
+    """
+    write_json_summary should write the summary with any extra fields.
+    """
+    metrics = RunMetrics()
+    metrics.increment("fetch.failures")
+    path = tmp_path / "out" / "metrics.json"
+
+    write_json_summary(path, metrics, extra={"dates": ["2025-06-27"]})
+    document = json.loads(path.read_text())
+
+    assert document["dates"] == ["2025-06-27"]
+    assert document["metrics"]["fetch.failures"] == 1
+    assert document["started_at"] == metrics.started_at.isoformat(timespec="seconds")
+
+
+@pytest.mark.parametrize("platform, maxrss", [("linux", 200 * 1024), ("darwin", 200 * 1024 * 1024)])
+def test_peak_rss_mb_uses_the_platform_unit(
+        monkeypatch: pytest.MonkeyPatch,
+        platform: str,
+        maxrss: int
+) -> None:
+    """
+    peak_rss_mb should read ru_maxrss as kilobytes on Linux and bytes on macOS,
+    whatever the size of the value.
+    """
+    class FakeResource:
+        RUSAGE_SELF = 0
+
+        @staticmethod
+        def getrusage(who: int) -> SimpleNamespace:
+            return SimpleNamespace(ru_maxrss=maxrss)
+
+    monkeypatch.setattr(metrics_module, "resource", FakeResource)
+    monkeypatch.setattr(metrics_module.sys, "platform", platform)
+
+    assert metrics_module.peak_rss_mb() == 200.0
@@ -0,0 +1,412 @@
+import asyncio
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pytest
+import requests
+
+import src.db as db_module
+import src.pipeline as pipeline
+from src import http_client
+from src.metrics import RunMetrics
+from src.raw_store import RawResponseStore
+from src.ratelimit import TokenBucket
+
+
+class DummyResponse:
+    """Simulated requests.Response for pipeline tests."""
+
+    def __init__(self, json_data: Any, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> None:
+        self._json = json_data
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def raise_for_status(self) -> None:
+        """Raise HTTPError on bad status codes."""
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"Status code: {self.status_code}")
+
+    def json(self) -> Any:
+        """Return the prepared JSON payload."""
+        return self._json
+
+
+def schedule_for(train_no: str) -> List[Dict[str, str]]:
+    """Build a small two-stop schedule payload for a train."""
+    return [
+        {"station": "A", "sched_tm": "8:00 am", "est_tm": "8:02 am", "act_tm": "8:03 am"},
+        {"station": "B", "sched_tm": "8:10 am", "est_tm": "8:12 am", "act_tm": "na"},
+    ]
+
+
+def setup_database(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Point the DB module at a fresh temporary database with the schema applied."""
+    monkeypatch.setattr(db_module, "DB_FILE", tmp_path / "pipeline.duckdb")
+    db_module.init_db()
+
+
+def fast_limiter() -> TokenBucket:
+    """A limiter that never makes tests wait."""
+    return TokenBucket(rate=10_000, capacity=10_000)
+
+
+@pytest.mark.parametrize("columnar", [False, True])
+def test_run_streaming_loads_all_trains(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch,
+        columnar: bool
+) -> None:
+    """
+    run_streaming should load every fetched train and count fetch failures
+    without aborting the run.
+    """
+    setup_database(tmp_path, monkeypatch)
+
+    def fake_get(url: str, params=None):
+        if params["req1"] == "bad":
+            return DummyResponse(None, status_code=500)
+        return DummyResponse(schedule_for(params["req1"]))
+
+    monkeypatch.setattr(http_client.get_session(), "get", fake_get)
+    conn = db_module.get_connection()
+
+    summary = asyncio.run(
+        pipeline.run_streaming(
+            {date(2025, 6, 27): ["1", "2", "3", "bad"]}, conn,
+            concurrency=2, queue_size=1, batch_size=2, columnar=columnar, limiter=fast_limiter(),
+            retry_backoff=0,
+        )
+    )
+    count = conn.execute("SELECT COUNT(*) FROM schedules").fetchone()[0]
+    conn.close()
+
+    assert summary == {date(2025, 6, 27): {"fetched": 3, "failed": 1, "cleaned": 6, "loaded": 6}}
+    assert count == 6
+
+
+def test_run_streaming_overlaps_load_with_fetch(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Bounded queues should stop fetching from running far ahead of loading:
+    the first load must happen while most trains are still unfetched.
+    """
+    setup_database(tmp_path, monkeypatch)
+    events: List[str] = []
+
+    def fake_get(url: str, params=None):
+        events.append("fetch")
+        return DummyResponse(schedule_for(params["req1"]))
+
+    real_load_batch = pipeline.load_batch
+
+    def recording_load_batch(*args, **kwargs) -> int:
+        events.append("load")
+        return real_load_batch(*args, **kwargs)
+
+    monkeypatch.setattr(http_client.get_session(), "get", fake_get)
+    monkeypatch.setattr(pipeline, "load_batch", recording_load_batch)
+    conn = db_module.get_connection()
+
+    trains = [str(n) for n in range(20)]
+    summary = asyncio.run(
+        pipeline.run_streaming(
+            {date(2025, 6, 27): trains}, conn,
+            concurrency=1, queue_size=1, batch_size=1, limiter=fast_limiter(),
+        )
+    )
+    conn.close()
+
+    assert summary[date(2025, 6, 27)]["loaded"] == 40
+    # At most a handful of trains can be buffered between the stages
+    assert events.index("load") <= 6
+    assert events.count("load") == 20
+
+
+def test_run_streaming_dry_run_writes_nothing(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    run_streaming with dry_run should report cleaned counts but insert no rows.
+    """
+    setup_database(tmp_path, monkeypatch)
+    monkeypatch.setattr(
+        http_client.get_session(), "get",
+        lambda url, params=None: DummyResponse(schedule_for(params["req1"])),
+    )
+    conn = db_module.get_connection()
+
+    summary = asyncio.run(
+        pipeline.run_streaming(
+            {date(2025, 6, 27): ["1", "2"]}, conn, dry_run=True, limiter=fast_limiter(),
+        )
+    )
+    count = conn.execute("SELECT COUNT(*) FROM schedules").fetchone()[0]
+    conn.close()
+
+    assert summary[date(2025, 6, 27)]["cleaned"] == 4
+    assert summary[date(2025, 6, 27)]["loaded"] == 0
+    assert count == 0
+
+
+def test_run_streaming_records_progress(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    run_streaming should mark loaded trains and record failures with their error.
+    """
+    setup_database(tmp_path, monkeypatch)
+
+    def fake_get(url: str, params=None):
+        if params["req1"] == "bad":
+            return DummyResponse(None, status_code=503)
+        return DummyResponse(schedule_for(params["req1"]))
+
+    monkeypatch.setattr(http_client.get_session(), "get", fake_get)
+    conn = db_module.get_connection()
+
+    asyncio.run(
+        pipeline.run_streaming(
+            {date(2025, 6, 27): ["1", "bad"]}, conn, limiter=fast_limiter(), retry_backoff=0
+        )
+    )
+    rows = conn.execute(
+        "SELECT train_no, status, attempts, last_error FROM etl_progress ORDER BY train_no"
+    ).fetchall()
+    conn.close()
+
+    assert rows[0] == ("1", "loaded", 1, None)
+    assert rows[1][:3] == ("bad", "failed", 1)
+    assert "503" in rows[1][3]
+
+
+def test_run_streaming_spans_multiple_dates(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    run_streaming should process several service dates in one run, loading each
+    train under its own date and reporting per-date summaries.
+    """
+    setup_database(tmp_path, monkeypatch)
+    monkeypatch.setattr(
+        http_client.get_session(), "get",
+        lambda url, params=None: DummyResponse(schedule_for(params["req1"])),
+    )
+    conn = db_module.get_connection()
+    jobs = {date(2025, 6, 27): ["1", "2"], date(2025, 6, 28): ["1"], date(2025, 6, 29): []}
+
+    summaries = asyncio.run(
+        pipeline.run_streaming(jobs, conn, concurrency=3, batch_size=2, limiter=fast_limiter())
+    )
+    rows = conn.execute(
+        "SELECT date_scraped, train_no, COUNT(*) FROM schedules GROUP BY ALL ORDER BY ALL"
+    ).fetchall()
+    conn.close()
+
+    assert rows == [
+        (date(2025, 6, 27), "1", 2),
+        (date(2025, 6, 27), "2", 2),
+        (date(2025, 6, 28), "1", 2),
+    ]
+    assert summaries[date(2025, 6, 27)]["loaded"] == 4
+    assert summaries[date(2025, 6, 28)]["loaded"] == 2
+    assert summaries[date(2025, 6, 29)] == {"fetched": 0, "failed": 0, "cleaned": 0, "loaded": 0}
+
+
+@pytest.mark.parametrize("columnar", [False, True])
+def test_run_streaming_collects_metrics(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch,
+        columnar: bool
+) -> None:
+    """
+    run_streaming should time each stage and count rows, requests, retries and
+    failed trains in the given RunMetrics.
+    """
+    setup_database(tmp_path, monkeypatch)
+
+    def fake_get(url: str, params=None):
+        if params["req1"] == "bad":
+            return DummyResponse(None, status_code=500)
+        return DummyResponse(schedule_for(params["req1"]))
+
+    monkeypatch.setattr(http_client.get_session(), "get", fake_get)
+    conn = db_module.get_connection()
+    metrics = RunMetrics()
+
+    asyncio.run(
+        pipeline.run_streaming(
+            {date(2025, 6, 27): ["1", "2", "bad"]}, conn,
+            batch_size=1, columnar=columnar, limiter=fast_limiter(), metrics=metrics, retry_backoff=0,
+        )
+    )
+    conn.close()
+    summary = metrics.summary()
+
+    # Two good requests plus the first attempt and three retries of "bad"
+    assert summary["fetch.requests"] == 6
+    assert summary["fetch.retries"] == 3
+    assert summary["fetch.failures"] == 1
+    assert summary["transform.rows"] == 4
+    assert summary["load.rows"] == 4
+    assert summary["load.transactions"] == 2
+    assert summary["load.wall_sec"] > 0
+
+
+@pytest.mark.parametrize("pool_min_records, pool_chunks", [(0, 3), (4, 2), (100, 0)])
+def test_run_streaming_transforms_on_worker_processes(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch,
+        pool_min_records: int,
+        pool_chunks: int
+) -> None:
+    """
+    With transform workers, run_streaming should transform chunks of trains on a
+    process pool and load the same rows as in-process, starting the pool only
+    once enough records were transformed in-process.
+    """
+    setup_database(tmp_path, monkeypatch)
+    monkeypatch.setattr(pipeline.config, "TRANSFORM_CHUNK_TRAINS", 2)
+    monkeypatch.setattr(
+        http_client.get_session(), "get", lambda url, params=None: DummyResponse(schedule_for(params["req1"]))
+    )
+    conn = db_module.get_connection()
+    metrics = RunMetrics()
+
+    summary = asyncio.run(
+        pipeline.run_streaming(
+            {date(2025, 6, 27): ["1", "2", "3"], date(2025, 6, 28): ["4", "5"]}, conn,
+            batch_size=2, limiter=fast_limiter(), metrics=metrics,
+            concurrency=1, transform_workers=2, pool_min_records=pool_min_records,
+        )
+    )
+    rows = conn.execute(
+        "SELECT date_scraped, train_no, station, act_time FROM schedules ORDER BY ALL"
+    ).fetchall()
+    conn.close()
+
+    assert summary[date(2025, 6, 27)] == {"fetched": 3, "failed": 0, "cleaned": 6, "loaded": 6}
+    assert summary[date(2025, 6, 28)] == {"fetched": 2, "failed": 0, "cleaned": 4, "loaded": 4}
+    assert [row[:3] for row in rows] == [
+        (day, train_no, station)
+        for day, train_nos in [(date(2025, 6, 27), "123"), (date(2025, 6, 28), "45")]
+        for train_no in train_nos
+        for station in "AB"
+    ]
+    assert metrics.summary()["transform.rows"] == 10
+    assert metrics.summary().get("transform.pool_chunks", 0) == pool_chunks
+
+
+def test_run_streaming_defers_retries_behind_other_trains(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    A transiently failing train should wait out its backoff on the retry queue
+    while its worker fetches the other trains.
+    """
+    setup_database(tmp_path, monkeypatch)
+    calls: List[str] = []
+
+    def fake_get(url: str, params=None):
+        calls.append(params["req1"])
+        if params["req1"] == "flaky" and calls.count("flaky") == 1:
+            return DummyResponse(None, status_code=503)
+        return DummyResponse(schedule_for(params["req1"]))
+
+    monkeypatch.setattr(http_client.get_session(), "get", fake_get)
+    conn = db_module.get_connection()
+
+    summary = asyncio.run(
+        pipeline.run_streaming(
+            {date(2025, 6, 27): ["flaky", "2", "3"]}, conn,
+            concurrency=1, limiter=fast_limiter(), retry_backoff=0.2,
+        )
+    )
+    conn.close()
+
+    assert calls == ["flaky", "2", "3", "flaky"]
+    assert summary == {date(2025, 6, 27): {"fetched": 3, "failed": 0, "cleaned": 6, "loaded": 6}}
+
+
+def test_run_streaming_skips_unchanged_payloads(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    A rerun should skip transform and load of trains whose payload is unchanged
+    (by hash, or by a 304 to a conditional request), and reload changed ones.
+    """
+    setup_database(tmp_path, monkeypatch)
+    payloads = {"1": schedule_for("1"), "2": schedule_for("2"), "3": schedule_for("3")}
+    sent_headers: Dict[str, Dict[str, str]] = {}
+
+    def fake_get(url: str, params=None, headers=None):
+        train_no = params["req1"]
+        sent_headers[train_no] = headers or {}
+        if train_no == "3":
+            # Only train 3's endpoint supports conditional requests
+            if sent_headers[train_no].get("If-None-Match") == '"v1"':
+                return DummyResponse(None, status_code=304, headers={"ETag": '"v1"'})
+            return DummyResponse(payloads[train_no], headers={"ETag": '"v1"'})
+        return DummyResponse(payloads[train_no])
+
+    monkeypatch.setattr(http_client.get_session(), "get", fake_get)
+    conn = db_module.get_connection()
+    jobs = {date(2025, 6, 27): ["1", "2", "3"]}
+
+    first = asyncio.run(pipeline.run_streaming(jobs, conn, limiter=fast_limiter()))
+    payloads["2"] = payloads["2"][:1]
+    metrics = RunMetrics()
+    second = asyncio.run(pipeline.run_streaming(jobs, conn, limiter=fast_limiter(), metrics=metrics))
+    forced = asyncio.run(pipeline.run_streaming(jobs, conn, limiter=fast_limiter(), skip_unchanged=False))
+    conn.close()
+
+    assert first == {date(2025, 6, 27): {"fetched": 3, "failed": 0, "cleaned": 6, "loaded": 6}}
+    assert second == {date(2025, 6, 27): {"fetched": 3, "failed": 0, "cleaned": 1, "loaded": 0}}
+    assert metrics.summary()["fetch.unchanged"] == 2
+    assert forced == {date(2025, 6, 27): {"fetched": 3, "failed": 0, "cleaned": 5, "loaded": 0}}
+    assert sent_headers["1"] == {}
+
+
+def test_run_streaming_captures_and_replays_payloads(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    run_streaming should keep fetched payloads, including ones that fail to
+    parse, and a replay should load them again without any network access.
+    """
+    setup_database(tmp_path, monkeypatch)
+
+    def fake_get(url: str, params=None):
+        if params["req1"] == "odd":
+            return DummyResponse({"error": "not a list"})
+        return DummyResponse(schedule_for(params["req1"]))
+
+    monkeypatch.setattr(http_client.get_session(), "get", fake_get)
+    store = RawResponseStore(tmp_path / "raw")
+    conn = db_module.get_connection()
+    jobs = {date(2025, 6, 27): ["1", "2", "odd"]}
+
+    captured = asyncio.run(pipeline.run_streaming(jobs, conn, limiter=fast_limiter(), capture=store))
+    conn.execute("DELETE FROM schedules")
+
+    def no_network(url: str, params=None):
+        raise AssertionError("replay must not fetch")
+
+    monkeypatch.setattr(http_client.get_session(), "get", no_network)
+    replay_jobs = {date(2025, 6, 27): ["1", "2", "odd", "missing"]}
+    replayed = asyncio.run(pipeline.run_streaming(replay_jobs, conn, replay_from=store))
+    count = conn.execute("SELECT COUNT(*) FROM schedules").fetchone()[0]
+    conn.close()
+
+    assert captured == {date(2025, 6, 27): {"fetched": 2, "failed": 1, "cleaned": 4, "loaded": 4}}
+    assert store.train_numbers(date(2025, 6, 27)) == ["1", "2", "odd"]
+    assert replayed == {date(2025, 6, 27): {"fetched": 2, "failed": 2, "cleaned": 4, "loaded": 4}}
+    assert count == 4
@@ -0,0 +1,128 @@
+from datetime import date, datetime
+from pathlib import Path
+from typing import List
+
+import pytest
+
+import src.db as db_module
+from src.extractors import TrainPosition
+from src.positions import PositionWriter
+
+
+def setup_database(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Point the DB module at a fresh temporary database with the schema applied."""
+    monkeypatch.setattr(db_module, "DB_FILE", tmp_path / "positions.duckdb")
+    db_module.init_db()
+
+
+def make_poll(late: int) -> List[TrainPosition]:
+    """Return a poll of two trains, one without a next stop."""
+    return [
+        TrainPosition(train_no="500", line="Paoli/Thorndale", dest="Thorndale",
+                      next_stop="Ardmore", lat=40.0081, lon=-75.2903, late=late),
+        TrainPosition(train_no="9", line="Trenton", dest="Trenton",
+                      next_stop="", lat=None, lon=None, late=None),
+    ]
+
+
+def test_position_writer_buffers_polls_and_encodes_dictionaries(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    PositionWriter should hold polls until flush_polls is reached, then append them
+    with dictionary-encoded trains, stations and lines.
+    """
+    setup_database(tmp_path, monkeypatch)
+    conn = db_module.get_connection()
+    day = date(2025, 6, 27)
+    writer = PositionWriter(conn, flush_polls=2)
+
+    assert writer.add(datetime(2025, 6, 27, 8, 0, 0), day, make_poll(1)) == 0
+    assert conn.execute("SELECT count(*) FROM train_positions").fetchone()[0] == 0
+    assert writer.add(datetime(2025, 6, 27, 8, 0, 30), day, make_poll(2)) == 4
+
+    rows = conn.execute(
+        """
+        SELECT polled_at, train_no, line, dest, next_stop, late_min
+        FROM train_positions_decoded ORDER BY polled_at, train_no
+        """
+    ).fetchall()
+    assert rows == [
+        (datetime(2025, 6, 27, 8, 0, 0), "500", "Paoli/Thorndale", "Thorndale", "Ardmore", 1),
+        (datetime(2025, 6, 27, 8, 0, 0), "9", "Trenton", "Trenton", None, None),
+        (datetime(2025, 6, 27, 8, 0, 30), "500", "Paoli/Thorndale", "Thorndale", "Ardmore", 2),
+        (datetime(2025, 6, 27, 8, 0, 30), "9", "Trenton", "Trenton", None, None),
+    ]
+    # Each distinct value is stored once
+    assert conn.execute("SELECT count(*) FROM position_stations").fetchone()[0] == 3
+    conn.close()
+
+
+def test_position_writer_reuses_stored_dictionary_ids(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    A new PositionWriter should pick up IDs written by an earlier one instead of
+    assigning duplicates.
+    """
+    setup_database(tmp_path, monkeypatch)
+    conn = db_module.get_connection()
+    day = date(2025, 6, 27)
+
+    first = PositionWriter(conn)
+    first.add(datetime(2025, 6, 27, 8, 0), day, make_poll(1))
+    assert first.flush() == 2
+
+    second = PositionWriter(conn)
+    second.add(datetime(2025, 6, 27, 8, 1), day, make_poll(3))
+    second.add(datetime(2025, 6, 27, 8, 1), day, [
+        TrainPosition(train_no="1", line="Trenton", dest="Ardmore",
+                      next_stop="Wayne", lat=None, lon=None, late=0),
+    ])
+    assert second.flush() == 3
+
+    assert conn.execute("SELECT count(*) FROM position_trains").fetchone()[0] == 3
+    assert conn.execute("SELECT count(*) FROM position_stations").fetchone()[0] == 4
+    assert conn.execute("SELECT count(*) FROM train_positions_decoded").fetchone()[0] == 5
+    conn.close()
+
+
+def test_position_writers_sharing_a_database_allocate_distinct_ids(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Two writers buffering different values against one database should both
+    flush, each value getting its own ID and every row decoding to its poll.
+    """
+    setup_database(tmp_path, monkeypatch)
+    day = date(2025, 6, 27)
+    first, second = PositionWriter(), PositionWriter()
+
+    first.add(datetime(2025, 6, 27, 8, 0), day, make_poll(1))
+    second.add(datetime(2025, 6, 27, 8, 0), day, [
+        TrainPosition(train_no="1", line="Trenton", dest="Wayne",
+                      next_stop="Paoli", lat=None, lon=None, late=0),
+    ])
+    assert first.flush() == 2
+    assert second.flush() == 1
+    second.add(datetime(2025, 6, 27, 8, 1), day, make_poll(2))
+    assert second.flush() == 2
+    assert second.pending == 0
+
+    conn = db_module.get_connection()
+    stations = conn.execute("SELECT station_id, name FROM position_stations ORDER BY station_id").fetchall()
+    rows = conn.execute(
+        "SELECT polled_at, train_no, line, dest, next_stop FROM train_positions_decoded ORDER BY ALL"
+    ).fetchall()
+    conn.close()
+    assert stations == [(1, "Ardmore"), (2, "Thorndale"), (3, "Trenton"), (4, "Paoli"), (5, "Wayne")]
+    assert rows == [
+        (datetime(2025, 6, 27, 8, 0), "1", "Trenton", "Wayne", "Paoli"),
+        (datetime(2025, 6, 27, 8, 0), "500", "Paoli/Thorndale", "Thorndale", "Ardmore"),
+        (datetime(2025, 6, 27, 8, 0), "9", "Trenton", "Trenton", None),
+        (datetime(2025, 6, 27, 8, 1), "500", "Paoli/Thorndale", "Thorndale", "Ardmore"),
+        (datetime(2025, 6, 27, 8, 1), "9", "Trenton", "Trenton", None),
+    ]
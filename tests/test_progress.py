@@ -0,0 +1,132 @@
+from datetime import date
+from pathlib import Path
+from typing import Dict, Tuple
+
+import pytest
+
+import src.db as db_module
+from src.progress import (
+    FAILED, FETCHED, LOADED, PayloadFingerprint, get_failed_trains, get_loaded_train_numbers, get_payload_fingerprints,
+    payload_hash, record_progress
+)
+
+
+def setup_database(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Point the DB module at a fresh temporary database with the schema applied."""
+    monkeypatch.setattr(db_module, "DB_FILE", tmp_path / "progress.duckdb")
+    db_module.init_db()
+
+
+def read_progress(conn) -> Dict[str, Tuple[str, int, str]]:
+    """Return {train_no: (status, attempts, last_error)} for every progress row."""
+    rows = conn.execute(
+        "SELECT train_no, status, attempts, last_error FROM etl_progress"
+    ).fetchall()
+    return {row[0]: (row[1], row[2], row[3]) for row in rows}
+
+
+def test_record_progress_tracks_status_attempts_and_errors(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    record_progress should count fetch attempts, keep the last error, and move
+    trains between states.
+    """
+    setup_database(tmp_path, monkeypatch)
+    conn = db_module.get_connection()
+    day = date(2025, 6, 27)
+
+    record_progress(conn, day, FAILED, ["1"], errors={"1": "503 Service Unavailable"})
+    record_progress(conn, day, FETCHED, ["1", "2"])
+    record_progress(conn, day, LOADED, ["1", "2"])
+    progress = read_progress(conn)
+    conn.close()
+
+    assert progress["1"] == (LOADED, 2, "503 Service Unavailable")
+    assert progress["2"] == (LOADED, 1, None)
+
+
+def test_get_loaded_train_numbers_filters_by_date_and_status(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    get_loaded_train_numbers should only return trains loaded on the given date.
+    """
+    setup_database(tmp_path, monkeypatch)
+    conn = db_module.get_connection()
+
+    record_progress(conn, date(2025, 6, 27), FETCHED, ["1", "2", "3"])
+    record_progress(conn, date(2025, 6, 27), LOADED, ["1"])
+    record_progress(conn, date(2025, 6, 27), FAILED, ["3"], errors={"3": "timeout"})
+    record_progress(conn, date(2025, 6, 28), LOADED, ["2"])
+
+    assert get_loaded_train_numbers(conn, date(2025, 6, 27)) == {"1"}
+    assert get_loaded_train_numbers(conn, date(2025, 6, 28)) == {"2"}
+    conn.close()
+
+
+def test_get_failed_trains_returns_last_errors(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    get_failed_trains should return the trains still failed on the given date,
+    with their last error.
+    """
+    setup_database(tmp_path, monkeypatch)
+    conn = db_module.get_connection()
+
+    record_progress(conn, date(2025, 6, 27), FAILED, ["1", "2", "3"], errors={"1": "timeout", "2": "503"})
+    record_progress(conn, date(2025, 6, 27), LOADED, ["1"])
+    record_progress(conn, date(2025, 6, 28), FAILED, ["4"], errors={"4": "404"})
+
+    assert get_failed_trains(conn, date(2025, 6, 27)) == {"2": "503", "3": ""}
+    conn.close()
+
+
+def test_record_progress_rejects_unknown_status(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    record_progress should raise ValueError for an unknown status.
+    """
+    setup_database(tmp_path, monkeypatch)
+    conn = db_module.get_connection()
+
+    with pytest.raises(ValueError):
+        record_progress(conn, date(2025, 6, 27), "done", ["1"])
+    conn.close()
+
+
+def test_payload_fingerprints_are_kept_for_loaded_trains_only(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Fingerprints recorded with a load should survive later progress writes
+    without one, and only count while the train is loaded.
+    """
+    setup_database(tmp_path, monkeypatch)
+    conn = db_module.get_connection()
+    day = date(2025, 6, 27)
+    digest = payload_hash([{"station": "A", "sched_tm": "8:00 am"}])
+    fingerprint = PayloadFingerprint(payload_hash=digest, etag='"v1"', last_modified=None)
+
+    record_progress(conn, day, FETCHED, ["1", "2"])
+    record_progress(conn, day, LOADED, ["1", "2"], fingerprints={"1": fingerprint, "2": fingerprint})
+    record_progress(conn, day, LOADED, ["1"])
+    record_progress(conn, day, FAILED, ["2"], errors={"2": "timeout"})
+
+    assert get_payload_fingerprints(conn, day) == {"1": fingerprint}
+    conn.close()
+
+
+def test_payload_hash_ignores_key_order() -> None:
+    """
+    payload_hash should depend on content only, not on key order.
+    """
+    assert payload_hash([{"a": 1, "b": "x"}]) == payload_hash([{"b": "x", "a": 1}])
+    assert payload_hash([{"a": 1}]) != payload_hash([{"a": 2}])
@@ -0,0 +1,120 @@
+from datetime import date, time
+from pathlib import Path
+
+import pytest
+
+import src.db as db_module
+from src import queries
+from src.aggregates import refresh_daily_aggregates
+from src.loader import load_batch
+from src.transformer import CleanRecord
+
+
+def setup_database(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Create a database with two weekdays of aggregated stops.
+
+    Train 100 stops at A (08:00) and B (09:00) on both days; train 200 stops at A
+    (08:30) on the first day only, with no actual time at its second stop.
+    """
+    monkeypatch.setattr(db_module, "DB_FILE", tmp_path / "queries.duckdb")
+    db_module.init_db()
+    conn = db_module.get_connection()
+
+    def stop(station: str, hour: int, minute: int, late_min: int) -> CleanRecord:
+        act = None if late_min < 0 else time(hour, minute + late_min)
+        return CleanRecord(station=station, sched_time=time(hour, minute), est_time=time(hour, minute), act_time=act)
+
+    # 2025-06-30 is a Monday
+    load_batch(date(2025, 6, 30), {
+        "100": [stop("A", 8, 0, 2), stop("B", 9, 0, 8)],
+        "200": [stop("A", 8, 30, 0), stop("C", 9, 30, -1)],
+    }, conn=conn)
+    load_batch(date(2025, 7, 1), {"100": [stop("A", 8, 0, 4), stop("B", 9, 0, 6)]}, conn=conn)
+    refresh_daily_aggregates(conn, [date(2025, 6, 30), date(2025, 7, 1)])
+    conn.close()
+
+
+def test_train_on_time_performance(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    train_on_time_performance should combine a train's days into one row.
+    """
+    setup_database(tmp_path, monkeypatch)
+
+    rows = queries.train_on_time_performance(date(2025, 6, 30), date(2025, 7, 1))
+
+    assert [row["train_no"] for row in rows] == ["100", "200"]
+    assert rows[0] == {
+        "train_no": "100",
+        "days": 2,
+        "observed_stops": 4,
+        "on_time_stops": 2,
+        "on_time_pct": 50.0,
+        "avg_delay_sec": 300.0,
+        "max_delay_sec": 480,
+    }
+    only = queries.train_on_time_performance(date(2025, 7, 1), date(2025, 7, 1), train_no="100")
+    assert [(row["days"], row["avg_delay_sec"]) for row in only] == [(1, 300.0)]
+
+
+def test_worst_trains_and_station_delays(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    worst_trains should rank by average delay, and station_average_delays should
+    order stations worst first with NULL averages last.
+    """
+    setup_database(tmp_path, monkeypatch)
+    conn = db_module.get_connection()
+
+    worst = queries.worst_trains(date(2025, 6, 30), date(2025, 7, 1), limit=1, conn=conn)
+    stations = queries.station_average_delays(date(2025, 6, 30), date(2025, 7, 1), conn=conn)
+    conn.close()
+
+    assert [row["train_no"] for row in worst] == ["100"]
+    assert [(row["station"], row["avg_delay_sec"]) for row in stations] == [
+        ("B", 420.0), ("A", 120.0), ("C", None),
+    ]
+
+
+def test_hourly_delay_heatmap(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    hourly_delay_heatmap should average delays per ISO weekday and scheduled hour.
+    """
+    setup_database(tmp_path, monkeypatch)
+
+    cells = queries.hourly_delay_heatmap(date(2025, 6, 30), date(2025, 7, 1), station="A")
+
+    assert cells == [
+        {"weekday": 1, "hour": 8, "observed_stops": 2, "avg_delay_sec": 60.0},
+        {"weekday": 2, "hour": 8, "observed_stops": 1, "avg_delay_sec": 240.0},
+    ]
+
+
+def test_queries_are_cached_until_the_data_version_changes(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Repeated queries should be served from the cache, and a load followed by an
+    aggregate refresh should invalidate them.
+    """
+    setup_database(tmp_path, monkeypatch)
+    queries.QUERY_CACHE.clear()
+    conn = db_module.get_connection()
+    day = date(2025, 7, 1)
+
+    first = queries.station_average_delays(day, day, conn=conn)
+    first[0]["station"] = "changed by caller"
+    again = queries.station_average_delays(day, day, conn=conn)
+    assert queries.QUERY_CACHE.hits == 1
+    assert [row["station"] for row in again] == ["B", "A"]
+
+    version = db_module.get_data_version(conn)
+    load_batch(day, {"300": [CleanRecord(station="D", sched_time=time(10, 0), est_time=time(10, 0),
+                                         act_time=time(10, 30))]}, conn=conn)
+    refresh_daily_aggregates(conn, [day])
+    assert db_module.get_data_version(conn) == version + 2
+
+    fresh = queries.station_average_delays(day, day, conn=conn)
+    conn.close()
+    assert queries.QUERY_CACHE.hits == 1
+    assert [row["station"] for row in fresh] == ["D", "B", "A"]
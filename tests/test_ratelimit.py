@@ -0,0 +1,183 @@
+import asyncio
+from typing import List
+
+import pytest
+
+import src.ratelimit as ratelimit
+from src.ratelimit import AdaptiveLimiter, CircuitBreaker, CircuitOpenError, TokenBucket
+
+
+class FakeClock:
+    """Controllable replacement for time.monotonic."""
+
+    def __init__(self) -> None:
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_reserve_spaces_requests_at_configured_rate(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Back-to-back reservations should be spaced exactly 1 / rate seconds apart.
+    """
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock)
+    bucket = TokenBucket(rate=4)
+
+    delays: List[float] = [bucket.reserve() for _ in range(5)]
+
+    assert delays == pytest.approx([0.0, 0.25, 0.5, 0.75, 1.0])
+
+
+def test_reserve_refills_over_time(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Tokens should refill with elapsed time, capped at the bucket capacity.
+    """
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock)
+    bucket = TokenBucket(rate=2, capacity=2)
+
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == pytest.approx(0.5)
+
+    # A long idle period must not bank more than `capacity` tokens
+    clock.now += 60
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == pytest.approx(0.5)
+
+
+def test_acquire_async_sleeps_for_reserved_delay(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    acquire_async should suspend for the reserved delay and skip sleeping when free.
+    """
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock)
+    slept: List[float] = []
+
+    async def fake_sleep(secs: float) -> None:
+        slept.append(secs)
+
+    monkeypatch.setattr(ratelimit.asyncio, "sleep", fake_sleep)
+    bucket = TokenBucket(rate=10)
+
+    async def run() -> None:
+        await bucket.acquire_async()
+        await bucket.acquire_async()
+
+    asyncio.run(run())
+    assert slept == pytest.approx([0.1])
+
+
+def test_invalid_rate_rejected() -> None:
+    """
+    TokenBucket should reject non-positive rates.
+    """
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+
+
+def test_adaptive_limiter_halves_on_congestion_and_recovers(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Congestion should halve concurrency and rate once per decrease interval;
+    healthy responses should grow them back up to, but not past, the ceilings.
+    """
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock)
+    limiter = AdaptiveLimiter(max_concurrency=8, max_rps=4, min_rps=0.5, target_latency=1.0)
+
+    limiter.record(0.1, congested=True)
+    limiter.record(0.1, congested=True)  # same burst, ignored
+    assert (limiter.concurrency, limiter.rps, limiter.decreases) == (4, 2, 1)
+
+    clock.now += 5
+    limiter.record(3.0)  # slower than the target latency
+    assert (limiter.concurrency, limiter.rps) == (2, 1)
+
+    for _ in range(200):
+        limiter.record(0.1)
+    assert (limiter.concurrency, limiter.rps) == (8, 4)
+
+
+def test_adaptive_limiter_caps_requests_in_flight() -> None:
+    """
+    slot() should never admit more requests than the current concurrency limit.
+    """
+    limiter = AdaptiveLimiter(max_concurrency=2, max_rps=1000)
+    in_flight: List[int] = []
+    active = 0
+
+    async def request() -> None:
+        nonlocal active
+        async with limiter.slot():
+            active += 1
+            in_flight.append(active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+    async def run() -> None:
+        await asyncio.gather(*(request() for _ in range(6)))
+
+    asyncio.run(run())
+    assert max(in_flight) == 2
+
+
+def test_circuit_breaker_opens_probes_and_closes(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    The breaker should open after the failure threshold, hold callers for the
+    cooldown, let one probe through, and double the cooldown when the probe fails.
+    """
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock)
+    slept: List[float] = []
+
+    async def fake_sleep(secs: float) -> None:
+        slept.append(secs)
+        clock.now += secs
+
+    monkeypatch.setattr(ratelimit.asyncio, "sleep", fake_sleep)
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=10, max_cooldown=15, give_up_after=1000)
+
+    breaker.record_failure()
+    breaker.record_failure()
+    assert not breaker.is_open
+    breaker.record_failure()
+    assert breaker.is_open and breaker.opens == 1
+
+    asyncio.run(breaker.wait())
+    assert slept == pytest.approx([10])
+
+    breaker.record_failure()  # failed probe
+    asyncio.run(breaker.wait())
+    assert slept == pytest.approx([10, 15])
+
+    breaker.record_success()
+    assert not breaker.is_open
+    asyncio.run(breaker.wait())
+    assert len(slept) == 2
+
+
+def test_circuit_breaker_gives_up_after_long_outage(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    wait() should raise CircuitOpenError once the outage outlasts give_up_after.
+    """
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock)
+
+    async def fake_sleep(secs: float) -> None:
+        clock.now += secs
+
+    monkeypatch.setattr(ratelimit.asyncio, "sleep", fake_sleep)
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=10, max_cooldown=10, give_up_after=25)
+    breaker.record_failure()
+
+    async def keep_probing() -> None:
+        while True:
+            await breaker.wait()
+            breaker.record_failure()
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(keep_probing())
+    assert clock.now - 100.0 == pytest.approx(25)
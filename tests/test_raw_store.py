@@ -0,0 +1,53 @@
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+import src.db as db_module
+from src.raw_store import RawResponseStore
+
+
+def test_raw_store_round_trips_payloads(tmp_path: Path) -> None:
+    """
+    Flushed payloads should be read back per date, exactly as captured.
+    """
+    store = RawResponseStore(tmp_path)
+    payload = [{"station": "A", "sched_tm": "8:00 am", "est_tm": "8:02 am", "act_tm": "na"}]
+    store.add(date(2025, 6, 27), "2", payload)
+    store.add(date(2025, 6, 27), "1", {"error": "unexpected"})
+    store.add(date(2025, 6, 28), "3", [])
+
+    assert store.flush() == 3
+    assert store.flush() == 0
+
+    assert store.read(date(2025, 6, 27)) == {"1": {"error": "unexpected"}, "2": payload}
+    assert store.train_numbers(date(2025, 6, 27)) == ["1", "2"]
+    assert store.read(date(2025, 6, 28)) == {"3": []}
+    assert store.read(date(2025, 6, 29)) == {}
+    assert store.train_numbers(date(2025, 6, 29)) == []
+    assert len(list((tmp_path / "date=2025-06-27").glob("*.parquet"))) == 1
+
+
+def test_raw_store_appends_and_latest_capture_wins(tmp_path: Path) -> None:
+    """
+    Each flush should add a new file, and a train captured twice should read as
+    its latest capture.
+    """
+    store = RawResponseStore(tmp_path)
+    store.add(date(2025, 6, 27), "1", ["old"])
+    store.flush()
+    store.add(date(2025, 6, 27), "1", ["new"])
+    store.add(date(2025, 6, 27), "2", ["other"])
+    store.flush()
+
+    assert len(list((tmp_path / "date=2025-06-27").glob("*.parquet"))) == 2
+    assert store.read(date(2025, 6, 27)) == {"1": ["new"], "2": ["other"]}
+    assert store.train_numbers(date(2025, 6, 27)) == ["1", "2"]
+
+
+def test_raw_store_defaults_next_to_database(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Without an explicit root, the store should live next to the database file.
+    """
+    monkeypatch.setattr(db_module, "DB_FILE", tmp_path / "etl.duckdb")
+    assert RawResponseStore().root == tmp_path / "raw" / "rrschedules"
@@ -0,0 +1,162 @@
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import duckdb
+import pytest
+
+import src.db as db_module
+from src.readers import ReaderPool
+
+
+def setup_database(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Point the DB module at a fresh temporary database with the schema applied."""
+    db_file = tmp_path / "readers.duckdb"
+    monkeypatch.setattr(db_module, "DB_FILE", db_file)
+    db_module.init_db()
+    return db_file
+
+
+def write(sql: str) -> None:
+    """Run a write and bump the data version, as the loader does."""
+    conn = db_module.get_connection()
+    conn.execute(sql)
+    db_module.bump_data_version(conn)
+    conn.close()
+
+
+def hold_lock(db_file: Path, seconds: float) -> subprocess.Popen:
+    """Open the database read-write in another process for a while."""
+    process = subprocess.Popen(
+        [sys.executable, "-c",
+         f"import duckdb, time; c = duckdb.connect({str(db_file)!r}); print('locked', flush=True); "
+         f"time.sleep({seconds})"],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    assert process.stdout.readline().strip() == "locked"
+    return process
+
+
+def test_reader_pool_serves_snapshot_and_refreshes_on_new_data(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    ReaderPool should read from a snapshot copy, reuse cursors, and only move to
+    a new snapshot once the data version changed.
+    """
+    db_file = setup_database(tmp_path, monkeypatch)
+    write("INSERT INTO train_numbers VALUES ('2025-06-27', '100', NULL)")
+    pool = ReaderPool(db_file, refresh_interval=3600)
+
+    with pool.cursor() as cursor:
+        first = cursor
+        assert cursor.execute("SELECT count(*) FROM train_numbers").fetchone()[0] == 1
+    assert [p.name for p in pool.snapshot_dir.iterdir()] == ["readers.v1.duckdb"]
+    with pool.cursor() as cursor:
+        assert cursor is first
+
+    write("INSERT INTO train_numbers VALUES ('2025-06-27', '200', NULL)")
+    # Within the interval the old snapshot is served
+    with pool.cursor() as cursor:
+        assert cursor.execute("SELECT count(*) FROM train_numbers").fetchone()[0] == 1
+    assert pool.refresh(force=True) is True
+    assert pool.refresh(force=True) is False
+    with pool.cursor() as cursor:
+        assert cursor.execute("SELECT count(*) FROM train_numbers").fetchone()[0] == 2
+    # Older snapshots are removed once replaced
+    assert [p.name for p in pool.snapshot_dir.iterdir()] == ["readers.v2.duckdb"]
+    pool.close()
+
+
+def test_reader_pool_falls_back_to_snapshot_while_writer_holds_lock(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    While another process writes, readers should keep using the snapshot, and the
+    pool itself should never stop a writer from opening the database.
+    """
+    db_file = setup_database(tmp_path, monkeypatch)
+    write("INSERT INTO train_numbers VALUES ('2025-06-27', '100', NULL)")
+    pool = ReaderPool(db_file, refresh_interval=0)
+    with pool.cursor() as cursor:
+        cursor.execute("SELECT 1").fetchone()
+
+    # A writer can take the file while the pool is open
+    writer = hold_lock(db_file, 1.0)
+    assert pool.refresh(force=True) is False
+    with pool.cursor() as cursor:
+        assert cursor.execute("SELECT count(*) FROM train_numbers").fetchone()[0] == 1
+    writer.wait()
+    pool.close()
+
+
+def test_get_connection_waits_for_lock(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    get_connection should retry while another process briefly holds the file lock,
+    and give up once its timeout runs out.
+    """
+    db_file = setup_database(tmp_path, monkeypatch)
+
+    holder = hold_lock(db_file, 5.0)
+    with pytest.raises(duckdb.IOException):
+        db_module.get_connection(lock_timeout=0)
+    holder.kill()
+    holder.wait()
+
+    holder = hold_lock(db_file, 0.5)
+    started = time.monotonic()
+    conn = db_module.get_connection(lock_timeout=10)
+    conn.close()
+    holder.wait()
+    assert time.monotonic() - started < 10
+
+
+def test_writer_waits_only_for_the_snapshot_file_copy(
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    A writer arriving while a refresh copies the live file should wait for the
+    copy and then get the database, well within its lock timeout.
+    """
+    db_file = setup_database(tmp_path, monkeypatch)
+    write("INSERT INTO train_numbers VALUES ('2025-06-27', '100', NULL)")
+    pool = ReaderPool(db_file, refresh_interval=3600)
+    copying = threading.Event()
+    copyfile = shutil.copyfile
+
+    def slow_copyfile(source: Path, target: Path) -> None:
+        copying.set()
+        time.sleep(1.0)
+        copyfile(source, target)
+
+    monkeypatch.setattr("src.readers.shutil.copyfile", slow_copyfile)
+    refresher = threading.Thread(target=pool.refresh)
+    refresher.start()
+    assert copying.wait(5)
+    writer = subprocess.run(
+        [sys.executable, "-c",
+         "import sys, time; sys.path.insert(0, '.'); import src.db as db; from pathlib import Path; "
+         f"db.DB_FILE = Path({str(db_file)!r}); started = time.monotonic(); "
+         "db.get_connection(lock_timeout=10).close(); print(time.monotonic() - started)"],
+        cwd=Path(__file__).parent.parent,
+        capture_output=True,
+        text=True,
+        timeout=30,
+    )
+    refresher.join()
+
+    assert writer.returncode == 0, writer.stderr
+    assert 0.3 < float(writer.stdout) < 5
+    with pool.cursor() as cursor:
+        assert cursor.execute("SELECT count(*) FROM train_numbers").fetchone()[0] == 1
+    pool.close()
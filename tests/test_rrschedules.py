@@ -1,18 +1,25 @@
+import asyncio
 import time
-from typing import Any, Dict, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
 
 import pytest
 import requests
 
-from src.fetchers.rrschedules import fetch_schedule, ScheduleRecord
+import config
+from src import http_client
+from src.fetchers.rrschedules import fetch_payload_once_async, parse_records, ScheduleRecord, TransientFetchError
+from src.metrics import RunMetrics
+from src.ratelimit import AdaptiveLimiter, CircuitBreaker, TokenBucket
 
 
 class DummyResponse:
-    """Simulated requests.Response for testing fetch_schedule."""
+    """Simulated requests.Response for testing the RRSchedules fetcher."""
 
-    def __init__(self, json_data: Any, status_code: int = 200) -> None:
+    def __init__(self, json_data: Any, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> None:
         self._json = json_data
         self.status_code = status_code
+        self.headers = headers or {}
 
     def raise_for_status(self) -> None:
         """Raise HTTPError on bad status codes."""
@@ -24,83 +31,215 @@ class DummyResponse:
         return self._json
 
 
-def test_fetch_schedule_success(monkeypatch: pytest.MonkeyPatch) -> None:
+def test_parse_records_keeps_order_and_fields() -> None:
     """
-    fetch_schedule should return a list of ScheduleRecord on success
-    and respect the order of items.
+    parse_records should return one ScheduleRecord per item, in order, with
+    every field as a string.
     """
     sample: List[Dict[str, Any]] = [
         {"station": "A", "sched_tm": "08:00", "est_tm": "08:05", "act_tm": "na"},
-        {"station": "B", "sched_tm": "08:10", "est_tm": "08:12", "act_tm": "08:13"},
+        {"station": "B", "sched_tm": "08:10", "est_tm": "08:12", "act_tm": "08:13", "extra": 1},
+        {"station": 30},
     ]
-    # Patch requests.get to always return a successful DummyResponse
-    monkeypatch.setattr(
-        "requests.get",
-        lambda url, params=None: DummyResponse(sample, status_code=200)
-    )
-    # Patch time.sleep to avoid delays
-    monkeypatch.setattr(time, "sleep", lambda x: None)
 
-    records: List[ScheduleRecord] = fetch_schedule("123")
-    assert len(records) == 2
-    assert records[0]["station"] == "A"
-    assert records[1]["act_tm"] == "08:13"
+    records: List[ScheduleRecord] = parse_records(sample)
 
+    assert [record["station"] for record in records] == ["A", "B", "30"]
+    assert records[1] == {"station": "B", "sched_tm": "08:10", "est_tm": "08:12", "act_tm": "08:13"}
+    assert records[2]["act_tm"] == ""
 
-def test_fetch_schedule_retry_and_backoff(monkeypatch: pytest.MonkeyPatch) -> None:
+
+def test_parse_records_rejects_non_list_payload() -> None:
+    """
+    parse_records should raise ValueError when the JSON is not a list.
+    """
+    with pytest.raises(ValueError):
+        parse_records({"foo": "bar"})
+
+
+def test_fetch_payload_once_async_suggests_exponential_backoff(monkeypatch: pytest.MonkeyPatch) -> None:
     """
-    fetch_schedule should retry on HTTP errors with exponential backoff
-    and eventually succeed.
+    A 5xx should raise TransientFetchError with a backoff that doubles with each
+    earlier failed attempt, and a later answer should return the payload.
+    """
+    responses = [DummyResponse(None, status_code=500), DummyResponse(None, status_code=503), DummyResponse(["ok"])]
+    monkeypatch.setattr(http_client.get_session(), "get", lambda url, params=None: responses.pop(0))
+    limiter = TokenBucket(rate=1000, capacity=1000)
+    metrics = RunMetrics()
+    delays: List[float] = []
+
+    for attempts in (0, 1):
+        with pytest.raises(TransientFetchError) as raised:
+            asyncio.run(fetch_payload_once_async("1", limiter, failed_attempts=attempts, retry_backoff=0.1,
+                                                 metrics=metrics))
+        assert isinstance(raised.value.error, requests.HTTPError)
+        delays.append(raised.value.delay)
+    result = asyncio.run(fetch_payload_once_async("1", limiter, failed_attempts=2, metrics=metrics))
+
+    assert delays == pytest.approx([0.1, 0.2])
+    assert result["payload"] == ["ok"] and not result["not_modified"]
+    assert metrics.summary()["fetch.transient_errors"] == 2
+
+
+def test_fetch_payload_once_async_raises_permanent_errors(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    A 404 cannot succeed on retry, so it should be raised as is, not as a
+    TransientFetchError.
     """
     calls: List[int] = []
 
     def fake_get(url: str, params=None):
-        # Fail the first two times, then succeed
-        if len(calls) < 2:
-            calls.append(1)
-            return DummyResponse(None, status_code=500)
-        return DummyResponse([{"station": "X", "sched_tm": "09:00", "est_tm": "09:05", "act_tm": "na"}],
-                             status_code=200)
-
-    monkeypatch.setattr("requests.get", fake_get)
-    # Track sleep invocations without real delay
-    sleep_calls: List[float] = []
-    monkeypatch.setattr(time, "sleep", lambda secs: sleep_calls.append(secs))
-
-    records = fetch_schedule("456", max_retries=3, retry_backoff=0.1)
-    # Ensure it retried twice before succeeding
-    assert len(calls) == 2
-    # Exponential backoff times: 0.1, 0.2
-    assert pytest.approx(sleep_calls[:2], rel=1e-3) == [0.1, 0.2]
-    assert records[0]["station"] == "X"
-
-
-def test_fetch_schedule_max_retries_exceeded(monkeypatch: pytest.MonkeyPatch) -> None:
-    """
-    fetch_schedule should raise HTTPError after exceeding max_retries.
-    """
-    # Always return a 503 error
-    monkeypatch.setattr(
-        "requests.get",
-        lambda url, params=None: DummyResponse(None, status_code=503)
-    )
-    # Patch sleep to no-op
-    monkeypatch.setattr(time, "sleep", lambda x: None)
+        calls.append(1)
+        return DummyResponse(None, status_code=404)
+
+    monkeypatch.setattr(http_client.get_session(), "get", fake_get)
+    metrics = RunMetrics()
 
     with pytest.raises(requests.HTTPError):
-        fetch_schedule("789", max_retries=2, retry_backoff=0.01)
+        asyncio.run(fetch_payload_once_async("404", TokenBucket(rate=1000, capacity=1000), metrics=metrics))
+    assert len(calls) == 1
+    assert metrics.summary()["fetch.permanent_errors"] == 1
 
 
-def test_fetch_schedule_invalid_json_format(monkeypatch: pytest.MonkeyPatch) -> None:
+def test_fetch_payload_once_async_retries_connection_errors_and_honors_retry_after(
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
     """
-    fetch_schedule should raise ValueError when JSON is not a list.
+    Connection errors and 429s should be transient, with a backoff at least as
+    long as Retry-After asks (capped at the configured maximum).
     """
-    # Return a dict instead of list
-    monkeypatch.setattr(
-        "requests.get",
-        lambda url, params=None: DummyResponse({"foo": "bar"}, status_code=200)
-    )
-    monkeypatch.setattr(time, "sleep", lambda x: None)
+    outcomes: List[Any] = [
+        requests.ConnectionError("reset"),
+        DummyResponse(None, status_code=429, headers={"Retry-After": "7"}),
+        DummyResponse(None, status_code=429, headers={"Retry-After": "100000"}),
+    ]
 
-    with pytest.raises(ValueError):
-        fetch_schedule("321")
+    def fake_get(url: str, params=None):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(http_client.get_session(), "get", fake_get)
+    monkeypatch.setattr(config, "HTTP_MAX_RETRY_AFTER_SEC", 60)
+    limiter = TokenBucket(rate=1000, capacity=1000)
+    delays: List[float] = []
+
+    for attempts in range(3):
+        with pytest.raises(TransientFetchError) as raised:
+            asyncio.run(fetch_payload_once_async("429", limiter, failed_attempts=attempts, retry_backoff=0.1))
+        delays.append(raised.value.delay)
+
+    assert delays == pytest.approx([0.1, 7, 60])
+
+
+def test_fetch_payload_once_async_takes_a_token_per_attempt(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Every attempt across concurrent requests, failed ones included, should take
+    a token from the shared limiter.
+    """
+    calls: List[str] = []
+
+    def fake_get(url: str, params=None):
+        calls.append(params["req1"])
+        return DummyResponse(None, status_code=500) if params["req1"] == "bad" else DummyResponse([])
+
+    class CountingBucket(TokenBucket):
+        def __init__(self) -> None:
+            super().__init__(rate=1000, capacity=1000)
+            self.acquired = 0
+
+        async def acquire_async(self) -> None:
+            self.acquired += 1
+
+    monkeypatch.setattr(http_client.get_session(), "get", fake_get)
+    limiter = CountingBucket()
+
+    async def run() -> List[Any]:
+        return await asyncio.gather(
+            *(fetch_payload_once_async(tn, limiter) for tn in ("a", "b", "bad")), return_exceptions=True
+        )
+
+    outcomes = asyncio.run(run())
+
+    assert isinstance(outcomes[2], TransientFetchError)
+    assert limiter.acquired == len(calls) == 3
+
+
+def test_fetch_payload_once_async_reports_outcomes_to_controller_and_breaker(
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Each attempt should be reported to the adaptive limiter and the circuit breaker:
+    transient failures as congestion and failures, answers as successes.
+    """
+    responses = [DummyResponse(None, status_code=503), DummyResponse(["ok"], status_code=200)]
+    monkeypatch.setattr(http_client.get_session(), "get", lambda url, params=None: responses.pop(0))
+    controller = AdaptiveLimiter(max_concurrency=4, max_rps=1000, decrease_interval=0)
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0)
+    events: List[str] = []
+    monkeypatch.setattr(breaker, "record_failure", lambda: events.append("failure"))
+    monkeypatch.setattr(breaker, "record_success", lambda: events.append("success"))
+    limiter = TokenBucket(rate=1000, capacity=1000)
+
+    with pytest.raises(TransientFetchError):
+        asyncio.run(fetch_payload_once_async("1", limiter, controller=controller, breaker=breaker))
+    result = asyncio.run(fetch_payload_once_async("1", limiter, controller=controller, breaker=breaker))
+
+    assert result["payload"] == ["ok"]
+    assert events == ["failure", "success"]
+    assert controller.decreases == 1
+
+
+def test_fetch_payload_once_async_makes_conditional_requests(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Given validators, the request should carry If-None-Match and If-Modified-Since,
+    and a 304 should come back as not modified, keeping the validators.
+    """
+    sent: List[Dict[str, str]] = []
+
+    def fake_get(url: str, params=None, headers=None):
+        sent.append(headers)
+        return DummyResponse(None, status_code=304)
+
+    monkeypatch.setattr(http_client.get_session(), "get", fake_get)
+    limiter = TokenBucket(rate=1000, capacity=1000)
+
+    result = asyncio.run(fetch_payload_once_async(
+        "1", limiter, etag='"abc"', last_modified="Fri, 27 Jun 2025 08:00:00 GMT"
+    ))
+
+    assert sent == [{"If-None-Match": '"abc"', "If-Modified-Since": "Fri, 27 Jun 2025 08:00:00 GMT"}]
+    assert result == {
+        "payload": None,
+        "not_modified": True,
+        "etag": '"abc"',
+        "last_modified": "Fri, 27 Jun 2025 08:00:00 GMT",
+    }
+
+
+def test_fetch_payload_once_async_times_only_the_request(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Recorded latency should cover the request alone, not the time it waited for
+    a free thread of the executor.
+    """
+    def slow_get(url: str, params=None, **kwargs):
+        time.sleep(0.05)
+        return DummyResponse([])
+
+    monkeypatch.setattr(http_client.get_session(), "get", slow_get)
+    limiter = TokenBucket(rate=10_000, capacity=10_000)
+    metrics = RunMetrics()
+
+    async def run() -> None:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            await asyncio.gather(*(
+                fetch_payload_once_async(str(n), limiter, metrics=metrics, executor=executor) for n in range(4)
+            ))
+
+    asyncio.run(run())
+
+    summary = metrics.summary()
+    assert summary["fetch.requests"] == 4
+    # Queued behind each other, the last request would otherwise take ~200 ms
+    assert summary["fetch.latency_max_ms"] < 120
@@ -1,7 +1,13 @@
 from datetime import time
 from typing import List, TypedDict
 
-from src.transformer import transform, CleanRecord
+import duckdb
+import pytest
+from dateutil import parser
+
+from src.transformer import (
+    parse_time, record_count, to_columns, transform, transform_chunk, transform_columns, CleanRecord
+)
 
 
 class DummyRawRecord(TypedDict):
@@ -72,3 +78,139 @@ def test_transform_whitespace_and_case_insensitive_na() -> None:
     rec = results[0]
     assert rec["station"] == "F"
     assert rec["act_time"] is None
+
+
+@pytest.mark.parametrize(
+    "raw",
+    [
+        "3:08 pm", "3:08pm", "3:08 p.m.", "03:08 PM", "12:00 am", "12:30 pm", "11:59 PM",
+        "15:08", "00:05", "15:08:30", "7:5", "0:30 am", "10", "15:30 pm", "24:00",
+        "13:00 am", "9:61", "na", "NA", "", "notatime",
+    ],
+)
+def test_parse_time_matches_dateutil(raw: str) -> None:
+    """
+    parse_time should agree with dateutil on every input, returning None where
+    dateutil cannot produce a time.
+    """
+    try:
+        expected = parser.parse(raw).time()
+    except (ValueError, TypeError):
+        expected = None
+
+    assert parse_time(raw) == expected
+
+
+def test_parse_time_is_memoized() -> None:
+    """
+    Repeated inputs should be served from the parse_time cache.
+    """
+    parse_time.cache_clear()
+    parse_time("4:15 pm")
+    parse_time("4:15 pm")
+
+    info = parse_time.cache_info()
+    assert info.hits == 1
+    assert info.misses == 1
+
+
+def test_transform_columns_matches_transform_per_train() -> None:
+    """
+    transform_columns should produce, per train, exactly the rows transform does,
+    in the same order, including fallback-parsed formats, "na", duplicates,
+    Unicode whitespace and control characters.
+    """
+    raw_by_train = {
+        "100": [
+            {"station": " A ", "sched_tm": "3:08 pm", "est_tm": "3:10 PM", "act_tm": "3:11 p.m."},
+            {"station": "A", "sched_tm": "15:08", "est_tm": "15:10", "act_tm": "15:11"},  # duplicate
+            {"station": "B", "sched_tm": "12:00 am", "est_tm": "0:30 am", "act_tm": " NA "},
+            {"station": "C", "sched_tm": "invalid", "est_tm": "09:00", "act_tm": "na"},
+            {"station": "D", "sched_tm": "7:5", "est_tm": "10", "act_tm": "bogus"},
+        ],
+        "200": [
+            {"station": "A", "sched_tm": "3:08 pm", "est_tm": "3:10 pm", "act_tm": "3:11 pm"},
+            {"station": "E", "sched_tm": "23:59:30", "est_tm": "24:00", "act_tm": ""},
+            {"station": "F", "sched_tm": "11:59 PM", "est_tm": "11:59 pm", "act_tm": "na"},
+            {"station": "F", "sched_tm": "11:59 PM", "est_tm": "11:59 pm", "act_tm": "na"},
+        ],
+        "300": [],
+        "400": [
+            {"station": "\xa0G\u3000", "sched_tm": "\u20038:00 am\xa0", "est_tm": "8:05\xa0am", "act_tm": "\x85na"},
+            {"station": "H\x1fI\x1e", "sched_tm": "8:10", "est_tm": "8:10", "act_tm": "8:11\u2028"},
+            {"station": 'O\'Hare "J"', "sched_tm": "8:20", "est_tm": "8:20", "act_tm": "\u200b8:21"},
+        ],
+    }
+    conn = duckdb.connect()
+
+    rows = transform_columns(conn, to_columns(raw_by_train)).fetchall()  # type: ignore
+    conn.close()
+
+    for train_no, raw in raw_by_train.items():
+        expected = [
+            (r["station"], r["sched_time"], r["est_time"], r["act_time"])
+            for r in transform(raw)  # type: ignore
+        ]
+        actual = [row[1:5] for row in rows if row[0] == train_no]
+        assert actual == expected
+
+
+def test_transform_columns_rejects_ragged_columns() -> None:
+    """
+    transform_columns should raise ValueError on missing or uneven column arrays.
+    """
+    conn = duckdb.connect()
+    columns = {"train_no": ["1"], "station": ["A"], "sched_tm": ["1:00"], "est_tm": ["1:00"]}
+
+    with pytest.raises(ValueError):
+        transform_columns(conn, columns)
+    with pytest.raises(ValueError):
+        transform_columns(conn, {**columns, "act_tm": []})
+    conn.close()
+
+
+def test_transform_columns_results_stay_independent() -> None:
+    """
+    A relation returned by transform_columns should keep its own rows after later
+    calls on the same connection, and empty input should give an empty relation.
+    """
+    conn = duckdb.connect()
+    record = {"station": "A", "sched_tm": "8:00 am", "est_tm": "8:02 am", "act_tm": "na"}
+
+    first = transform_columns(conn, to_columns({"100": [record]}))  # type: ignore
+    second = transform_columns(conn, to_columns({"200": [record, {**record, "station": "B"}]}))  # type: ignore
+    empty = transform_columns(conn, to_columns({}))
+
+    assert [row[:2] for row in first.fetchall()] == [("100", "A")]
+    assert [row[:2] for row in second.fetchall()] == [("200", "A"), ("200", "B")]
+    assert empty.fetchall() == []
+    conn.close()
+
+
+def test_transform_chunk_returns_compact_columns_per_train() -> None:
+    """
+    transform_chunk should clean each train as transform does and return its
+    records as parallel ISO-string arrays, in input order.
+    """
+    trains = [
+        ("100", [
+            {"station": "A", "sched_tm": "3:08 pm", "est_tm": "3:10 pm", "act_tm": "3:11 pm"},
+            {"station": "A", "sched_tm": "15:08", "est_tm": "15:10", "act_tm": "15:11"},  # duplicate
+            {"station": "B", "sched_tm": "3:20 pm", "est_tm": "3:22 pm", "act_tm": "na"},
+        ]),
+        ("200", []),
+    ]
+
+    result = transform_chunk(trains)  # type: ignore
+
+    assert result["trains"] == [
+        ("100", {
+            "station": ["A", "B"],
+            "sched_time": ["15:08:00", "15:20:00"],
+            "est_time": ["15:10:00", "15:22:00"],
+            "act_time": ["15:11:00", None],
+        }),
+        ("200", {"station": [], "sched_time": [], "est_time": [], "act_time": []}),
+    ]
+    assert [record_count(records) for _, records in result["trains"]] == [2, 0]
+    assert result["wall_sec"] >= 0 and result["cpu_sec"] >= 0